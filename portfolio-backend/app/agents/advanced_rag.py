@@ -1,20 +1,24 @@
 import logging
 import numpy as np
-from typing import List, Dict, Union
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import List, Dict, Union, Optional
 
-from app.models.schemas import RetrievedChunk
+from app.config import settings
+from app.models.schemas import RetrievedChunk, RetrievalResult
 from app.models.database import db
+from app.index.bm25 import bm25_index
+from app.agents.retrieval_cache import retrieval_cache
 from app.embeddings.nomic import embedding_model
+from app.embeddings.context import RequestEmbeddings
+from app.embeddings.matryoshka import truncate_embeddings
 
 logger = logging.getLogger(__name__)
 
+# Vector similarity tiers, applied locally to one unthresholded candidate fetch
+PRIMARY_THRESHOLD = 0.4
+FALLBACK_THRESHOLD = 0.0
+
 class AdvancedRAG:
-    """Multi-level RAG with clustering and re-ranking"""
-    
-    def __init__(self):
-        self.vectorizer = TfidfVectorizer(max_features=100, stop_words='english')
+    """Multi-level RAG: hybrid retrieval, group dedup and MMR selection"""
     
     def _convert_to_chunks(self, results: List[Union[dict, RetrievedChunk]]) -> List[RetrievedChunk]:
         """Convert database results to RetrievedChunk objects"""
@@ -37,8 +41,10 @@ class AdvancedRAG:
                     metadata = item.get('metadata', {})
                     if isinstance(metadata, dict):
                         source = metadata.get('title', metadata.get('source', 'unknown'))
+                        dup_group = metadata.get('dup_group')
                     else:
                         source = 'unknown'
+                        dup_group = None
                     
                     embedding = item.get('embedding', [])
                     similarity = item.get('similarity', 0.0)
@@ -49,7 +55,8 @@ class AdvancedRAG:
                         content=content,
                         source=source,
                         embedding=embedding,
-                        similarity=similarity
+                        similarity=similarity,
+                        dup_group=dup_group
                     )
                     chunks.append(chunk)
                     logger.debug(f"✓ Converted chunk {idx}: {source[:30]}")
@@ -63,118 +70,187 @@ class AdvancedRAG:
         logger.info(f"✓ Converted {len(chunks)}/{len(results)} results to chunks")
         return chunks
     
-    def _deduplicate_chunks(self, chunks: List[RetrievedChunk], threshold: float = 0.85) -> List[RetrievedChunk]:
-        """Remove near-duplicate chunks"""
-        if len(chunks) <= 1:
-            return chunks
+    def _deduplicate_chunks(self, chunks: List[RetrievedChunk]) -> List[RetrievedChunk]:
+        """Keep the best-ranked chunk of each near-duplicate group (groups are assigned at ingest)"""
+        seen = set()
+        deduplicated = []
+        
+        for chunk in chunks:
+            # Chunks ingested before grouping existed are their own group
+            group = chunk.dup_group or chunk.id
+            if group in seen:
+                continue
+            seen.add(group)
+            deduplicated.append(chunk)
+        
+        logger.info(f"Deduplication: {len(chunks)} → {len(deduplicated)} chunks")
+        return deduplicated
+    
+    def _select_mmr(
+        self,
+        chunks: List[RetrievedChunk],
+        query: str,
+        top_k: int = 5,
+        query_embedding: Optional[List[float]] = None,
+        lambda_mult: Optional[float] = None,
+        project_cap: Optional[int] = None
+    ) -> List[RetrievedChunk]:
+        """
+        Maximal Marginal Relevance over the candidates' embedding matrix
+        - relevance: 0.7 x cosine to the query + 0.3 x lexical score
+        - redundancy: running max similarity to the chunks already picked,
+          updated with one matrix-vector product per pick (O(top_k x n x dim))
+        - at most project_cap chunks per source while other sources have candidates
+        """
+        if not chunks:
+            return []
+        lambda_mult = settings.MMR_LAMBDA if lambda_mult is None else lambda_mult
+        project_cap = settings.MMR_PROJECT_CAP if project_cap is None else project_cap
         
         try:
-            texts = [chunk.content for chunk in chunks]
-            tfidf_matrix = self.vectorizer.fit_transform(texts)
-            similarity_matrix = cosine_similarity(tfidf_matrix)
-            
-            kept_indices = [0]
+            # Reuse the query embedding computed for retrieval
+            if query_embedding is None:
+                query_embedding = embedding_model.embed_query(query)
+            query_emb = np.asarray(query_embedding, dtype=np.float32)
+            query_emb = query_emb / (np.linalg.norm(query_emb) + 1e-10)
             
-            for i in range(1, len(chunks)):
-                max_similarity = max([similarity_matrix[i][j] for j in kept_indices])
-                
-                if max_similarity < threshold:
-                    kept_indices.append(i)
-            
-            deduplicated = [chunks[i] for i in kept_indices]
-            logger.info(f"Deduplication: {len(chunks)} → {len(deduplicated)} chunks")
+            matrix, has_vector = self._candidate_matrix(chunks, len(query_emb))
+            similarities = np.where(
+                has_vector,
+                matrix @ query_emb,
+                np.array([chunk.similarity or 0.0 for chunk in chunks], dtype=np.float32)
+            )
+            if not has_vector.all():
+                logger.warning(f"{int((~has_vector).sum())} chunks without a stored embedding, using search similarity")
+            relevance = 0.7 * similarities + 0.3 * self._term_match_scores(chunks, query)
             
-            return deduplicated
+            _, project = np.unique([chunk.source or "unknown" for chunk in chunks], return_inverse=True)
+            project_counts = np.zeros(project.max() + 1, dtype=np.int32)
             
-        except Exception as e:
-            logger.warning(f"Deduplication failed: {e}, returning all chunks")
-            return chunks
-    
-    def _rerank_by_relevance(self, chunks: List[RetrievedChunk], query: str, top_k: int = 5) -> List[RetrievedChunk]:
-        """Re-rank chunks using cross-encoder style scoring"""
-        if len(chunks) <= top_k:
-            return chunks
-        
-        try:
-            # Get query embedding
-            query_emb = embedding_model.embed_query(query)
-            query_emb = np.array(query_emb)
+            max_redundancy = np.zeros(len(chunks), dtype=np.float32)
+            available = np.ones(len(chunks), dtype=bool)
+            selected = []
             
-            # Score each chunk
-            scores = []
-            for chunk in chunks:
-                # Get chunk embedding (use stored embedding if available)
-                if hasattr(chunk, 'embedding') and chunk.embedding:
-                    chunk_emb = np.array(chunk.embedding)
-                else:
-                    # Fallback: generate embedding
-                    chunk_emb = np.array(embedding_model.embed_query(chunk.content))
-                
-                # Ensure dimension match
-                if len(chunk_emb) != len(query_emb):
-                    logger.warning(f"Dimension mismatch: query={len(query_emb)}, chunk={len(chunk_emb)}")
-                    continue
+            while len(selected) < min(top_k, len(chunks)):
+                eligible = available
+                if project_cap > 0:
+                    under_cap = available & (project_counts[project] < project_cap)
+                    # Soft cap: a single-project corpus still fills top_k
+                    if under_cap.any():
+                        eligible = under_cap
                 
-                # Cosine similarity
-                similarity = np.dot(query_emb, chunk_emb) / (
-                    np.linalg.norm(query_emb) * np.linalg.norm(chunk_emb) + 1e-10
-                )
-                
-                # Boost score if query terms appear in chunk
-                query_terms = set(query.lower().split())
-                chunk_text = chunk.content.lower()
-                term_match_score = sum(
-                    1 for term in query_terms if term in chunk_text
-                ) / len(query_terms) if query_terms else 0
+                scores = lambda_mult * relevance - (1 - lambda_mult) * max_redundancy
+                pick = int(np.argmax(np.where(eligible, scores, -np.inf)))
                 
-                # Combined score
-                combined_score = 0.7 * similarity + 0.3 * term_match_score
-                scores.append((chunk, combined_score))
-            
-            # Sort by score
-            sorted_chunks = sorted(scores, key=lambda x: x[1], reverse=True)
-            reranked = [chunk for chunk, score in sorted_chunks[:top_k]]
+                selected.append(pick)
+                available[pick] = False
+                project_counts[project[pick]] += 1
+                max_redundancy = np.maximum(max_redundancy, matrix @ matrix[pick])
             
-            logger.info(f"Re-ranked {len(chunks)} chunks, keeping top {top_k}")
-            return reranked
+            logger.info(f"MMR selected {len(selected)}/{len(chunks)} chunks (lambda={lambda_mult}, cap={project_cap})")
+            return [chunks[i] for i in selected]
             
         except Exception as e:
-            logger.warning(f"Re-ranking failed: {e}, returning original chunks")
+            logger.warning(f"MMR selection failed: {e}, returning top candidates")
             return chunks[:top_k]
     
-    def _cluster_by_project(self, chunks: List[RetrievedChunk]) -> Dict[str, List[RetrievedChunk]]:
-        """Group chunks by source project"""
-        clusters = {}
-        for chunk in chunks:
-            source = chunk.source or "unknown"
-            if source not in clusters:
-                clusters[source] = []
-            clusters[source].append(chunk)
+    def _candidate_matrix(self, chunks: List[RetrievedChunk], dim: int):
+        """
+        (n x dim) L2-normalised matrix of stored vectors, plus a mask of rows that have one.
+        Never runs the model: a chunk without a usable vector gets a zero row.
+        """
+        matrix = np.zeros((len(chunks), dim), dtype=np.float32)
+        has_vector = np.zeros(len(chunks), dtype=bool)
+        
+        # Group by stored length (normally one group); longer vectors are Matryoshka-truncated
+        by_length: Dict[int, List[int]] = {}
+        for idx, chunk in enumerate(chunks):
+            if chunk.embedding and len(chunk.embedding) >= dim:
+                by_length.setdefault(len(chunk.embedding), []).append(idx)
+        
+        for length, indices in by_length.items():
+            vectors = np.asarray([chunks[i].embedding for i in indices], dtype=np.float32)
+            if length > dim:
+                vectors = truncate_embeddings(vectors, dim)
+            matrix[indices] = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-10)
+            has_vector[indices] = True
         
-        return clusters
+        return matrix, has_vector
     
-    def _select_diverse_chunks(self, clusters: Dict[str, List[RetrievedChunk]], target_count: int = 5) -> List[RetrievedChunk]:
-        """Select chunks maintaining diversity across projects"""
-        if not clusters:
+    def _term_match_scores(self, chunks: List[RetrievedChunk], query: str) -> np.ndarray:
+        """
+        Lexical score per candidate in [0, 1]: BM25 normalised by the best candidate,
+        or (without the index) the fraction of query terms present in each chunk
+        """
+        if settings.BM25_INDEX and bm25_index.ready:
+            bm25 = bm25_index.score(query, [chunk.id for chunk in chunks])
+            scores = np.array([bm25.get(chunk.id, 0.0) for chunk in chunks], dtype=np.float32)
+            best = scores.max() if len(scores) else 0.0
+            return scores / best if best > 0 else scores
+        
+        query_terms = list(set(query.lower().split()))
+        if not query_terms:
+            return np.zeros(len(chunks), dtype=np.float32)
+        
+        texts = [chunk.content.lower() for chunk in chunks]
+        presence = np.array(
+            [[term in text for term in query_terms] for text in texts],
+            dtype=np.float32
+        )
+        return presence.mean(axis=1)
+    
+    @staticmethod
+    def _apply_threshold(candidates: List[dict], threshold: float, limit: int) -> List[dict]:
+        """Candidates are sorted by similarity, so a tier is a prefix"""
+        return [item for item in candidates if (item.get('similarity') or 0.0) > threshold][:limit]
+    
+    def _lexical_search(self, query: str, limit: int, project: Optional[str] = None) -> List[dict]:
+        """BM25 candidates from the in-process inverted index"""
+        if not (settings.BM25_INDEX and bm25_index.ready):
             return []
         
-        selected = []
-        chunk_per_project = max(1, target_count // len(clusters))
+        bm25_index.schedule_staleness_check(db)
+        results = []
+        for row, score in bm25_index.search(query, top_k=limit, project=project):
+            row["bm25_score"] = score
+            row["similarity"] = 0.0
+            results.append(row)
+        
+        logger.info(f"  ✓ BM25: {len(results)} lexical candidates")
+        return results
+    
+    @staticmethod
+    def _strong_lexical(lexical_results: List[dict]) -> bool:
+        """
+        Lexical hits good enough to replace the vector fallback: a match on a
+        common word scores near zero (low idf), a rare exact term well above
+        BM25_LEXICAL_MIN_SCORE; weaker hits are only fused into the fallback
+        """
+        return bool(lexical_results) and lexical_results[0]["bm25_score"] >= settings.BM25_LEXICAL_MIN_SCORE
+    
+    async def _fuse_hybrid(self, vector_results: List[dict], lexical_results: List[dict]) -> List[dict]:
+        """Reciprocal rank fusion of vector and BM25 rankings"""
+        fused: Dict[str, float] = {}
+        items: Dict[str, dict] = {}
         
-        for source, source_chunks in sorted(clusters.items()):
-            selected.extend(source_chunks[:chunk_per_project])
+        for ranking in (vector_results, lexical_results):
+            for rank, item in enumerate(ranking):
+                chunk_id = str(item.get('id'))
+                fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (settings.RRF_K + rank + 1)
+                # Keep the vector row when both have it (it carries similarity + embedding)
+                items.setdefault(chunk_id, item)
         
-        # Fill remaining quota with highest similarity chunks
-        if len(selected) < target_count:
-            remaining = target_count - len(selected)
-            for source, source_chunks in clusters.items():
-                additional = source_chunks[chunk_per_project:chunk_per_project + remaining]
-                selected.extend(additional)
-                remaining -= len(additional)
-                if remaining <= 0:
-                    break
+        # Lexical-only hits still need their stored vectors for re-ranking
+        lexical_only = [item for item in items.values() if not item.get('embedding')]
+        if lexical_only:
+            await db.ensure_embeddings(lexical_only)
         
-        return selected[:target_count]
+        ordered = sorted(fused, key=fused.get, reverse=True)
+        logger.info(
+            f"  ✓ Hybrid fusion: {len(vector_results)} vector + {len(lexical_results)} BM25 "
+            f"→ {len(ordered)} candidates ({len(lexical_only)} lexical-only)"
+        )
+        return [items[chunk_id] for chunk_id in ordered]
     
     async def test_vector_search(self, query: str):
         """Debug vector search"""
@@ -183,7 +259,7 @@ class AdvancedRAG:
         
         try:
             # Generate embedding
-            embedding = embedding_model.embed_query(query)
+            embedding = await embedding_model.aembed_query(query)
             logger.info(f"Embedding generated: {len(embedding)} dimensions")
             logger.info(f"First 5 values: {embedding[:5]}")
             
@@ -212,64 +288,115 @@ class AdvancedRAG:
             traceback.print_exc()
             return None
 
-    async def retrieve_advanced(self, query: str, top_k: int = 5) -> List[RetrievedChunk]:
-        """Multi-level RAG retrieval"""
-        logger.info(f"🔍 Advanced RAG retrieval for: '{query[:50]}...'")
+    async def retrieve_advanced(
+        self,
+        query: str,
+        top_k: int = 5,
+        embeddings: Optional[RequestEmbeddings] = None,
+        project: Optional[str] = None
+    ) -> RetrievalResult:
+        """
+        Multi-level RAG retrieval (chunks + which threshold tier produced them)
+        project: restrict the search itself to one project (follow-up questions)
+        Repeated queries are answered from the retrieval cache until the corpus changes.
+        """
+        # Key (with the corpus version) taken now, not after an ingest that lands mid-retrieval
+        cache_key = retrieval_cache.key(query, top_k, project)
+        cached = retrieval_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"⚡ Retrieval cache hit for: '{query[:50]}...' ({len(cached.chunks)} chunks)")
+            cached.cached = True
+            return cached
+        
+        result = await self._retrieve(query, top_k, embeddings, project)
+        retrieval_cache.put(cache_key, result)
+        return result
+    
+    async def _retrieve(
+        self,
+        query: str,
+        top_k: int,
+        embeddings: Optional[RequestEmbeddings],
+        project: Optional[str]
+    ) -> RetrievalResult:
+        logger.info(f"🔍 Advanced RAG retrieval for: '{query[:50]}...'" + (f" in {project}" if project else ""))
+        
+        embeddings = embeddings or RequestEmbeddings()
         
         try:
-            # Level 1: Initial retrieval (get more than needed)
+            # Encode the query once for every level below
+            query_embedding = await embeddings.aembed_query(query)
+            
+            # Level 1: Initial retrieval - one unthresholded round trip, tiers applied locally
             logger.info("  Level 1: Initial retrieval...")
-            initial_results = await db.vector_search(
-                query_embedding=embedding_model.embed_query(query),
-                match_threshold=0.4,
-                match_count=top_k * 3  # Get 3x what we need
-            )
-            if not initial_results:
-                logger.warning("  ⚠️  No chunks found at threshold 0.4, trying lower threshold...")
-                # Fallback: Get top-k regardless of threshold
-                initial_results = await db.vector_search(
-                    query_embedding=embedding_model.embed_query(query),
-                    match_threshold=0.0,  # Get anything
-                    match_count=top_k * 5
+            degraded = False
+            try:
+                candidates = await db.vector_search(
+                    query_embedding=query_embedding,
+                    match_threshold=-1.0,  # every chunk, best first
+                    match_count=top_k * 5,
+                    project=project,
+                    raise_errors=True
                 )
+            except Exception as e:
+                # Keep answering from BM25, but this is an outage, not "no match"
+                logger.error(f"  Vector search failed, lexical only: {e}")
+                candidates, degraded = [], True
+            lexical_results = self._lexical_search(query, top_k * 3, project=project)
+            
+            result = RetrievalResult(lexical_candidates=len(lexical_results), degraded=degraded)
+            initial_results = self._apply_threshold(candidates, PRIMARY_THRESHOLD, top_k * 3)
+            # A project-scoped search always fills top_k from that project
+            if len(initial_results) >= (top_k if project else 1):
+                result.tier, result.threshold = "primary", PRIMARY_THRESHOLD
+            elif not project and self._strong_lexical(lexical_results):
+                # Strong exact-term BM25 hits beat low-similarity vectors
+                result.tier = "lexical"
+            else:
+                logger.warning(f"  ⚠️  Not enough chunks above {PRIMARY_THRESHOLD}, using fallback tier...")
+                initial_results = self._apply_threshold(candidates, FALLBACK_THRESHOLD, top_k * 5)
+                if initial_results:
+                    result.tier, result.threshold = "fallback", FALLBACK_THRESHOLD
+            result.vector_candidates = len(initial_results)
+            
+            if lexical_results:
+                initial_results = await self._fuse_hybrid(initial_results, lexical_results)
+            
             if not initial_results:
                 logger.warning("  No chunks found in initial retrieval")
-                return []
+                return result
             
             # Convert to RetrievedChunk objects
             initial_chunks = self._convert_to_chunks(initial_results)
-            logger.info(f"  ✓ Retrieved {len(initial_chunks)} candidates")
+            logger.info(f"  ✓ Retrieved {len(initial_chunks)} candidates (tier: {result.tier})")
             
             if not initial_chunks:
                 logger.warning("  Failed to convert results to chunks")
-                return []
+                return result
             
             # Level 2: Deduplication
             logger.info("  Level 2: Deduplication...")
-            deduplicated = self._deduplicate_chunks(initial_chunks, threshold=0.80)
-            
-            # Level 3: Clustering by project
-            logger.info("  Level 3: Clustering by project...")
-            clusters = self._cluster_by_project(deduplicated)
-            logger.info(f"  ✓ Found {len(clusters)} projects: {list(clusters.keys())}")
-            
-            # Level 4: Diverse selection
-            logger.info("  Level 4: Selecting diverse chunks...")
-            diverse_chunks = self._select_diverse_chunks(clusters, target_count=top_k * 2)
+            deduplicated = self._deduplicate_chunks(initial_chunks)
             
-            # Level 5: Re-ranking by relevance
-            logger.info("  Level 5: Re-ranking by relevance...")
-            final_chunks = self._rerank_by_relevance(diverse_chunks, query, top_k=top_k)
+            # Level 3: Relevance + diversity in one MMR pass
+            logger.info("  Level 3: MMR selection...")
+            final_chunks = self._select_mmr(
+                deduplicated,
+                query,
+                top_k=top_k,
+                query_embedding=query_embedding
+            )
             
             logger.info(f"  ✓ Final: {len(final_chunks)} chunks from {len(set(c.source for c in final_chunks))} projects")
             
-            return final_chunks
+            result.chunks = final_chunks
+            return result
             
         except Exception as e:
             logger.error(f"Advanced RAG failed: {e}")
             import traceback
             traceback.print_exc()
-            return []
+            return RetrievalResult(tier="error")
 
 # Global instance
 advanced_rag = AdvancedRAG()
\ No newline at end of file
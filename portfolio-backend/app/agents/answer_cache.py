@@ -0,0 +1,195 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.models.schemas import ExtendedJudgeScore
+
+logger = logging.getLogger(__name__)
+
+
+class CachedAnswer:
+    __slots__ = ("question", "vector", "response", "judge_score", "stored_at")
+
+    def __init__(self, question: str, vector: np.ndarray, response: str, judge_score: Optional[ExtendedJudgeScore]):
+        self.question = question
+        self.vector = vector
+        self.response = response
+        self.judge_score = judge_score
+        self.stored_at = time.monotonic()
+
+
+class AnswerCache:
+    """
+    Semantic cache of judged chat answers (skips generation + judge rounds)
+    - A hit needs the same mode, the same retrieved chunk ids and the same
+      corpus version, plus question cosine >= threshold
+    - Entries are bucketed by (mode, chunk ids, corpus version), so a lookup
+      is one small matmul over questions that retrieved the same context
+    - Only answers that passed the judge are stored; unjudged_modes (empty
+      by default) opts modes the judge never runs for, e.g. recruiter, into
+      storing answers with judge_score None, counted as unjudged
+    - LRU eviction with an entry cap, TTL, thread-safe
+    """
+
+    def __init__(self, max_entries: int = 128, ttl_seconds: float = 3600, threshold: float = 0.95,
+                 unjudged_modes: Iterable[str] = ()):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.unjudged_modes = frozenset(unjudged_modes)
+
+        self._entries: "OrderedDict[int, Tuple[Tuple, CachedAnswer]]" = OrderedDict()
+        self._buckets: Dict[Tuple, List[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejected = 0  # answers not stored because the judge did not pass them
+        self.unjudged = 0  # answers stored under the unjudged-mode policy
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def bucket(mode: str, chunk_ids: List[str], corpus_version: int) -> Tuple:
+        return (mode, tuple(sorted(str(chunk_id) for chunk_id in chunk_ids)), corpus_version)
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    @staticmethod
+    def passed(judge_score: Optional[ExtendedJudgeScore]) -> bool:
+        return (
+            judge_score is not None
+            and not judge_score.revision_required
+            and not judge_score.should_reject()
+        )
+
+    def get(self, query_embedding, mode: str, chunk_ids: List[str], corpus_version: int) -> Optional[CachedAnswer]:
+        """Closest cached answer above the threshold, or None (counts hit/miss)"""
+        if not self.enabled:
+            return None
+
+        bucket = self.bucket(mode, chunk_ids, corpus_version)
+        query = self._normalize(query_embedding)
+
+        with self._lock:
+            self._expire_bucket(bucket)
+            entry_ids = self._buckets.get(bucket)
+            if not entry_ids:
+                self.misses += 1
+                return None
+
+            entries = [self._entries[entry_id][1] for entry_id in entry_ids]
+            candidates = [i for i, entry in enumerate(entries) if len(entry.vector) == len(query)]
+            if not candidates:
+                self.misses += 1
+                return None
+
+            scores = np.stack([entries[i].vector for i in candidates]) @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            entry_id = entry_ids[candidates[best]]
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            entry = entries[candidates[best]]
+
+        logger.info(f"⚡ Answer cache hit (cosine {scores[best]:.3f} with '{entry.question[:40]}...')")
+        return entry
+
+    def put(self, question: str, query_embedding, mode: str, chunk_ids: List[str], corpus_version: int,
+            response: str, judge_score: Optional[ExtendedJudgeScore]) -> bool:
+        """Store an answer that passed the judge; returns False when it was not eligible"""
+        if not self.enabled:
+            return False
+        # A failed score is never stored; a missing one only in an opted-in unjudged mode
+        unjudged = judge_score is None and mode in self.unjudged_modes
+        if not unjudged and not self.passed(judge_score):
+            with self._lock:
+                self.rejected += 1
+            return False
+
+        bucket = self.bucket(mode, chunk_ids, corpus_version)
+        entry = CachedAnswer(
+            question, self._normalize(query_embedding), response,
+            None if unjudged else judge_score.model_copy()
+        )
+
+        with self._lock:
+            if unjudged:
+                self.unjudged += 1
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (bucket, entry)
+            self._buckets.setdefault(bucket, []).append(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def _expire_bucket(self, bucket: Tuple) -> None:
+        if not self.ttl_seconds:
+            return
+        now = time.monotonic()
+        for entry_id in list(self._buckets.get(bucket, ())):
+            if now - self._entries[entry_id][1].stored_at > self.ttl_seconds:
+                self._remove(entry_id)
+                self.expirations += 1
+
+    def _remove(self, entry_id: int) -> None:
+        bucket, _ = self._entries.pop(entry_id)
+        entry_ids = self._buckets[bucket]
+        entry_ids.remove(entry_id)
+        if not entry_ids:
+            del self._buckets[bucket]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> Dict:
+        """Hit-rate and size counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "buckets": len(self._buckets),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "rejected": self.rejected,
+                "unjudged_modes": sorted(self.unjudged_modes),
+                "unjudged": self.unjudged,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Global instance
+answer_cache = AnswerCache(
+    max_entries=settings.ANSWER_CACHE_SIZE,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+    unjudged_modes=[mode.strip() for mode in settings.ANSWER_CACHE_UNJUDGED_MODES.split(",") if mode.strip()]
+)
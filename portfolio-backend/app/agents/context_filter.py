@@ -121,7 +121,8 @@ Guidelines:
 async def detect_topic_shift_via_embeddings(
     current_query: str,
     previous_query: Optional[str],
-    threshold: float = 0.65
+    threshold: float = 0.65,
+    embeddings=None
 ) -> bool:
     """
     Use embedding similarity to detect topic shift
@@ -130,6 +131,7 @@ async def detect_topic_shift_via_embeddings(
         current_query: Current user question
         previous_query: Previous user question
         threshold: Similarity threshold (0.65 = tuned for topic detection)
+        embeddings: Request-scoped RequestEmbeddings (current query vector is reused by retrieval)
     
     Returns:
         True if topic shifted (should NOT filter)
@@ -139,12 +141,14 @@ async def detect_topic_shift_via_embeddings(
         return True  # New conversation, no filter
     
     try:
-        from app.embeddings.nomic import embedding_model
+        from app.embeddings.context import RequestEmbeddings
         import numpy as np
         
+        embeddings = embeddings or RequestEmbeddings()
+        
         # Get embeddings
-        current_emb = np.array(embedding_model.embed_query(current_query))
-        previous_emb = np.array(embedding_model.embed_query(previous_query))
+        current_emb = np.array(await embeddings.aembed_query(current_query))
+        previous_emb = np.array(await embeddings.aembed_query(previous_query))
         
         # Ensure same dimension
         if len(current_emb) != len(previous_emb):
@@ -179,7 +183,8 @@ async def smart_context_decision(
     conversation_history: List[Dict],
     previous_project: Optional[str] = None,
     use_llm: bool = True,
-    use_embeddings: bool = True
+    use_embeddings: bool = True,
+    embeddings=None
 ) -> Dict[str, any]:
     """
     HYBRID APPROACH: Combine LLM intent + embedding similarity
@@ -215,7 +220,7 @@ async def smart_context_decision(
         
         if previous_query:
             embedding_shift = await detect_topic_shift_via_embeddings(
-                current_query, previous_query, threshold=0.65
+                current_query, previous_query, threshold=0.65, embeddings=embeddings
             )
     
     # Combine signals (LLM has priority, embeddings as confirmation)
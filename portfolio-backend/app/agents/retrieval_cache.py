@@ -0,0 +1,134 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+from app.models.schemas import RetrievalResult
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCT_RE = re.compile(r"[\s?!.,;:]+$")
+
+
+def normalize_query(query: str) -> str:
+    """Case, whitespace and trailing punctuation don't change retrieval"""
+    return _TRAILING_PUNCT_RE.sub("", _WHITESPACE_RE.sub(" ", query.strip().lower()))
+
+
+class RetrievalCache:
+    """
+    Process-wide cache in front of AdvancedRAG.retrieve_advanced
+    - Keyed by (normalised query, top_k, project filter, corpus version)
+    - corpus version is bumped by ingest/delete and by mirror reloads,
+      so stale entries simply stop matching and age out of the LRU
+    - LRU eviction with an entry cap, optional TTL (bounds staleness when
+      another worker ingested), thread-safe
+    - Cached chunks drop their embeddings (only needed inside retrieval)
+    - Take the key before retrieving: a retrieval that overlaps an ingest is
+      stored under the version it started from, so it can never be served
+      as current
+    - Empty, degraded (vector search down) and failed results are not stored
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.corpus_version = 0
+
+        self._entries: "OrderedDict[Tuple, Tuple[RetrievalResult, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def key(self, query: str, top_k: int, project: Optional[str]) -> Tuple:
+        return (normalize_query(query), top_k, project.lower() if project else None, self.corpus_version)
+
+    def get(self, key: Tuple) -> Optional[RetrievalResult]:
+        """Return a copy of the cached result or None (counts hit/miss)"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            result, stored_at = entry
+            if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return result.model_copy(update={"chunks": list(result.chunks)})
+
+    def put(self, key: Tuple, result: RetrievalResult) -> None:
+        """Store a successful retrieval under the key taken before it ran (LRU over the cap)"""
+        if not self.enabled or result.tier == "error" or result.degraded or not result.chunks:
+            return
+
+        stored = result.model_copy(update={
+            "chunks": [chunk.model_copy(update={"embedding": []}) for chunk in result.chunks]
+        })
+        with self._lock:
+            if key[-1] != self.corpus_version:
+                return  # the corpus changed while retrieving
+            self._entries[key] = (stored, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def bump_version(self) -> int:
+        """Corpus changed: every existing entry becomes unreachable"""
+        with self._lock:
+            self.corpus_version += 1
+            self.invalidations += 1
+            # Old-version entries can never hit again, free them now
+            self._entries.clear()
+        logger.info(f"🔄 Retrieval cache invalidated (corpus version {self.corpus_version})")
+        return self.corpus_version
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Hit-rate and size counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "corpus_version": self.corpus_version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Global instance
+retrieval_cache = RetrievalCache(
+    max_entries=settings.RETRIEVAL_CACHE_SIZE,
+    ttl_seconds=settings.RETRIEVAL_CACHE_TTL_SECONDS
+)
@@ -6,18 +6,80 @@ class Settings(BaseSettings):
     # Environment
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
     DEBUG: bool = os.getenv("DEBUG", "true").lower() == "true"
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", "1"))  # worker processes
     
     # Supabase
     SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
     SUPABASE_KEY: str = os.getenv("SUPABASE_KEY", "")
     SUPABASE_SERVICE_ROLE_KEY: str = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
+    SUPABASE_HTTP2: bool = os.getenv("SUPABASE_HTTP2", "true").lower() == "true"
+    SUPABASE_TIMEOUT_SECONDS: float = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "10"))  # per-call deadline
+    SUPABASE_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("SUPABASE_CONNECT_TIMEOUT_SECONDS", "3"))
+    SUPABASE_POOL_MAX_CONNECTIONS: int = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "20"))  # per worker
+    SUPABASE_POOL_MAX_KEEPALIVE: int = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "10"))
+    SUPABASE_POOL_KEEPALIVE_EXPIRY: float = float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", "30"))
+    WRITE_QUEUE_MAX_ROWS: int = int(os.getenv("WRITE_QUEUE_MAX_ROWS", "10000"))  # buffered rows before dropping
+    WRITE_QUEUE_BATCH_SIZE: int = int(os.getenv("WRITE_QUEUE_BATCH_SIZE", "100"))
+    WRITE_QUEUE_FLUSH_MS: float = float(os.getenv("WRITE_QUEUE_FLUSH_MS", "200"))
+    WRITE_QUEUE_MAX_RETRIES: int = int(os.getenv("WRITE_QUEUE_MAX_RETRIES", "5"))
+    WRITE_QUEUE_BACKOFF_MS: float = float(os.getenv("WRITE_QUEUE_BACKOFF_MS", "200"))  # doubles per retry
+    POPULAR_QUERIES_CAPACITY: int = int(os.getenv("POPULAR_QUERIES_CAPACITY", "1000"))  # Space-Saving counters per mode
+    POPULAR_QUERIES_PATH: str = os.getenv("POPULAR_QUERIES_PATH", "data/analytics/popular_queries.json")  # shared by workers, empty = in-memory only
+    POPULAR_QUERIES_SYNC_SECONDS: float = float(os.getenv("POPULAR_QUERIES_SYNC_SECONDS", "60"))
+    SESSION_REGISTRY_SIZE: int = int(os.getenv("SESSION_REGISTRY_SIZE", "10000"))  # known session ids per worker
+    HISTORY_MAX_MESSAGES: int = int(os.getenv("HISTORY_MAX_MESSAGES", "6"))  # ring buffer per session
+    HISTORY_MAX_BYTES: int = int(os.getenv("HISTORY_MAX_BYTES", str(16 * 1024 * 1024)))  # all buffers, per worker
+    HISTORY_IDLE_SECONDS: float = float(os.getenv("HISTORY_IDLE_SECONDS", "1800"))
+    # Warm history buffers re-check the table for turns another worker answered
+    # (default on with several workers: requests are not routed stickily)
+    HISTORY_CATCH_UP: bool = os.getenv("HISTORY_CATCH_UP", "true" if int(os.getenv("WEB_CONCURRENCY", "1")) > 1 else "false").lower() == "true"
+    HISTORY_CATCH_UP_LAG_SECONDS: float = float(os.getenv("HISTORY_CATCH_UP_LAG_SECONDS", "5"))  # covers other workers' write-behind delay
     
     # Groq
     GROQ_API_KEY: str = os.getenv("GROQ_API_KEY", "")
     
     # Embeddings
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "nomic-embed-text-v1.5")
-    EMBEDDING_DIMENSION: int = int(os.getenv("EMBEDDING_DIMENSION", "768"))
+    EMBEDDING_DIMENSION: int = int(os.getenv("EMBEDDING_DIMENSION", "768"))  # Matryoshka: 768 | 512 | 256 | 128
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "torch")  # torch | onnx | onnx-int8
+    EMBEDDING_ONNX_PATH: str = os.getenv("EMBEDDING_ONNX_PATH", "")  # empty = download onnx/model.onnx from the hub
+    EMBEDDING_ONNX_QUANTIZE: bool = os.getenv("EMBEDDING_ONNX_QUANTIZE", "false").lower() == "true"
+    EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))  # 0 disables
+    EMBEDDING_CACHE_MAX_BYTES: int = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    EMBEDDING_CACHE_TTL_SECONDS: float = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "0"))  # 0 = no expiry
+    EMBEDDING_EXECUTOR_WORKERS: int = int(os.getenv("EMBEDDING_EXECUTOR_WORKERS", "2"))
+    EMBEDDING_INTRA_OP_THREADS: int = int(os.getenv("EMBEDDING_INTRA_OP_THREADS", "0"))  # 0 = cores / WEB_CONCURRENCY
+    EMBEDDING_INTER_OP_THREADS: int = int(os.getenv("EMBEDDING_INTER_OP_THREADS", "1"))
+    EMBEDDING_BATCH_MAX_SIZE: int = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))  # 1 disables micro-batching
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+    
+    # Retrieval
+    LOCAL_VECTOR_INDEX: bool = os.getenv("LOCAL_VECTOR_INDEX", "false").lower() == "true"  # in-process mirror of portfolio_chunks
+    LOCAL_INDEX_REFRESH_SECONDS: float = float(os.getenv("LOCAL_INDEX_REFRESH_SECONDS", "60"))  # staleness check interval
+    INDEX_SNAPSHOT_PATH: str = os.getenv("INDEX_SNAPSHOT_PATH", "")  # memory-mapped snapshot dir (export_index_snapshot.py)
+    BM25_INDEX: bool = os.getenv("BM25_INDEX", "true").lower() == "true"  # lexical side of hybrid retrieval
+    BM25_INDEX_PATH: str = os.getenv("BM25_INDEX_PATH", "data/index/bm25.json")
+    BM25_K1: float = float(os.getenv("BM25_K1", "1.2"))
+    BM25_B: float = float(os.getenv("BM25_B", "0.75"))
+    BM25_LEXICAL_MIN_SCORE: float = float(os.getenv("BM25_LEXICAL_MIN_SCORE", "2.0"))  # best BM25 hit needed to beat the vector fallback
+    RRF_K: int = int(os.getenv("RRF_K", "60"))  # reciprocal rank fusion constant
+    DEDUP_JACCARD_THRESHOLD: float = float(os.getenv("DEDUP_JACCARD_THRESHOLD", "0.7"))  # near-duplicate groups at ingest
+    MINHASH_PERMUTATIONS: int = int(os.getenv("MINHASH_PERMUTATIONS", "64"))
+    MINHASH_BANDS: int = int(os.getenv("MINHASH_BANDS", "16"))
+    MMR_LAMBDA: float = float(os.getenv("MMR_LAMBDA", "0.7"))  # 1 = pure relevance, 0 = pure diversity
+    MMR_PROJECT_CAP: int = int(os.getenv("MMR_PROJECT_CAP", "3"))  # max chunks per project, 0 = no cap
+    RETRIEVAL_CACHE_SIZE: int = int(os.getenv("RETRIEVAL_CACHE_SIZE", "256"))  # 0 disables
+    RETRIEVAL_CACHE_TTL_SECONDS: float = float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "300"))  # bounds cross-worker staleness
+    ANSWER_CACHE_SIZE: int = int(os.getenv("ANSWER_CACHE_SIZE", "128"))  # judged answers, 0 disables
+    ANSWER_CACHE_TTL_SECONDS: float = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+    ANSWER_CACHE_THRESHOLD: float = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # question cosine for a hit
+    # Opt-in: modes whose never-judged answers may still be cached (e.g. "recruiter"); empty = judged answers only
+    ANSWER_CACHE_UNJUDGED_MODES: str = os.getenv("ANSWER_CACHE_UNJUDGED_MODES", "")
+    LOCAL_INDEX_TYPE: str = os.getenv("LOCAL_INDEX_TYPE", "exact")  # exact | hnsw
+    HNSW_M: int = int(os.getenv("HNSW_M", "16"))
+    HNSW_EF_CONSTRUCTION: int = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+    HNSW_EF_SEARCH: int = int(os.getenv("HNSW_EF_SEARCH", "64"))
+    HNSW_INDEX_PATH: str = os.getenv("HNSW_INDEX_PATH", "data/index/portfolio_chunks.hnsw")  # empty = no persistence
     
     # CORS
     CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:3001"]
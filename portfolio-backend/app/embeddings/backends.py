@@ -0,0 +1,153 @@
+import logging
+import os
+from typing import List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "nomic-ai/nomic-embed-text-v1.5"
+
+
+def intra_op_threads() -> int:
+    """
+    Intra-op threads per worker process
+    EMBEDDING_INTRA_OP_THREADS, or (0 = auto) the cores split evenly across
+    WEB_CONCURRENCY workers so workers don't oversubscribe the node
+    """
+    from app.config import settings
+
+    if settings.EMBEDDING_INTRA_OP_THREADS > 0:
+        return settings.EMBEDDING_INTRA_OP_THREADS
+    cores = os.cpu_count() or 1
+    return max(1, cores // max(1, settings.WEB_CONCURRENCY))
+
+
+def configure_torch_threads() -> None:
+    """Apply intra/inter-op thread counts (call again in each forked worker)"""
+    from app.config import settings
+    import torch
+
+    threads = intra_op_threads()
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(settings.EMBEDDING_INTER_OP_THREADS)
+    except RuntimeError:
+        # Only settable once, before any inter-op work has run
+        pass
+    logger.info(f"✓ torch threads: intra-op={threads}, inter-op={torch.get_num_interop_threads()}")
+
+
+class TorchBackend:
+    """Full-precision PyTorch model via sentence-transformers"""
+
+    name = "torch"
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        configure_torch_threads()
+        self.model = SentenceTransformer(
+            model_name,
+            trust_remote_code=True,
+            device="cpu"
+        )
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Returns float32 array of shape (len(texts), dim)"""
+        return np.asarray(self.model.encode(texts), dtype=np.float32)
+
+
+class OnnxBackend:
+    """
+    ONNX Runtime model (optionally int8 dynamically quantized)
+    - Same pipeline as the sentence-transformers model:
+      tokenize -> transformer -> mean pooling -> L2 normalize
+    - Vectors stay compatible with those stored by the torch backend
+    """
+
+    def __init__(self, model_name: str, onnx_path: str = "", quantize: bool = False):
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError(
+                "EMBEDDING_BACKEND=onnx requires onnxruntime (pip install onnxruntime)"
+            ) from e
+
+        if not onnx_path:
+            from huggingface_hub import hf_hub_download
+            onnx_path = hf_hub_download(model_name, "onnx/model.onnx")
+
+        if quantize:
+            onnx_path = self._quantize(onnx_path)
+
+        self.name = "onnx-int8" if quantize else "onnx"
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.max_length = min(self.tokenizer.model_max_length, 8192)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads()
+
+        self.session = ort.InferenceSession(
+            onnx_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        logger.info(f"✓ ONNX session ready: {onnx_path}")
+
+    @staticmethod
+    def _quantize(onnx_path: str) -> str:
+        """Int8 dynamic quantization, cached next to the source model"""
+        root, ext = os.path.splitext(onnx_path)
+        quantized_path = f"{root}.int8{ext}"
+        if os.path.exists(quantized_path):
+            return quantized_path
+
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logger.info(f"Quantizing {onnx_path} to int8...")
+        quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8)
+        return quantized_path
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Returns float32 array of shape (len(texts), dim)"""
+        tokens = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np"
+        )
+        feeds = {
+            name: tokens[name].astype(np.int64)
+            for name in ("input_ids", "attention_mask", "token_type_ids")
+            if name in self.input_names and name in tokens
+        }
+        if "token_type_ids" in self.input_names and "token_type_ids" not in feeds:
+            feeds["token_type_ids"] = np.zeros_like(feeds["input_ids"])
+
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # Mean pooling over real tokens, then L2 normalize
+        mask = tokens["attention_mask"][..., None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+def load_backend(backend: str, model_name: str):
+    """Build the configured embedding backend"""
+    from app.config import settings
+
+    backend = (backend or "torch").lower()
+    if backend == "torch":
+        return TorchBackend(model_name)
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxBackend(
+            model_name,
+            onnx_path=settings.EMBEDDING_ONNX_PATH,
+            quantize=backend == "onnx-int8" or settings.EMBEDDING_ONNX_QUANTIZE
+        )
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from concurrent.futures import Executor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """Fixed-bucket counter histogram (upper-inclusive buckets)"""
+
+    def __init__(self, buckets: Sequence[int]):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0
+        self.sum = 0
+
+    def observe(self, value: int) -> None:
+        self.total += 1
+        self.sum += value
+        for idx, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[idx] += 1
+                return
+        self.counts[-1] += 1
+
+    def snapshot(self) -> Dict:
+        labels = [f"<={bound}" for bound in self.buckets] + [f">{self.buckets[-1]}"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.total,
+            "mean": self.sum / self.total if self.total else 0.0,
+        }
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching for concurrent single-text embeds
+    - Collects requests for up to max_wait_ms or max_batch_size items
+    - Runs one batched encode on the executor and fans results back out
+    - Identical texts inside a batch are encoded once
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], List[List[float]]], executor: Executor,
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0, max_concurrent_batches: int = 1):
+        self.encode_fn = encode_fn
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._arrived: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.queue_depth = Histogram([0, 1, 2, 4, 8, 16, 32, 64, 128])
+        self.batch_size = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_worker(self) -> None:
+        """Bind to the running loop and start the collector task"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._worker and not self._worker.done():
+            return
+
+        self._loop = loop
+        self._arrived = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._worker = loop.create_task(self._run())
+
+    async def submit(self, text: str) -> List[float]:
+        """Queue one text and wait for its vector"""
+        self._ensure_worker()
+
+        self.queue_depth.observe(len(self._pending))
+        future = self._loop.create_future()
+        self._pending.append((text, future))
+        self._arrived.set()
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            await self._arrived.wait()
+            self._arrived.clear()
+            if not self._pending:
+                continue
+
+            # Wait for more arrivals until the batch is full or the window closes
+            deadline = self._loop.time() + self.max_wait
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._arrived.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                self._arrived.clear()
+
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            if self._pending:
+                self._arrived.set()
+
+            await self._slots.acquire()
+            self._loop.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            self.batches += 1
+            self.items += len(batch)
+            self.batch_size.observe(len(batch))
+
+            try:
+                vectors = await self._loop.run_in_executor(self.executor, self.encode_fn, texts)
+            except Exception as e:
+                logger.error(f"Micro-batch of {len(texts)} failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            by_text = dict(zip(texts, vectors))
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(by_text[text])
+
+            logger.debug(f"✓ Micro-batch: {len(batch)} requests, {len(texts)} encoded")
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "queue_depth": self.queue_depth.snapshot(),
+            "batch_size": self.batch_size.snapshot(),
+        }
@@ -0,0 +1,119 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Process-wide embedding cache
+    - Keyed by a SHA-256 content hash (plus model namespace)
+    - LRU eviction with entry and byte caps
+    - Optional TTL (0 = never expire)
+    - Thread-safe, vectors stored as float32
+    """
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: float = 0, namespace: str = ""):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.namespace = namespace
+
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def key(self, text: str) -> str:
+        """Content hash for a text"""
+        return hashlib.sha256(f"{self.namespace}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Return cached vector or None (counts hit/miss)"""
+        if not self.enabled:
+            return None
+
+        key = self.key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            vector, stored_at = entry
+            if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, text: str, vector) -> None:
+        """Store a vector, evicting least recently used entries over the caps"""
+        if not self.enabled:
+            return
+
+        vector = np.asarray(vector, dtype=np.float32)
+        if vector.nbytes > self.max_bytes:
+            return
+        vector.setflags(write=False)
+
+        key = self.key(text)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (vector, time.monotonic())
+            self._bytes += vector.nbytes
+
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        vector, _ = self._entries.pop(key)
+        self._bytes -= vector.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        """Hit-rate and size counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,51 @@
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RequestEmbeddings:
+    """
+    Request-scoped embedding memo
+    - Each distinct text is encoded once per request
+    - Passed down through context decision, retrieval and re-ranking
+    """
+
+    def __init__(self, model=None):
+        if model is None:
+            from app.embeddings.nomic import embedding_model
+            model = embedding_model
+        self.model = model
+        self._vectors: Dict[str, List[float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed text, reusing the vector if this request already encoded it"""
+        vector = self._vectors.get(text)
+        if vector is not None:
+            self.hits += 1
+            logger.debug(f"✓ Request embedding reused ({self.hits} hits)")
+            return vector
+
+        self.misses += 1
+        vector = self.model.embed_query(text)
+        self._vectors[text] = vector
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Async variant: encodes off the event loop on a miss"""
+        vector = self._vectors.get(text)
+        if vector is not None:
+            self.hits += 1
+            logger.debug(f"✓ Request embedding reused ({self.hits} hits)")
+            return vector
+
+        self.misses += 1
+        vector = await self.model.aembed_query(text)
+        self._vectors[text] = vector
+        return vector
+
+    def get(self, text: str) -> Optional[List[float]]:
+        """Return an already computed vector without encoding"""
+        return self._vectors.get(text)
@@ -0,0 +1,35 @@
+import numpy as np
+
+# nomic-embed-text-v1.5 was trained with Matryoshka loss at these sizes
+FULL_DIMENSION = 768
+SUPPORTED_DIMENSIONS = (768, 512, 256, 128)
+
+
+def validate_dimension(dimension: int) -> int:
+    if dimension not in SUPPORTED_DIMENSIONS:
+        raise ValueError(
+            f"EMBEDDING_DIMENSION must be one of {SUPPORTED_DIMENSIONS}, got {dimension}"
+        )
+    return dimension
+
+
+def truncate_embeddings(embeddings, dimension: int) -> np.ndarray:
+    """
+    Matryoshka truncation as specified for nomic-embed-text-v1.5:
+    layer norm over the full vector -> keep first `dimension` -> L2 normalize
+
+    Layer norm is scale invariant, so this gives the same result on raw model
+    output and on already-normalised stored 768-d vectors. At full dimension
+    vectors are returned unchanged to stay identical to existing rows.
+    """
+    embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    if dimension >= embeddings.shape[1]:
+        return embeddings
+
+    mean = embeddings.mean(axis=1, keepdims=True)
+    var = embeddings.var(axis=1, keepdims=True)
+    normed = (embeddings - mean) / np.sqrt(var + 1e-5)
+
+    truncated = normed[:, :dimension]
+    norms = np.linalg.norm(truncated, axis=1, keepdims=True)
+    return truncated / np.clip(norms, 1e-12, None)
@@ -1,43 +1,139 @@
+import asyncio
 import logging
-from typing import List
-from sentence_transformers import SentenceTransformer
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 import numpy as np
 
+from app.config import settings
+from app.embeddings.cache import EmbeddingCache
+from app.embeddings.batcher import MicroBatcher
+from app.embeddings.backends import MODEL_NAME, load_backend
+from app.embeddings.matryoshka import truncate_embeddings, validate_dimension
+
 logger = logging.getLogger(__name__)
 
 class NomicEmbeddings:
     """
     Free embedding model using Nomic Embed Text v1.5
-    - 768 dimensions
+    - 768 dimensions (Matryoshka truncation to 512/256/128 via EMBEDDING_DIMENSION)
     - No API cost
     - Runs locally
     - MIT License
+    - Process-wide LRU/TTL cache in front of the model
+    - Async API (aembed_*) runs inference on a dedicated thread pool
+    - Concurrent aembed_query calls are micro-batched into one encode
+    - Pluggable backend: torch (default) or ONNX Runtime, optionally int8
+    - Model loads lazily on first use or via warmup() at startup
     """
     
+    MODEL_NAME = MODEL_NAME
+    
     def __init__(self):
-        logger.info("Loading Nomic Embed Text model...")
-        try:
-            self.model = SentenceTransformer(
-                "nomic-ai/nomic-embed-text-v1.5",
-                trust_remote_code=True,
-                device="cpu"
+        self.backend_name = settings.EMBEDDING_BACKEND.lower()
+        self.dimension = validate_dimension(settings.EMBEDDING_DIMENSION)
+        
+        # Vectors from different backends/dimensions differ, keep them apart
+        self.cache = EmbeddingCache(
+            max_entries=settings.EMBEDDING_CACHE_SIZE,
+            max_bytes=settings.EMBEDDING_CACHE_MAX_BYTES,
+            ttl_seconds=settings.EMBEDDING_CACHE_TTL_SECONDS,
+            namespace=f"{self.MODEL_NAME}:{self.backend_name}:{self.dimension}"
+        )
+        
+        # torch releases the GIL during inference, so threads overlap CPU work
+        # of concurrent requests while keeping the event loop free
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.EMBEDDING_EXECUTOR_WORKERS,
+            thread_name_prefix="embedding"
+        )
+        
+        self.batcher = None
+        if settings.EMBEDDING_BATCH_MAX_SIZE > 1:
+            self.batcher = MicroBatcher(
+                self._encode_texts,
+                self._executor,
+                max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+                max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS,
+                max_concurrent_batches=settings.EMBEDDING_EXECUTOR_WORKERS
             )
-            logger.info(f"✓ Model loaded successfully")
-            logger.info(f"✓ Model type: {type(self.model)}")
+        
+        # Loaded on first encode (or warmup) so importing this module stays cheap
+        self.model = None
+        self.state = "idle"  # idle | loading | warming | ready | error
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self._load_lock = threading.Lock()
+    
+    def load(self):
+        """Load the backend once (thread-safe), return it"""
+        if self.model is not None:
+            return self.model
+        
+        with self._load_lock:
+            if self.model is not None:
+                return self.model
+            
+            self.state = "loading"
+            logger.info(f"Loading Nomic Embed Text model ({self.backend_name} backend)...")
+            start = time.perf_counter()
+            try:
+                model = load_backend(self.backend_name, self.MODEL_NAME)
+            except Exception as e:
+                self.state = "error"
+                logger.error(f"Failed to load model: {e}")
+                raise
+            
+            self.load_seconds = time.perf_counter() - start
+            self.model = model
+            self.state = "warming"
+            logger.info(f"✓ Model loaded successfully in {self.load_seconds:.2f}s")
+            logger.info(f"✓ Model type: {type(self.model).__name__}")
+            return self.model
+    
+    def warmup(self) -> float:
+        """Load the model and run a dummy encode to JIT and allocate buffers"""
+        self.load()
+        start = time.perf_counter()
+        try:
+            self._encode(["warmup: portfolio assistant readiness check"])
         except Exception as e:
-            logger.error(f"Failed to load model: {e}")
+            self.state = "error"
+            logger.error(f"Model warm-up failed: {e}")
             raise
+        
+        self.warmup_seconds = time.perf_counter() - start
+        logger.info(f"✓ Model warmed up in {self.warmup_seconds:.2f}s")
+        return self.load_seconds + self.warmup_seconds
+    
+    async def awarmup(self) -> float:
+        """warmup() on the embedding pool, leaving the event loop free"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.warmup)
+    
+    @property
+    def is_ready(self) -> bool:
+        return self.state == "ready"
     
     def embed_query(self, text: str) -> List[float]:
         """
         Embed a single query
-        Returns: flat list of 768 floats
+        Returns: flat list of EMBEDDING_DIMENSION floats
         """
+        cached = self.cache.get(text)
+        if cached is not None:
+            return cached.tolist()
+        
+        return self._encode_query(text)
+    
+    def _encode_query(self, text: str) -> List[float]:
+        """Run the model for one text and cache the result"""
         try:
-            # Encode returns numpy array of shape (1, 768)
-            embeddings = self.model.encode([text])
+            # Encode returns numpy array of shape (1, dimension)
+            embeddings = self._encode([text])
             
-            # embeddings is shape (1, 768)
+            # embeddings is shape (1, dimension)
             if isinstance(embeddings, np.ndarray):
                 # Get first row (only one), convert to list
                 result = embeddings[0].tolist()
@@ -51,10 +147,11 @@ class NomicEmbeddings:
                 logger.error(f"Result is {type(result)}, expected list")
                 raise ValueError(f"Embedding result is {type(result)}, not list")
             
-            if len(result) != 768:
-                logger.error(f"Embedding has {len(result)} dimensions, expected 768")
+            if len(result) != self.dimension:
+                logger.error(f"Embedding has {len(result)} dimensions, expected {self.dimension}")
                 raise ValueError(f"Wrong embedding dimension: {len(result)}")
             
+            self.cache.put(text, result)
             logger.debug(f"✓ Embedding created: {len(result)} dims, type={type(result)}")
             return result
             
@@ -64,17 +161,123 @@ class NomicEmbeddings:
             traceback.print_exc()
             raise
     
-    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+    def embed_batch(self, texts: List[str], partial: bool = False) -> List[Optional[List[float]]]:
         """
         Embed multiple texts
-        Returns: list of embeddings (each is list of 768 floats)
+        Returns: list of embeddings (each is list of EMBEDDING_DIMENSION floats);
+        with partial, a text that fails on its own gets None instead of failing the batch
+        """
+        results, missing = self._lookup_batch(texts)
+        
+        # Only run the model for texts not already cached
+        if missing:
+            self._encode_missing(texts, results, missing, partial)
+        
+        return results
+    
+    def _lookup_batch(self, texts: List[str]):
+        """Fill cached vectors, return (results, indices still missing)"""
+        results: List[List[float]] = [None] * len(texts)
+        missing = []
+        
+        for idx, text in enumerate(texts):
+            cached = self.cache.get(text)
+            if cached is not None:
+                results[idx] = cached.tolist()
+            else:
+                missing.append(idx)
+        
+        return results, missing
+    
+    def _encode_missing(self, texts: List[str], results: List[Optional[List[float]]], missing: List[int],
+                        partial: bool = False) -> List[Optional[List[float]]]:
+        """
+        Encode texts[missing] in one batch, writing into results; with partial,
+        a failed batch is retried one text at a time so only the bad ones stay None
         """
         try:
-            embeddings = self.model.encode(texts)
-            return [emb.tolist() for emb in embeddings]
+            vectors = self._encode_texts([texts[idx] for idx in missing])
+        except Exception:
+            if not partial or len(missing) == 1:
+                raise
+            logger.warning(f"Batch of {len(missing)} failed, encoding one text at a time")
+            for idx in missing:
+                try:
+                    results[idx] = self._encode_texts([texts[idx]])[0]
+                except Exception as e:
+                    logger.error(f"Error embedding text {idx}: {e}")
+            return results
+        
+        for idx, vector in zip(missing, vectors):
+            results[idx] = vector
+        return results
+    
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Backend encode followed by Matryoshka truncation"""
+        embeddings = truncate_embeddings(self.load().encode(texts), self.dimension)
+        
+        # The first successful encode (warm-up or a real request) makes us ready
+        if self.state != "ready":
+            self.state = "ready"
+        return embeddings
+    
+    def _encode_texts(self, texts: List[str]) -> List[List[float]]:
+        """Run the model on a batch and cache every vector"""
+        try:
+            embeddings = self._encode(texts)
+            
+            # Same validation as _encode_query, before anything is cached
+            if not isinstance(embeddings, np.ndarray) or embeddings.ndim != 2:
+                raise ValueError(f"Embedding batch is {type(embeddings).__name__}, expected a 2-d array")
+            if embeddings.shape != (len(texts), self.dimension):
+                logger.error(f"Embedding batch has shape {embeddings.shape}, expected ({len(texts)}, {self.dimension})")
+                raise ValueError(f"Wrong embedding batch shape: {embeddings.shape}")
+            
+            vectors = []
+            for text, emb in zip(texts, embeddings):
+                self.cache.put(text, emb)
+                vectors.append(emb.tolist())
+            return vectors
         except Exception as e:
             logger.error(f"Error embedding batch: {e}")
             raise
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        """Embed a single query without blocking the event loop"""
+        # Cache hits are answered inline, no executor hop
+        cached = self.cache.get(text)
+        if cached is not None:
+            return cached.tolist()
+        
+        # Concurrent requests share one batched encode
+        if self.batcher:
+            return await self.batcher.submit(text)
+        
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._encode_query, text)
+    
+    async def aembed_batch(self, texts: List[str], partial: bool = False) -> List[Optional[List[float]]]:
+        """Embed multiple texts without blocking the event loop (partial: see embed_batch)"""
+        results, missing = self._lookup_batch(texts)
+        if not missing:
+            return results
+        
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self._encode_missing, texts, results, missing, partial
+        )
+    
+    def shutdown(self):
+        """Stop the embedding thread pool"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    def cache_stats(self) -> dict:
+        """Embedding cache counters (hits, misses, evictions, hit rate)"""
+        return self.cache.stats()
+    
+    def batcher_stats(self) -> dict:
+        """Micro-batcher queue depth and batch size histograms"""
+        return self.batcher.stats() if self.batcher else {"enabled": False}
 
-# Global instance
+# Global instance (cheap: the model itself loads on first use / warm-up)
 embedding_model = NomicEmbeddings()
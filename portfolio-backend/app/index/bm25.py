@@ -0,0 +1,300 @@
+import asyncio
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.index.mirror import CorpusMirror, row_project
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOP_WORDS = frozenset("""
+a about an and are as at be but by can did do does for from has have how i
+in is it its me my of on or so that the their them there these they this to
+was we were what when where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+class BM25Index(CorpusMirror):
+    """
+    Persistent BM25 inverted index over portfolio_chunks
+    - Postings (term -> {chunk_id: tf}) plus document lengths
+    - Built once, updated incrementally by /api/ingest, saved to BM25_INDEX_PATH
+    - Answers exact-term queries ("TaxoCapsNet") locally, no pgvector round trip
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, path: Optional[str] = None):
+        super().__init__()
+        self.k1 = k1
+        self.b = b
+        self.path = settings.BM25_INDEX_PATH if path is None else path
+
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_len: Dict[str, int] = {}
+        self.rows: Dict[str, Dict] = {}
+        self.total_len = 0
+        self._version: Optional[Dict] = None
+        self._ready = False
+        self._save_task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    @property
+    def version(self) -> Optional[Dict]:
+        return self._version
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def _reset(self) -> None:
+        self.postings, self.doc_len, self.rows, self.total_len = {}, {}, {}, 0
+
+    def _insert(self, row: Dict) -> bool:
+        """Index one chunk; returns True if it replaced an existing one"""
+        chunk_id = str(row["id"])
+        replaced = self._remove(chunk_id)
+
+        terms = Counter(tokenize(row.get("content", "")))
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[chunk_id] = tf
+
+        length = sum(terms.values())
+        self.doc_len[chunk_id] = length
+        self.total_len += length
+        self.rows[chunk_id] = {
+            "id": chunk_id,
+            "document_id": row.get("document_id"),
+            "content": row.get("content", ""),
+            "metadata": row.get("metadata", {}),
+        }
+        return replaced
+
+    def _remove(self, chunk_id: str) -> bool:
+        row = self.rows.pop(chunk_id, None)
+        if row is None:
+            return False
+
+        for term in set(tokenize(row["content"])):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_len -= self.doc_len.pop(chunk_id, 0)
+        return True
+
+    def build(self, rows: List[Dict], version: Optional[Dict]) -> None:
+        self._reset()
+        for row in rows:
+            if row.get("id") is not None and row.get("content"):
+                self._insert(row)
+        self._version = version
+        self._ready = True
+
+    def _state(self) -> Dict:
+        return {
+            "postings": self.postings,
+            "doc_len": self.doc_len,
+            "rows": self.rows,
+            "total_len": self.total_len,
+            "version": self._version,
+        }
+
+    def _install(self, state: Dict) -> None:
+        """Swap in a state built off the loop (searches see the old or the new index, never a mix)"""
+        self.postings = state["postings"]
+        self.doc_len = state["doc_len"]
+        self.rows = state["rows"]
+        self.total_len = state["total_len"]
+        self._version = state["version"]
+        self._ready = True
+
+    def _prepare_rows(self, rows: List[Dict], version: Optional[Dict]) -> Dict:
+        """Tokenise the corpus into a fresh index (runs in a worker thread)"""
+        fresh = BM25Index(k1=self.k1, b=self.b, path="")
+        fresh.build(rows, version)
+        return fresh._state()
+
+    async def load(self, db) -> int:
+        """Reuse the saved index if it matches the corpus version, else rebuild"""
+        start = time.perf_counter()
+        version = await db.get_corpus_version()
+
+        # Parsing or tokenising the whole corpus is CPU-bound: keep it off the event loop
+        source = "disk"
+        state = await asyncio.to_thread(self._read_disk, self.path, version) if self.path else None
+        if state is None:
+            source = "supabase"
+            rows = await db.fetch_all_chunks(columns="id, document_id, content, metadata")
+            state = await asyncio.to_thread(self._prepare_rows, rows, version)
+        self._install(state)
+        if source == "supabase":
+            await self.asave()
+
+        self.loaded_at = time.time()
+        self._last_check = time.monotonic()
+        logger.info(
+            f"✓ BM25 index: {len(self)} chunks, {len(self.postings)} terms from {source} "
+            f"in {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+        return len(self)
+
+    def add(self, rows: List[Dict]) -> None:
+        """Incremental insert of freshly ingested chunks"""
+        if not self._ready or not rows:
+            return
+
+        version = self._version
+        replaced = sum(self._insert(row) for row in rows)
+        self._version = self._advance_version(version, rows, replaced)
+        logger.info(f"✓ BM25 index: +{len(rows)} chunks ({len(self)} total)")
+
+    def delete(self, chunk_ids: List[str]) -> int:
+        removed = sum(self._remove(str(chunk_id)) for chunk_id in chunk_ids)
+        if removed:
+            self._version = None
+        return removed
+
+    def _idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        n = len(self.doc_len)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def score(self, query: str, chunk_ids: Optional[List[str]] = None) -> Dict[str, float]:
+        """BM25 scores for every matching chunk (or only the given candidates)"""
+        if not self.doc_len:
+            return {}
+
+        avgdl = self.total_len / len(self.doc_len) or 1.0
+        candidates = set(chunk_ids) if chunk_ids is not None else None
+        scores: Dict[str, float] = {}
+
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf(term)
+            for chunk_id, tf in postings.items():
+                if candidates is not None and chunk_id not in candidates:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[chunk_id] / avgdl)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, top_k: int = 10, project: Optional[str] = None) -> List[Tuple[Dict, float]]:
+        """Top-k (row, bm25 score) pairs, optionally within one project"""
+        scores = self.score(query)
+        if project:
+            project = project.lower()
+            scores = {chunk_id: score for chunk_id, score in scores.items() if row_project(self.rows[chunk_id]) == project}
+        top = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(dict(self.rows[chunk_id]), score) for chunk_id, score in top]
+
+    def _snapshot(self) -> Dict:
+        """Copy of the persisted state, cheap next to the JSON encode that follows"""
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "version": self._version,
+            "postings": {term: dict(docs) for term, docs in self.postings.items()},
+            "doc_len": dict(self.doc_len),
+            "rows": dict(self.rows),
+        }
+
+    @staticmethod
+    def _write(snapshot: Dict, path: str) -> None:
+        """Atomic write through a unique temp file (every worker may save the same path)"""
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory,
+                                         prefix=f".{os.path.basename(path)}.", suffix=".tmp", delete=False) as f:
+            tmp_path = f.name
+            try:
+                json.dump(snapshot, f)
+            except BaseException:
+                f.close()
+                os.unlink(tmp_path)
+                raise
+        os.replace(tmp_path, path)
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Blocking save (shutdown, scripts)"""
+        path = path or self.path
+        if not self._ready or not path:
+            return
+
+        self._write(self._snapshot(), path)
+        logger.info(f"💾 BM25 index saved: {path} ({len(self)} chunks)")
+
+    async def asave(self, path: Optional[str] = None) -> None:
+        """Snapshot on the loop, encode + write in a thread"""
+        path = path or self.path
+        if not self._ready or not path:
+            return
+
+        await asyncio.to_thread(self._write, self._snapshot(), path)
+        logger.info(f"💾 BM25 index saved: {path} ({len(self)} chunks)")
+
+    def schedule_save(self, delay: float = 2.0) -> None:
+        """Debounced background save: a burst of ingests/deletes writes once"""
+        if self._save_task and not self._save_task.done():
+            return
+
+        async def _save_later():
+            await asyncio.sleep(delay)
+            try:
+                await self.asave()
+            except Exception as e:
+                logger.error(f"❌ BM25 index save failed: {e}")
+
+        self._save_task = asyncio.get_running_loop().create_task(_save_later())
+
+    def _read_disk(self, path: Optional[str], expected_version: Optional[Dict] = None) -> Optional[Dict]:
+        """State from the saved index, None if missing, unreadable or stale (blocking)"""
+        if not path or not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Could not load BM25 index {path}: {e}")
+            return None
+
+        if expected_version is not None and data["version"] != expected_version:
+            logger.info("BM25 index on disk is stale; rebuilding")
+            return None
+
+        return {
+            "postings": data["postings"],
+            "doc_len": data["doc_len"],
+            "rows": data["rows"],
+            "total_len": sum(data["doc_len"].values()),
+            "version": data["version"],
+        }
+
+    def load_from_disk(self, path: Optional[str] = None, expected_version: Optional[Dict] = None) -> bool:
+        state = self._read_disk(path or self.path, expected_version)
+        if state is None:
+            return False
+        self._install(state)
+        return True
+
+
+# Global instance
+bm25_index = BM25Index(k1=settings.BM25_K1, b=settings.BM25_B)
@@ -0,0 +1,367 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.embeddings.matryoshka import truncate_embeddings
+from app.index.local import LocalVectorIndex, normalize_rows
+from app.index.mirror import row_project
+from app.index.snapshot import file_sha256
+
+logger = logging.getLogger(__name__)
+
+
+def project_labels(rows: Dict[int, Dict]) -> Dict[str, np.ndarray]:
+    """project -> labels of its rows, so a project-scoped search never walks every row"""
+    grouped: Dict[str, List[int]] = {}
+    for label, row in rows.items():
+        grouped.setdefault(row_project(row), []).append(int(label))
+    return {project: np.array(labels, dtype=np.int64) for project, labels in grouped.items()}
+
+
+class HnswVectorIndex(LocalVectorIndex):
+    """
+    Approximate nearest-neighbour index (hnswlib) for large corpora
+    - Same interface as LocalVectorIndex: load / add / delete / search
+    - Incremental inserts and deletes (deleted slots are reused)
+    - Persisted to HNSW_INDEX_PATH and reused at startup when the
+      corpus version still matches Supabase; graph and sidecar are written
+      to temp files and swapped under a file lock, and the sidecar carries
+      the graph's checksum so a torn pair is rebuilt instead of loaded
+    - Saves run in a worker thread: _lock keeps add / delete from mutating
+      the graph while it is serialised
+    - Tunable M / ef_construction / ef_search
+    """
+
+    def __init__(self, dimension: int, M: Optional[int] = None, ef_construction: Optional[int] = None,
+                 ef_search: Optional[int] = None, path: Optional[str] = None):
+        super().__init__(dimension)
+        try:
+            import hnswlib
+        except ImportError as e:
+            raise ImportError("LOCAL_INDEX_TYPE=hnsw requires hnswlib (pip install hnswlib)") from e
+
+        self._hnswlib = hnswlib
+        self.M = M or settings.HNSW_M
+        self.ef_construction = ef_construction or settings.HNSW_EF_CONSTRUCTION
+        self.ef_search = ef_search or settings.HNSW_EF_SEARCH
+        self.path = settings.HNSW_INDEX_PATH if path is None else path
+
+        self.index = None
+        self._version: Optional[Dict] = None
+        self.labels: Dict[str, int] = {}
+        self.rows: Dict[int, Dict] = {}
+        self.projects: Dict[str, np.ndarray] = {}
+        self._next_label = 0
+        self._lock = threading.RLock()
+
+    @property
+    def ready(self) -> bool:
+        return self.index is not None
+
+    @property
+    def version(self) -> Optional[Dict]:
+        return self._version
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def _new_index(self, capacity: int):
+        index = self._hnswlib.Index(space="ip", dim=self.dimension)
+        index.init_index(
+            max_elements=max(capacity, 1024),
+            ef_construction=self.ef_construction,
+            M=self.M,
+            allow_replace_deleted=True
+        )
+        index.set_ef(self.ef_search)
+        return index
+
+    def _prepare_matrix(self, ids: List[str], matrix: np.ndarray, rows: List[Dict], version: Optional[Dict]):
+        """Bulk-build the graph (runs in a worker thread); _install swaps it in"""
+        index = self._new_index(len(ids) * 2)
+        labels = np.arange(len(ids), dtype=np.int64)
+        if len(ids):
+            index.add_items(matrix, labels)
+
+        by_label = {int(label): row for label, row in zip(labels, rows)}
+        return {
+            "index": index,
+            "labels": {chunk_id: int(label) for chunk_id, label in zip(ids, labels)},
+            "rows": by_label,
+            "projects": project_labels(by_label),
+            "next_label": len(ids),
+            "version": version,
+        }
+
+    def _install(self, prepared: Dict) -> None:
+        with self._lock:
+            self.projects = prepared["projects"]
+            self.index = prepared["index"]
+            self.labels = prepared["labels"]
+            self.rows = prepared["rows"]
+            self._next_label = prepared["next_label"]
+            self._version = prepared["version"]
+
+    def build_from_matrix(self, ids: List[str], matrix: np.ndarray, rows: List[Dict],
+                          version: Optional[Dict] = None) -> None:
+        """Bulk build from a normalised float32 matrix (also used by the benchmark)"""
+        self._install(self._prepare_matrix(ids, matrix, rows, version))
+
+    async def load(self, db) -> int:
+        """Reuse the on-disk index if it matches the corpus version, else rebuild and persist"""
+        version = await db.get_corpus_version()
+        if self.path:
+            prepared = await asyncio.to_thread(self._read_disk, self.path, version)
+            if prepared is not None:
+                self._install(prepared)
+                self.loaded_at = time.time()
+                self._last_check = time.monotonic()
+                logger.info(f"✓ HNSW index loaded from {self.path}: {len(self)} chunks")
+                return len(self)
+
+        count = await super().load(db)
+        if self.path:
+            await self.asave()
+        return count
+
+    def add(self, rows: List[Dict]) -> None:
+        """Incremental insert (re-inserting an id replaces it)"""
+        if not self.ready or not rows:
+            return
+
+        kept, matrix = self._rows_to_matrix(rows)
+        if not kept:
+            return
+
+        with self._lock:
+            version = self._version
+            replaced = self.delete([row["id"] for row in kept])
+
+            needed = self.index.get_current_count() + len(kept)
+            if needed > self.index.get_max_elements():
+                self.index.resize_index(needed * 2)
+
+            labels = np.arange(self._next_label, self._next_label + len(kept), dtype=np.int64)
+            self._next_label += len(kept)
+            self.index.add_items(matrix, labels, replace_deleted=True)
+
+            for label, row in zip(labels, kept):
+                self.labels[str(row["id"])] = int(label)
+                self.rows[int(label)] = row
+            for project, added in project_labels(dict(zip(labels, kept))).items():
+                current = self.projects.get(project)
+                self.projects[project] = added if current is None else np.concatenate([current, added])
+
+            self._version = self._advance_version(version, kept, replaced)
+        logger.info(f"✓ HNSW index: +{len(kept)} chunks ({len(self)} total)")
+
+    def delete(self, chunk_ids: List[str]) -> int:
+        """Mark chunks deleted; their slots are reused by later inserts"""
+        if not self.ready:
+            return 0
+
+        removed = 0
+        doomed: Dict[str, List[int]] = {}
+        with self._lock:
+            for chunk_id in chunk_ids:
+                label = self.labels.pop(str(chunk_id), None)
+                if label is None:
+                    continue
+                self.index.mark_deleted(label)
+                row = self.rows.pop(label, None)
+                if row is not None:
+                    doomed.setdefault(row_project(row), []).append(label)
+                removed += 1
+            for project, labels in doomed.items():
+                remaining = np.setdiff1d(self.projects.get(project, np.zeros(0, dtype=np.int64)), labels)
+                if len(remaining):
+                    self.projects[project] = remaining
+                else:
+                    self.projects.pop(project, None)
+
+            if removed:
+                self._version = None
+        return removed
+
+    def get_embeddings(self, chunk_ids: List[str]) -> Dict[str, List[float]]:
+        if not self.ready:
+            return {}
+        found = [(str(chunk_id), self.labels[str(chunk_id)]) for chunk_id in chunk_ids if str(chunk_id) in self.labels]
+        if not found:
+            return {}
+        vectors = self.index.get_items([label for _, label in found], return_type="numpy")
+        return {chunk_id: vector.tolist() for (chunk_id, _), vector in zip(found, vectors)}
+
+    def search(self, query_embedding: List[float], match_threshold: float = 0.6, match_count: int = 5,
+               project: Optional[str] = None) -> List[Dict]:
+        """Approximate cosine top-k, same contract as the match_portfolio_chunks RPC"""
+        if not self.ready or not self.labels or match_count <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if len(query) > self.dimension:
+            query = truncate_embeddings(query, self.dimension)[0]
+        query = normalize_rows(query[None, :])
+
+        if project:
+            labels, distances = self._project_scan(query[0], project.lower(), match_count)
+        else:
+            k = min(match_count, len(self.labels))
+            # ef must be >= k for hnswlib to return k results
+            self.index.set_ef(max(self.ef_search, k))
+            labels, distances = self.index.knn_query(query, k=k)
+        if not len(labels[0]):
+            return []
+
+        results = []
+        vectors = self.index.get_items(labels[0], return_type="numpy")
+        for label, distance, vector in zip(labels[0], distances[0], vectors):
+            similarity = 1.0 - float(distance)
+            if similarity <= match_threshold:
+                break
+            row = dict(self.rows[int(label)])
+            row["similarity"] = similarity
+            row["embedding"] = vector.tolist()
+            results.append(row)
+        return results
+
+    def _project_scan(self, query: np.ndarray, project: str, match_count: int):
+        """
+        Exact scan of one project's vectors: a project is a small slice of the
+        corpus, and a filtered graph walk could return fewer than match_count
+        """
+        labels = self.projects.get(project, np.zeros(0, dtype=np.int64))
+        if not len(labels):
+            return [labels], [np.zeros(0, dtype=np.float32)]
+
+        distances = 1.0 - self.index.get_items(labels, return_type="numpy") @ query
+        top = np.argsort(distances, kind="stable")[:match_count]
+        return [labels[top]], [distances[top]]
+
+    def _meta(self) -> Dict:
+        """ids/rows/version sidecar (call with _lock held)"""
+        return {
+            "dimension": self.dimension,
+            "M": self.M,
+            "ef_construction": self.ef_construction,
+            "version": self._version,
+            "next_label": self._next_label,
+            "labels": dict(self.labels),
+            "rows": {str(label): row for label, row in self.rows.items()},
+        }
+
+    def _write(self, path: str) -> int:
+        """
+        Serialise graph + sidecar to temp files, then swap both under a file
+        lock (every worker may save the same path); returns the chunk count
+        """
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        prefix = f".{os.path.basename(path)}."
+        graph_fd, graph_tmp = tempfile.mkstemp(dir=directory, prefix=prefix, suffix=".graph.tmp")
+        os.close(graph_fd)
+        meta_tmp = None
+        try:
+            with self._lock:  # no add / delete while the graph is serialised
+                index = self.index
+                meta = self._meta()
+                index.save_index(graph_tmp)
+            meta["graph_sha256"] = file_sha256(graph_tmp)
+
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, prefix=prefix,
+                                             suffix=".json.tmp", delete=False) as f:
+                meta_tmp = f.name
+                json.dump(meta, f)
+
+            with open(f"{path}.lock", "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    os.replace(graph_tmp, path)
+                    os.replace(meta_tmp, f"{path}.json")
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        finally:
+            for tmp in (graph_tmp, meta_tmp):
+                if tmp and os.path.exists(tmp):
+                    os.unlink(tmp)
+        return len(meta["labels"])
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Persist graph (<path>) + ids/rows/version sidecar (<path>.json)"""
+        path = path or self.path
+        if not self.ready or not path:
+            return
+
+        count = self._write(path)
+        logger.info(f"💾 HNSW index saved: {path} ({count} chunks)")
+
+    async def asave(self, path: Optional[str] = None) -> None:
+        """save() in a worker thread"""
+        path = path or self.path
+        if not self.ready or not path:
+            return
+
+        count = await asyncio.to_thread(self._write, path)
+        logger.info(f"💾 HNSW index saved: {path} ({count} chunks)")
+
+    def _read_disk(self, path: str, expected_version: Optional[Dict] = None) -> Optional[Dict]:
+        """Prepared state from a saved index, None if missing, unreadable or stale (blocking)"""
+        if not path or not os.path.exists(path) or not os.path.exists(f"{path}.json"):
+            return None
+
+        try:
+            with open(f"{path}.lock", "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_SH)  # no writer swaps the pair while we read it
+                try:
+                    with open(f"{path}.json", "r", encoding="utf-8") as f:
+                        meta = json.load(f)
+
+                    if meta["dimension"] != self.dimension:
+                        logger.info(f"HNSW snapshot has {meta['dimension']} dims, expected {self.dimension}; rebuilding")
+                        return None
+                    if expected_version is not None and meta["version"] != expected_version:
+                        logger.info("HNSW snapshot is stale; rebuilding")
+                        return None
+                    if meta.get("graph_sha256") != file_sha256(path):
+                        logger.warning(f"HNSW graph {path} does not match its sidecar; rebuilding")
+                        return None
+
+                    index = self._hnswlib.Index(space="ip", dim=self.dimension)
+                    index.load_index(path, allow_replace_deleted=True)
+                    index.set_ef(self.ef_search)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        except Exception as e:
+            logger.warning(f"Could not load HNSW snapshot {path}: {e}")
+            return None
+
+        rows = {int(label): row for label, row in meta["rows"].items()}
+        return {
+            "index": index,
+            "labels": meta["labels"],
+            "rows": rows,
+            "projects": project_labels(rows),
+            "next_label": meta["next_label"],
+            "version": meta["version"],
+        }
+
+    def load_from_disk(self, path: Optional[str] = None, expected_version: Optional[Dict] = None) -> bool:
+        """Load a saved index; rejects it if dimension or corpus version differ"""
+        path = path or self.path
+        prepared = self._read_disk(path, expected_version)
+        if prepared is None:
+            return False
+
+        self._install(prepared)
+        self.loaded_at = time.time()
+        logger.info(f"✓ HNSW index loaded from {path}: {len(self)} chunks")
+        return True
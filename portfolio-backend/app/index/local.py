@@ -0,0 +1,242 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.embeddings.matryoshka import truncate_embeddings
+from app.index.mirror import CorpusMirror, row_project
+
+logger = logging.getLogger(__name__)
+
+
+def parse_embedding(value) -> Optional[List[float]]:
+    """pgvector columns come back from PostgREST as '[0.1,0.2,...]' strings"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.ascontiguousarray(matrix / np.clip(norms, 1e-12, None), dtype=np.float32)
+
+
+class IndexData:
+    """Immutable snapshot: swapped atomically so searches never see a half update"""
+
+    def __init__(self, matrix: np.ndarray, ids: List[str], rows: List[Dict], version: Optional[Dict]):
+        self.matrix = matrix
+        self.ids = ids
+        self.rows = rows
+        self.version = version
+        self.positions = {chunk_id: pos for pos, chunk_id in enumerate(ids)}
+        self.projects = np.array([row_project(row) for row in rows], dtype=object)
+
+
+class LocalVectorIndex(CorpusMirror):
+    """
+    In-process mirror of portfolio_chunks for sub-millisecond retrieval
+    - Contiguous, pre-normalised float32 matrix + ids + row metadata
+    - Exact vectorised top-k (same result shape as match_portfolio_chunks)
+    - Supabase stays the source of truth: periodic version check reloads
+      the mirror when the corpus changed elsewhere
+    """
+
+    def __init__(self, dimension: int):
+        super().__init__()
+        self.dimension = dimension
+        self.data: Optional[IndexData] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.data is not None
+
+    @property
+    def version(self) -> Optional[Dict]:
+        return self.data.version if self.data else None
+
+    def __len__(self) -> int:
+        return len(self.data.ids) if self.data else 0
+
+    def _rows_to_matrix(self, rows: List[Dict]):
+        """Split rows into (rows with a vector, normalised float32 matrix); embeddings are popped"""
+        kept, vectors = [], []
+        for row in rows:
+            vector = parse_embedding(row.pop("embedding", None))
+            if not vector:
+                continue
+            kept.append(row)
+            vectors.append(vector)
+
+        if vectors:
+            # Full-size stored vectors follow the configured Matryoshka dimension
+            matrix = normalize_rows(truncate_embeddings(np.asarray(vectors, dtype=np.float32), self.dimension))
+        else:
+            matrix = np.zeros((0, self.dimension), dtype=np.float32)
+        return kept, matrix
+
+    def _build(self, rows: List[Dict], version: Optional[Dict]) -> IndexData:
+        kept, matrix = self._rows_to_matrix(rows)
+        return IndexData(matrix, [str(row["id"]) for row in kept], kept, version)
+
+    def _prepare_matrix(self, ids: List[str], matrix: np.ndarray, rows: List[Dict], version: Optional[Dict]):
+        """Build the searchable state (runs in a worker thread); _install swaps it in"""
+        return IndexData(matrix, ids, rows, version)
+
+    def _install(self, prepared) -> None:
+        self.data = prepared
+
+    def _prepare_rows(self, rows: List[Dict], version: Optional[Dict]):
+        kept, matrix = self._rows_to_matrix(rows)
+        return self._prepare_matrix([str(row["id"]) for row in kept], matrix, kept, version)
+
+    def _prepare_snapshot(self, path: str, version: Optional[Dict]):
+        """State from a memory-mapped snapshot if it matches the current corpus version, else None"""
+        from app.index.snapshot import read_manifest, read_snapshot, resolve_snapshot
+
+        path = resolve_snapshot(path)  # one version for the manifest check and the read
+        manifest = read_manifest(path)
+        if manifest is None:
+            return None
+        if manifest["corpus_version"] != version:
+            logger.info(f"Snapshot {path} is stale ({manifest['corpus_version']} vs {version}), loading from Supabase")
+            return None
+        if manifest["dimension"] < self.dimension:
+            logger.info(f"Snapshot has {manifest['dimension']} dims, expected {self.dimension}")
+            return None
+
+        try:
+            ids, matrix, rows, _ = read_snapshot(path)
+        except Exception as e:
+            logger.warning(f"Could not read snapshot {path}: {e}")
+            return None
+
+        if matrix.dtype != np.float32 or matrix.shape[1] != self.dimension:
+            # float16 / wider snapshots need a private float32 copy for BLAS
+            matrix = normalize_rows(truncate_embeddings(matrix, self.dimension))
+
+        return self._prepare_matrix(ids, matrix, rows, version)
+
+    async def load(self, db) -> int:
+        """(Re)build the mirror from a snapshot or from portfolio_chunks"""
+        start = time.perf_counter()
+        version = await db.get_corpus_version()
+
+        # Parsing, normalising and indexing the corpus is CPU-bound: keep it off the event loop
+        source = "snapshot"
+        prepared = None
+        if settings.INDEX_SNAPSHOT_PATH:
+            prepared = await asyncio.to_thread(self._prepare_snapshot, settings.INDEX_SNAPSHOT_PATH, version)
+        if prepared is None:
+            source = "supabase"
+            rows = await db.fetch_all_chunks()
+            prepared = await asyncio.to_thread(self._prepare_rows, rows, version)
+        self._install(prepared)
+
+        self.loaded_at = time.time()
+        self._last_check = time.monotonic()
+
+        logger.info(
+            f"✓ {type(self).__name__}: {len(self)} chunks x {self.dimension} dims from {source} "
+            f"in {(time.perf_counter() - start) * 1000:.0f}ms (version {version})"
+        )
+        return len(self)
+
+    def add(self, rows: List[Dict]) -> None:
+        """Append freshly ingested chunks without a reload"""
+        if not self.ready or not rows:
+            return
+
+        new = self._build(rows, None)
+        current = self.data
+        keep = [pos for pos, chunk_id in enumerate(current.ids) if chunk_id not in new.positions]
+        replaced = len(current.ids) - len(keep)
+
+        self.data = IndexData(
+            np.ascontiguousarray(np.vstack([current.matrix[keep], new.matrix])),
+            [current.ids[pos] for pos in keep] + new.ids,
+            [current.rows[pos] for pos in keep] + new.rows,
+            self._advance_version(current.version, new.rows, replaced)
+        )
+        logger.info(f"✓ Local vector index: +{len(new.ids)} chunks ({len(self)} total)")
+
+    def delete(self, chunk_ids: List[str]) -> int:
+        """Drop chunks by id, returns how many were removed"""
+        if not self.ready or not chunk_ids:
+            return 0
+
+        current = self.data
+        doomed = {str(chunk_id) for chunk_id in chunk_ids}
+        keep = [pos for pos, chunk_id in enumerate(current.ids) if chunk_id not in doomed]
+        removed = len(current.ids) - len(keep)
+        if removed:
+            self.data = IndexData(
+                np.ascontiguousarray(current.matrix[keep]),
+                [current.ids[pos] for pos in keep],
+                [current.rows[pos] for pos in keep],
+                None
+            )
+        return removed
+
+    def get_embeddings(self, chunk_ids: List[str]) -> Dict[str, List[float]]:
+        """Stored (normalised) vectors for the ids present in the index"""
+        data = self.data
+        if data is None:
+            return {}
+        return {
+            str(chunk_id): data.matrix[data.positions[str(chunk_id)]].tolist()
+            for chunk_id in chunk_ids
+            if str(chunk_id) in data.positions
+        }
+
+    def search(self, query_embedding: List[float], match_threshold: float = 0.6, match_count: int = 5,
+               project: Optional[str] = None) -> List[Dict]:
+        """Exact cosine top-k, same contract as the match_portfolio_chunks RPC"""
+        data = self.data
+        if data is None or not data.ids or match_count <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if len(query) > data.matrix.shape[1]:
+            query = truncate_embeddings(query, data.matrix.shape[1])[0]
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        # Project filter: score only that project's rows
+        candidates = np.flatnonzero(data.projects == project.lower()) if project else np.arange(len(data.ids))
+        if not len(candidates):
+            return []
+
+        scores = data.matrix[candidates] @ query if project else data.matrix @ query
+        k = min(match_count, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for pos in top:
+            similarity = float(scores[pos])
+            if similarity <= match_threshold:
+                break
+            row_pos = candidates[pos]
+            row = dict(data.rows[row_pos])
+            row["similarity"] = similarity
+            row["embedding"] = data.matrix[row_pos].tolist()
+            results.append(row)
+        return results
+
+
+def create_local_index():
+    """LOCAL_INDEX_TYPE: exact (NumPy brute force) or hnsw (approximate, for large corpora)"""
+    if settings.LOCAL_INDEX_TYPE.lower() == "hnsw":
+        from app.index.hnsw import HnswVectorIndex
+        return HnswVectorIndex(settings.EMBEDDING_DIMENSION)
+    return LocalVectorIndex(settings.EMBEDDING_DIMENSION)
+
+
+# Global instance
+local_index = create_local_index()
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def row_project(row: Dict) -> str:
+    """Project key used by filtered search: lower-cased metadata title (as in the SQL filter)"""
+    metadata = row.get("metadata") or {}
+    return str(metadata.get("title") or "").lower() if isinstance(metadata, dict) else ""
+
+
+class CorpusMirror(ABC):
+    """
+    Base for in-process structures derived from portfolio_chunks
+    Supabase stays the source of truth: a periodic, fire-and-forget version
+    check reloads the mirror when the corpus changed elsewhere.
+    Subclasses provide ready, version and load(db).
+    """
+
+    def __init__(self):
+        self.loaded_at: Optional[float] = None
+        self._last_check = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    @abstractmethod
+    def ready(self) -> bool:
+        """Loaded and safe to search"""
+
+    @property
+    @abstractmethod
+    def version(self) -> Optional[Dict]:
+        """Corpus version (db.get_corpus_version) the mirror reflects, None if unknown"""
+
+    @abstractmethod
+    async def load(self, db) -> int:
+        """(Re)build from Supabase, returns the number of chunks"""
+
+    @staticmethod
+    def _advance_version(version: Optional[Dict], added: List[Dict], replaced: int) -> Optional[Dict]:
+        """
+        Predict the corpus version after our own inserts, so ingest doesn't
+        trigger a full reload. If anyone else wrote meanwhile the prediction
+        won't match Supabase and the next version check reloads as usual.
+        """
+        if not version or replaced or not added:
+            return None
+        last = added[-1]
+        return {
+            "count": version["count"] + len(added),
+            "latest_id": last.get("id"),
+            "latest_at": last.get("created_at")
+        }
+
+    async def refresh_if_stale(self, db) -> bool:
+        """Compare the mirror's version with Supabase and reload on mismatch"""
+        self._last_check = time.monotonic()
+        try:
+            version = await db.get_corpus_version()
+        except Exception as e:
+            logger.warning(f"{type(self).__name__} version check failed: {e}")
+            return False
+
+        if self.ready and version == self.version:
+            return False
+
+        logger.info(f"🔄 {type(self).__name__} stale ({self.version} → {version}), reloading")
+        await self.load(db)
+
+        # Content changed elsewhere (another worker or a direct write): cached retrievals are stale too
+        from app.agents.retrieval_cache import retrieval_cache
+        retrieval_cache.bump_version()
+        return True
+
+    def schedule_staleness_check(self, db) -> None:
+        """Fire-and-forget version check at most every LOCAL_INDEX_REFRESH_SECONDS"""
+        if time.monotonic() - self._last_check < settings.LOCAL_INDEX_REFRESH_SECONDS:
+            return
+        if self._refresh_task and not self._refresh_task.done():
+            return
+        self._last_check = time.monotonic()
+        self._refresh_task = asyncio.get_running_loop().create_task(self.refresh_if_stale(db))
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+VECTORS_FILE = "vectors.npy"
+ROWS_FILE = "rows.jsonl"
+MANIFEST_FILE = "manifest.json"
+CURRENT_LINK = "current"  # symlink to the live version directory
+VERSION_PREFIX = "v-"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def resolve_snapshot(path: str) -> str:
+    """
+    The version directory a reader should use: the target of <path>/current,
+    or path itself for a flat (pre-versioning) snapshot. Resolve once and
+    read every file from the result, so a concurrent export can't mix versions
+    """
+    current = os.path.join(path, CURRENT_LINK)
+    return os.path.realpath(current) if os.path.isdir(current) else path
+
+
+def _prune_versions(path: str, keep: List[str]) -> None:
+    """Remove old version directories (an open memmap survives the unlink)"""
+    for name in os.listdir(path):
+        if name.startswith(VERSION_PREFIX) and name not in keep:
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+
+def write_snapshot(path: str, ids: List[str], matrix: np.ndarray, rows: List[Dict],
+                   version: Optional[Dict], dtype: str = "float32") -> Dict:
+    """
+    Write a binary embedding snapshot into a fresh version directory:
+    - vectors.npy   pre-normalised (rows x dim) float32/float16 matrix
+    - rows.jsonl    one {id, document_id, content, metadata} per matrix row
+    - manifest.json format, dtype, shape, corpus version, checksums
+    <path>/current is then swapped to it with one atomic rename, so readers
+    (and a crash) see either the previous complete version or this one.
+    The previous version is kept for readers that resolved it just before.
+    """
+    if dtype not in ("float32", "float16"):
+        raise ValueError(f"Unsupported snapshot dtype: {dtype}")
+    if len(ids) != len(rows) or len(ids) != matrix.shape[0]:
+        raise ValueError("ids, rows and matrix must have the same length")
+
+    os.makedirs(path, exist_ok=True)
+    version_dir = tempfile.mkdtemp(dir=path, prefix=f"{VERSION_PREFIX}{int(time.time())}-")
+    os.chmod(version_dir, 0o755)
+    vectors_path = os.path.join(version_dir, VECTORS_FILE)
+    rows_path = os.path.join(version_dir, ROWS_FILE)
+
+    np.save(vectors_path, np.ascontiguousarray(matrix, dtype=dtype))
+    with open(rows_path, "w", encoding="utf-8") as f:
+        for chunk_id, row in zip(ids, rows):
+            f.write(json.dumps({**row, "id": chunk_id}) + "\n")
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "dtype": dtype,
+        "rows": int(matrix.shape[0]),
+        "dimension": int(matrix.shape[1]),
+        "corpus_version": version,
+        "created_at": time.time(),
+        "vectors_sha256": file_sha256(vectors_path),
+        "rows_sha256": file_sha256(rows_path),
+    }
+    with open(os.path.join(version_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    current = os.path.join(path, CURRENT_LINK)
+    previous = os.path.basename(os.path.realpath(current)) if os.path.islink(current) else None
+    link_tmp = os.path.join(path, f".{CURRENT_LINK}.{os.getpid()}.tmp")
+    if os.path.lexists(link_tmp):
+        os.unlink(link_tmp)
+    os.symlink(os.path.basename(version_dir), link_tmp)
+    os.replace(link_tmp, current)
+    _prune_versions(path, keep=[os.path.basename(version_dir), previous])
+
+    logger.info(f"💾 Snapshot written: {version_dir} ({manifest['rows']} x {manifest['dimension']} {dtype})")
+    return manifest
+
+
+def read_manifest(path: str) -> Optional[Dict]:
+    manifest_path = os.path.join(resolve_snapshot(path), MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_snapshot(path: str) -> Tuple[List[str], np.ndarray, List[Dict], Dict]:
+    """
+    Open a snapshot: the matrix is np.memmap'd read-only, so several worker
+    processes share the same page cache instead of each holding a copy
+    """
+    path = resolve_snapshot(path)
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise FileNotFoundError(f"No snapshot manifest in {path}")
+    if manifest["format"] != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format {manifest['format']}")
+
+    matrix = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+    if matrix.shape != (manifest["rows"], manifest["dimension"]):
+        raise ValueError(f"Snapshot shape {matrix.shape} does not match manifest")
+
+    ids, rows = [], []
+    with open(os.path.join(path, ROWS_FILE), "r", encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            ids.append(str(row["id"]))
+            rows.append(row)
+
+    if len(ids) != manifest["rows"]:
+        raise ValueError(f"Snapshot has {len(ids)} rows, manifest says {manifest['rows']}")
+    return ids, matrix, rows, manifest
+
+
+def verify_snapshot(path: str) -> List[str]:
+    """Full integrity check; returns a list of problems (empty = OK)"""
+    path = resolve_snapshot(path)
+    problems = []
+    manifest = read_manifest(path)
+    if manifest is None:
+        return [f"missing {MANIFEST_FILE}"]
+
+    for name, key in ((VECTORS_FILE, "vectors_sha256"), (ROWS_FILE, "rows_sha256")):
+        file_path = os.path.join(path, name)
+        if not os.path.exists(file_path):
+            problems.append(f"missing {name}")
+        elif file_sha256(file_path) != manifest[key]:
+            problems.append(f"{name} checksum mismatch")
+    if problems:
+        return problems
+
+    try:
+        ids, matrix, _, _ = read_snapshot(path)
+    except Exception as e:
+        return [str(e)]
+
+    if len(set(ids)) != len(ids):
+        problems.append("duplicate chunk ids")
+
+    norms = np.linalg.norm(np.asarray(matrix, dtype=np.float32), axis=1)
+    if not np.all(np.isfinite(norms)):
+        problems.append("non-finite vectors")
+    elif len(norms) and np.abs(norms - 1).max() > 1e-2:
+        problems.append(f"vectors not normalised (max |norm-1| = {np.abs(norms - 1).max():.4f})")
+    return problems
@@ -1,6 +1,14 @@
+import asyncio
+import httpx
 from supabase import create_client
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+from postgrest.exceptions import APIError
 from app.config import settings
+from app.models.write_queue import WriteBehindQueue
+from app.models.popular_queries import popular_queries
 import logging
+import math
 from datetime import datetime
 from typing import List, Dict, Optional
 import uuid as uuid_lib
@@ -8,22 +16,104 @@ import uuid as uuid_lib
 
 logger = logging.getLogger(__name__)
 
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """AsyncPostgrestClient on one shared keep-alive (HTTP/2) connection pool"""
+    
+    def create_session(self, base_url, headers, timeout, verify=True, *args, **kwargs):
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=httpx.Timeout(
+                settings.SUPABASE_TIMEOUT_SECONDS,
+                connect=settings.SUPABASE_CONNECT_TIMEOUT_SECONDS
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.SUPABASE_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.SUPABASE_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=settings.SUPABASE_POOL_KEEPALIVE_EXPIRY
+            ),
+            http2=settings.SUPABASE_HTTP2,
+            verify=verify,
+            follow_redirects=True
+        )
+
+
+# SQLSTATE classes worth retrying: connection, transaction rollback (deadlock /
+# serialization), insufficient resources, operator intervention (statement timeout)
+_TRANSIENT_SQLSTATE_CLASSES = ("08", "40", "53", "57")
+
+
+def is_retryable_write_error(error: Exception) -> bool:
+    """
+    Transient (retry the batch) vs rejected (constraint violation, bad column,
+    4xx from PostgREST: the same rows will fail again)
+    """
+    if isinstance(error, APIError):
+        code = str(error.code or "")
+        if not code:
+            return True  # no PostgREST error body, e.g. a gateway error page
+        if code.startswith("PGRST"):
+            return code in ("PGRST000", "PGRST001", "PGRST002", "PGRST003")  # database unreachable / pool timeout
+        return code[:2] in _TRANSIENT_SQLSTATE_CLASSES
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status >= 500 or status in (408, 429)
+    return True
+
+
 class SupabaseClient:
+    """
+    Supabase data layer
+    - All methods run on an async PostgREST client (event loop never blocks)
+    - One pooled keep-alive HTTP/2 connection set per worker, created on
+      first use (after a gunicorn fork, never inherited from the master)
+    - Every call has a deadline (SUPABASE_TIMEOUT_SECONDS unless overridden)
+    - self.client stays the synchronous supabase client for offline scripts
+    """
+    
     def __init__(self):
         self.client = create_client(
             settings.SUPABASE_URL,
             settings.SUPABASE_SERVICE_ROLE_KEY
         )
+        self._rest: Optional[PooledPostgrestClient] = None
+        # Cleared on the first "no such column" error (migrations/003 not applied)
+        self._retrieval_tier_column = True
+    
+    @property
+    def rest(self) -> PooledPostgrestClient:
+        """Async PostgREST client, created lazily"""
+        if self._rest is None:
+            key = settings.SUPABASE_SERVICE_ROLE_KEY
+            self._rest = PooledPostgrestClient(
+                f"{settings.SUPABASE_URL}/rest/v1",
+                headers={
+                    **DEFAULT_POSTGREST_CLIENT_HEADERS,
+                    "apikey": key,
+                    "Authorization": f"Bearer {key}"
+                }
+            )
+        return self._rest
+    
+    async def execute(self, request, timeout: Optional[float] = None):
+        """Await a PostgREST request with a per-call deadline"""
+        return await asyncio.wait_for(request.execute(), timeout or settings.SUPABASE_TIMEOUT_SECONDS)
+    
+    async def close(self):
+        """Close pooled connections (app shutdown)"""
+        if self._rest is not None:
+            await self._rest.aclose()
+            self._rest = None
     
     async def insert_chunk(self, document_id: str, content: str, embedding: list, metadata: dict):
         """Insert chunk with embedding"""
         try:
-            response = self.client.table("portfolio_chunks").insert({
+            response = await self.execute(self.rest.table("portfolio_chunks").insert({
                 "document_id": document_id,
                 "content": content,
                 "embedding": embedding,
                 "metadata": metadata
-            }).execute()
+            }))
             
             # response.data is [dict] - extract first dict
             if isinstance(response.data, list) and len(response.data) > 0:
@@ -36,16 +126,31 @@ class SupabaseClient:
             logger.error(f"Error inserting chunk: {e}")
             raise
     
+    async def delete_document(self, document_id: str) -> List[str]:
+        """Delete a document and its chunks, returns the deleted chunk ids"""
+        try:
+            response = await self.execute(self.rest.table("portfolio_chunks").delete().eq("document_id", document_id))
+            chunk_ids = [str(item.get("id")) for item in (response.data or [])]
+            
+            await self.execute(self.rest.table("portfolio_documents").delete().eq("id", document_id))
+            
+            logger.info(f"✓ Deleted document {document_id} ({len(chunk_ids)} chunks)")
+            return chunk_ids
+            
+        except Exception as e:
+            logger.error(f"Error deleting document: {e}")
+            raise
+    
     async def insert_document(self, title: str, source: str, project_type: str, content: str):
         """Insert document"""
         try:
-            response = self.client.table("portfolio_documents").insert({
+            response = await self.execute(self.rest.table("portfolio_documents").insert({
                 "title": title,
                 "source": source,
                 "project_type": project_type,
                 "content": content,
                 "metadata": {"ingested_at": str(datetime.now())}
-            }).execute()
+            }))
             
             # DEBUG: Print what we actually got
             logger.info(f"response.data = {response.data}")
@@ -81,17 +186,33 @@ class SupabaseClient:
             traceback.print_exc()
             raise
     
-    async def vector_search(self, query_embedding: list, match_threshold: float = 0.6, match_count: int = 5):
-        """Vector similarity search using pgvector RPC"""
+    async def vector_search(self, query_embedding: list, match_threshold: float = 0.6, match_count: int = 5,
+                            project: Optional[str] = None, raise_errors: bool = False):
+        """
+        Vector similarity search (in-process index when loaded, else pgvector RPC)
+        project: only search chunks whose metadata title matches (case-insensitive)
+        raise_errors: surface RPC failures instead of returning [] (an outage is not "no match")
+        """
+        if settings.LOCAL_VECTOR_INDEX:
+            from app.index.local import local_index
+            
+            if local_index.ready:
+                local_index.schedule_staleness_check(self)
+                results = self._add_sources(local_index.search(query_embedding, match_threshold, match_count, project=project))
+                logger.info(f"✓ Local vector search: {len(results)} chunks, sources: {[item.get('source') for item in results[:3]]}")
+                return results
+        
         try:
-            response = self.client.rpc(
-                "match_portfolio_chunks",
-                {
-                    "query_embedding": query_embedding,
-                    "match_threshold": match_threshold,
-                    "match_count": match_count
-                }
-            ).execute()
+            params = {
+                "query_embedding": query_embedding,
+                "match_threshold": match_threshold,
+                "match_count": match_count
+            }
+            # Needs migrations/004_match_chunks_project_filter.sql
+            if project:
+                params["filter_project"] = project
+            
+            response = await self.execute(self.rest.rpc("match_portfolio_chunks", params))
             
             # FIX: Handle nested list [[dict]] vs [dict]
             results = response.data
@@ -102,16 +223,8 @@ class SupabaseClient:
                     logger.info(f"⚠️ Flattening nested list results")
                     results = results[0]
             
-            # Add source from metadata
-            for item in results:
-                if isinstance(item, dict) and 'metadata' in item:
-                    metadata = item.get('metadata', {})
-                    if isinstance(metadata, dict):
-                        item['source'] = metadata.get('title', metadata.get('source', 'unknown'))
-                    else:
-                        item['source'] = 'unknown'
-                else:
-                    item['source'] = 'unknown'
+            results = self._add_sources(results)
+            results = await self.ensure_embeddings(results)
             
             logger.info(f"✓ Vector search: {len(results)} chunks, sources: {[item.get('source') for item in results[:3]]}")
             
@@ -119,20 +232,109 @@ class SupabaseClient:
             
         except Exception as e:
             logger.error(f"Error in vector search: {e}")
+            if raise_errors:
+                raise
             import traceback
             traceback.print_exc()
             return []
     
+    def _add_sources(self, results: list) -> list:
+        """Add source from metadata"""
+        for item in results:
+            if isinstance(item, dict) and 'metadata' in item:
+                metadata = item.get('metadata', {})
+                if isinstance(metadata, dict):
+                    item['source'] = metadata.get('title', metadata.get('source', 'unknown'))
+                else:
+                    item['source'] = 'unknown'
+            else:
+                item['source'] = 'unknown'
+        return results
+    
+    async def ensure_embeddings(self, results: list) -> list:
+        """
+        Guarantee every result carries its stored embedding as a list of floats
+        (pgvector comes back as a string; an RPC without the embedding column
+        costs one extra select by id instead of a model forward per chunk)
+        """
+        from app.index.local import parse_embedding
+        
+        missing = []
+        for item in results:
+            if not isinstance(item, dict):
+                continue
+            item['embedding'] = parse_embedding(item.get('embedding'))
+            if not item['embedding']:
+                missing.append(item)
+        
+        # In-process index first, no round trip
+        if missing and settings.LOCAL_VECTOR_INDEX:
+            from app.index.local import local_index
+            
+            local = local_index.get_embeddings([item.get('id') for item in missing])
+            for item in missing:
+                item['embedding'] = local.get(str(item.get('id'))) or []
+            missing = [item for item in missing if not item['embedding']]
+        
+        if missing:
+            try:
+                response = await self.execute(self.rest.table("portfolio_chunks")\
+                    .select("id, embedding")\
+                    .in_("id", [item.get('id') for item in missing]))
+                by_id = {str(row.get('id')): parse_embedding(row.get('embedding')) for row in response.data}
+                for item in missing:
+                    item['embedding'] = by_id.get(str(item.get('id'))) or []
+                logger.info(f"Fetched stored embeddings for {len(missing)} chunks")
+            except Exception as e:
+                logger.warning(f"Could not fetch stored embeddings: {e}")
+                for item in missing:
+                    item['embedding'] = []
+        
+        return results
+    
+    async def fetch_all_chunks(self, columns: str = "id, document_id, content, metadata, embedding",
+                               page_size: int = 1000) -> List[Dict]:
+        """All portfolio_chunks rows (paged past the PostgREST row limit)"""
+        rows = []
+        start = 0
+        while True:
+            response = await self.execute(self.rest.table("portfolio_chunks")\
+                .select(columns)\
+                .order("id")\
+                .range(start, start + page_size - 1), timeout=settings.SUPABASE_TIMEOUT_SECONDS * 6)
+            
+            rows.extend(response.data)
+            if len(response.data) < page_size:
+                break
+            start += page_size
+        
+        logger.info(f"✓ Fetched {len(rows)} chunks from portfolio_chunks")
+        return rows
+    
+    async def get_corpus_version(self) -> Dict:
+        """Cheap fingerprint of portfolio_chunks: row count + newest row"""
+        response = await self.execute(self.rest.table("portfolio_chunks")\
+            .select("id, created_at", count="exact")\
+            .order("created_at", desc=True)\
+            .limit(1))
+        
+        latest = response.data[0] if response.data else {}
+        return {
+            "count": response.count or 0,
+            "latest_id": latest.get("id"),
+            "latest_at": latest.get("created_at")
+        }
+    
     async def insert_message(self, session_id: str, role: str, content: str, mode: str, judge_score: dict = None):
         """Insert chat message"""
         try:
-            response = self.client.table("messages").insert({
+            response = await self.execute(self.rest.table("messages").insert({
                 "session_id": session_id,
                 "role": role,
                 "content": content,
                 "mode": mode,
                 "judge_score": judge_score
-            }).execute()
+            }))
             
             if isinstance(response.data, list) and len(response.data) > 0:
                 return response.data[0]  # Return first element
@@ -142,16 +344,48 @@ class SupabaseClient:
             logger.error(f"Error inserting message: {e}")
             raise
 
-    async def log_query(self, query: str, mode: str, response_quality: float, sources: List[str]):
-        """Log query for analytics"""
+    def _query_log_row(self, query: str, mode: str, response_quality: float, sources: List[str],
+                       retrieval_tier: Optional[str] = None) -> Dict:
+        row = {
+            "query": query,
+            "mode": mode,
+            "response_quality_score": response_quality,
+            "sources": sources,
+            "timestamp": datetime.now().isoformat()
+        }
+        if retrieval_tier is not None and self._retrieval_tier_column:
+            row["retrieval_tier"] = retrieval_tier
+        return row
+    
+    def _drop_retrieval_tier(self, table: str, rows: List[Dict], error: Exception) -> bool:
+        """
+        analytics_queries without the retrieval_tier column: stop sending it and
+        strip it from rows; True if the insert should be retried
+        """
+        if table != "analytics_queries" or not self._retrieval_tier_column:
+            return False
+        if not isinstance(error, APIError) or error.code not in ("42703", "PGRST204") \
+                or "retrieval_tier" not in str(error.message or ""):
+            return False
+        
+        self._retrieval_tier_column = False
+        logger.warning("analytics_queries has no retrieval_tier column, logging without it (apply migrations/003_analytics_retrieval_tier.sql)")
+        for row in rows:
+            row.pop("retrieval_tier", None)
+        return True
+    
+    async def log_query(self, query: str, mode: str, response_quality: float, sources: List[str],
+                        retrieval_tier: Optional[str] = None):
+        """Log query for analytics (retrieval_tier needs migrations/003_analytics_retrieval_tier.sql)"""
+        popular_queries.offer(query, mode)
         try:
-            response = self.client.table("analytics_queries").insert({
-                "query": query,
-                "mode": mode,
-                "response_quality_score": response_quality,
-                "sources": sources,
-                "timestamp": datetime.now().isoformat()
-            }).execute()
+            row = self._query_log_row(query, mode, response_quality, sources, retrieval_tier)
+            try:
+                response = await self.execute(self.rest.table("analytics_queries").insert(row))
+            except Exception as e:
+                if not self._drop_retrieval_tier("analytics_queries", [row], e):
+                    raise
+                response = await self.execute(self.rest.table("analytics_queries").insert(row))
             
             logger.info(f"✓ Analytics logged: {query[:30]}... (quality: {response_quality:.1f})")
             return response.data
@@ -160,92 +394,90 @@ class SupabaseClient:
             logger.error(f"Error logging analytics: {e}")
             return None
 
-    async def get_popular_queries(self, limit: int = 10, mode: Optional[str] = None) -> List[tuple]:
-        """Get most frequently asked questions"""
+    async def get_popular_queries(self, limit: int = 10, mode: Optional[str] = None,
+                                  hours: Optional[int] = None, raise_errors: bool = False) -> List[tuple]:
+        """Most frequent (normalised) questions in the last `hours` (all time if None), from the rollups"""
         try:
-            query = self.client.table("analytics_queries").select("query")
-            
-            if mode:
-                query = query.eq("mode", mode)
-            
-            response = query.execute()
-            
-            # Count occurrences
-            query_counts = {}
-            for item in response.data:
-                q = item.get("query", "")
-                if q:
-                    query_counts[q] = query_counts.get(q, 0) + 1
-            
-            # Sort by count
-            sorted_queries = sorted(query_counts.items(), key=lambda x: x[1], reverse=True)
+            response = await self.execute(self.rest.rpc("analytics_popular_queries", {
+                "window_hours": hours,
+                "filter_mode": mode,
+                "max_results": limit
+            }))
             
-            logger.info(f"Popular queries ({mode or 'all'}): {len(sorted_queries)} unique")
-            return sorted_queries[:limit]
+            popular = [(item.get("query", ""), int(item.get("query_count") or 0)) for item in response.data]
+            logger.info(f"Popular queries ({mode or 'all'}, {hours or 'all'}h): {len(popular)} returned")
+            return popular
             
         except Exception as e:
             logger.error(f"Error getting popular queries: {e}")
+            if raise_errors:
+                raise
             return []
 
-    async def get_quality_metrics(self, hours: int = 24) -> Dict:
-        """Get response quality metrics"""
+    async def get_mode_rollups(self, hours: Optional[int] = None) -> Dict[str, Dict]:
+        """Per-mode count / quality sum / sum of squares for the window (migrations/005_analytics_rollups.sql)"""
+        response = await self.execute(self.rest.rpc("analytics_mode_window", {"window_hours": hours}))
+        return {
+            item.get("mode") or "unknown": {
+                "count": int(item.get("query_count") or 0),
+                "quality_sum": float(item.get("quality_sum") or 0),
+                "quality_sq_sum": float(item.get("quality_sq_sum") or 0)
+            }
+            for item in response.data
+        }
+
+    @staticmethod
+    def _quality_stats(count: int, total: float, sq_total: float) -> Dict:
+        average = total / count if count else 0
+        variance = max(sq_total / count - average ** 2, 0.0) if count else 0
+        return {
+            "total": total,
+            "count": count,
+            "average": average,
+            "stddev": math.sqrt(variance)
+        }
+
+    async def get_quality_metrics(self, hours: Optional[int] = 24) -> Dict:
+        """Response quality metrics for the last `hours` (all time if None)"""
         try:
-            response = self.client.table("analytics_queries").select(
-                "response_quality_score, mode"
-            ).execute()
+            rollups = await self.get_mode_rollups(hours)
             
-            scores = response.data
-            
-            if not scores:
+            if not rollups:
                 return {
                     "average_quality": 0,
                     "by_mode": {},
                     "total_queries": 0
                 }
             
-            # Calculate metrics
-            total_quality = 0
-            by_mode = {}
-            
-            for score in scores:
-                quality = score.get("response_quality_score", 0)
-                mode = score.get("mode", "unknown")
-                
-                total_quality += quality
-                
-                if mode not in by_mode:
-                    by_mode[mode] = {"total": 0, "count": 0, "average": 0}
-                
-                by_mode[mode]["total"] += quality
-                by_mode[mode]["count"] += 1
-            
-            # Calculate averages
-            for mode in by_mode:
-                count = by_mode[mode]["count"]
-                by_mode[mode]["average"] = by_mode[mode]["total"] / count if count > 0 else 0
+            by_mode = {
+                mode: self._quality_stats(r["count"], r["quality_sum"], r["quality_sq_sum"])
+                for mode, r in rollups.items()
+            }
+            overall = self._quality_stats(
+                sum(r["count"] for r in rollups.values()),
+                sum(r["quality_sum"] for r in rollups.values()),
+                sum(r["quality_sq_sum"] for r in rollups.values())
+            )
             
             result = {
-                "average_quality": total_quality / len(scores) if scores else 0,
+                "average_quality": overall["average"],
+                "stddev_quality": overall["stddev"],
                 "by_mode": by_mode,
-                "total_queries": len(scores)
+                "total_queries": overall["count"]
             }
             
-            logger.info(f"Quality metrics: avg={result['average_quality']:.2f}/10, queries={len(scores)}")
+            logger.info(f"Quality metrics: avg={result['average_quality']:.2f}/10, queries={result['total_queries']}")
             return result
             
         except Exception as e:
             logger.error(f"Error getting quality metrics: {e}")
             return {"average_quality": 0, "by_mode": {}, "total_queries": 0}
 
-    async def get_mode_distribution(self) -> Dict[str, int]:
-        """Get distribution of queries by mode"""
+    async def get_mode_distribution(self, hours: Optional[int] = None) -> Dict[str, int]:
+        """Distribution of queries by mode for the last `hours` (all time if None)"""
         try:
-            response = self.client.table("analytics_queries").select("mode").execute()
-            
-            distribution = {}
-            for item in response.data:
-                mode = item.get("mode", "unknown")
-                distribution[mode] = distribution.get(mode, 0) + 1
+            rollups = await self.get_mode_rollups(hours)
+            distribution = {mode: r["count"] for mode, r in rollups.items()}
             
             logger.info(f"Mode distribution: {distribution}")
             return distribution
@@ -254,27 +486,35 @@ class SupabaseClient:
             logger.error(f"Error getting mode distribution: {e}")
             return {}
 
-    async def create_session(self, user_id: Optional[str] = None) -> str:
-        """Create new conversation session with proper UUID"""
+    async def create_session(self, user_id: Optional[str] = None, session_id: Optional[str] = None) -> str:
+        """
+        Create new conversation session with proper UUID
+        With session_id: upsert (an existing row is left untouched)
+        Raises if the row could not be written: the id must not be used for messages
+        """
+        row = {
+            "id": session_id or str(uuid_lib.uuid4()),
+            "user_id": user_id,
+            "created_at": datetime.now().isoformat()
+        }
         try:
-            # Generate proper UUID
-            session_id = str(uuid_lib.uuid4())
-            
-            response = self.client.table("chat_sessions").insert({
-                "id": session_id,
-                "user_id": user_id,
-                "created_at": datetime.now().isoformat()
-            }).execute()
-            
-            logger.info(f"✓ Created session: {session_id}")
-            return session_id
+            if session_id is not None:
+                await self.execute(self.rest.table("chat_sessions").upsert(row, on_conflict="id", ignore_duplicates=True))
+            else:
+                await self.execute(self.rest.table("chat_sessions").insert(row))
+                logger.info(f"✓ Created session: {row['id']}")
+            return row["id"]
             
         except Exception as e:
             logger.error(f"Error creating session: {e}")
-            return str(uuid_lib.uuid4())  # Return UUID even if insert fails
+            raise
 
-    async def get_conversation_history(self, session_id: str, limit: int = 10) -> List[Dict]:
-        """Get conversation history - WITH PROPER UUID HANDLING"""
+    async def get_conversation_history(self, session_id: str, limit: int = 10, raise_errors: bool = False,
+                                       since: Optional[str] = None) -> List[Dict]:
+        """
+        Latest `limit` messages of a session, oldest first - WITH PROPER UUID HANDLING
+        since: only messages created after this timestamp (history catch-up)
+        """
         if not session_id:
             logger.warning("No session_id provided")
             return []
@@ -287,45 +527,58 @@ class SupabaseClient:
                 logger.warning(f"Invalid session ID format (not UUID): {session_id}")
                 return []
             
-            response = self.client.table("messages")\
-                .select("role, content")\
-                .eq("session_id", session_id)\
-                .order("created_at", desc=False)\
-                .limit(limit)\
-                .execute()
+            # Newest first so the limit keeps the latest turns, then back to chronological order
+            query = self.rest.table("messages")\
+                .select("role, content, created_at")\
+                .eq("session_id", session_id)
+            if since is not None:
+                query = query.gt("created_at", since)
+            response = await self.execute(query.order("created_at", desc=True).limit(limit))
             
             history = [
-                {"role": item.get("role"), "content": item.get("content")}
-                for item in response.data
+                {"role": item.get("role"), "content": item.get("content"), "created_at": item.get("created_at")}
+                for item in reversed(response.data)
             ]
             
-            logger.info(f"✓ Loaded {len(history)} messages from session {session_id[:8]}...")
+            if since is None or history:
+                logger.info(f"✓ Loaded {len(history)} messages from session {session_id[:8]}...")
             return history
             
         except Exception as e:
             logger.error(f"Error getting conversation history: {e}")
+            if raise_errors:
+                raise
             return []
 
+    @staticmethod
+    def _message_row(session_id: str, role: str, content: str) -> Optional[Dict]:
+        """messages row, or None if the input is invalid"""
+        if not session_id or not role or not content:
+            logger.warning(f"Missing parameters: session_id={bool(session_id)}, role={role}, content_len={len(content or '')}")
+            return None
+        
+        # Validate UUID
+        try:
+            uuid_lib.UUID(session_id)
+        except ValueError:
+            logger.error(f"Invalid session_id (not UUID): {session_id}")
+            return None
+        
+        return {
+            "session_id": session_id,
+            "role": role,
+            "content": content,
+            "created_at": datetime.now().isoformat()
+        }
+    
     async def save_message(self, session_id: str, role: str, content: str) -> bool:
         """Save message - WITH UUID VALIDATION"""
-        if not session_id or not role or not content:
-            logger.warning(f"Missing parameters: session_id={bool(session_id)}, role={role}, content_len={len(content)}")
+        row = self._message_row(session_id, role, content)
+        if row is None:
             return False
         
         try:
-            # Validate UUID
-            try:
-                uuid_lib.UUID(session_id)
-            except ValueError:
-                logger.error(f"Invalid session_id (not UUID): {session_id}")
-                return False
-            
-            response = self.client.table("messages").insert({
-                "session_id": session_id,
-                "role": role,
-                "content": content,
-                "created_at": datetime.now().isoformat()
-            }).execute()
+            response = await self.execute(self.rest.table("messages").insert(row))
             
             logger.info(f"✓ Saved {role} message to session {session_id[:8]}...")
             return True
@@ -334,5 +587,37 @@ class SupabaseClient:
             logger.error(f"Error saving message: {e}")
             return False
 
-# Global instance
-db = SupabaseClient()
\ No newline at end of file
+    async def insert_rows(self, table: str, rows: List[Dict]):
+        """Bulk insert (one round trip), raises on failure so callers can retry"""
+        try:
+            return await self.execute(self.rest.table(table).insert(rows))
+        except Exception as e:
+            if not self._drop_retrieval_tier(table, rows, e):
+                raise
+            return await self.execute(self.rest.table(table).insert(rows))
+    
+    def queue_message(self, session_id: str, role: str, content: str) -> Optional[Dict]:
+        """save_message without waiting: buffered in the write-behind queue, returns the queued row"""
+        row = self._message_row(session_id, role, content)
+        if row is None or not write_queue.enqueue("messages", row):
+            return None
+        return row
+    
+    def queue_query_log(self, query: str, mode: str, response_quality: float, sources: List[str],
+                        retrieval_tier: Optional[str] = None) -> bool:
+        """log_query without waiting: buffered in the write-behind queue"""
+        popular_queries.offer(query, mode)
+        row = self._query_log_row(query, mode, response_quality, sources, retrieval_tier)
+        return write_queue.enqueue("analytics_queries", row)
+
+# Global instances
+db = SupabaseClient()
+write_queue = WriteBehindQueue(
+    db.insert_rows,
+    max_rows=settings.WRITE_QUEUE_MAX_ROWS,
+    batch_size=settings.WRITE_QUEUE_BATCH_SIZE,
+    flush_ms=settings.WRITE_QUEUE_FLUSH_MS,
+    max_retries=settings.WRITE_QUEUE_MAX_RETRIES,
+    backoff_ms=settings.WRITE_QUEUE_BACKOFF_MS,
+    is_retryable=is_retryable_write_error
+)
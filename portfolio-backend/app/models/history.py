@@ -0,0 +1,239 @@
+import logging
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+from app.models.database import db, write_queue
+
+logger = logging.getLogger(__name__)
+
+
+def _timestamp(message: Dict) -> datetime:
+    """created_at as naive UTC (rows are stamped with datetime.now(), Postgres returns +00:00)"""
+    value = message.get("created_at")
+    if not value:
+        return datetime.min
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return datetime.min
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _identity(message: Dict) -> Tuple:
+    return message.get("role"), message.get("content"), _timestamp(message)
+
+
+class SessionHistory:
+    __slots__ = ("messages", "bytes", "last_access", "synced_at")
+
+    def __init__(self, max_messages: int):
+        self.messages: Deque[Dict] = deque(maxlen=max_messages)
+        self.bytes = 0
+        self.last_access = time.monotonic()
+        self.synced_at = datetime.now()  # newest created_at known to be in the table
+
+
+class ConversationStore:
+    """
+    Per-session ring buffer of the latest messages, write-through to `messages`
+    - Reads are served from memory; Supabase is read only on a cold miss
+      (first turn of this worker for the session)
+    - Writes update the buffer and go to the write-behind queue, so the next
+      turn sees them even before the insert lands; a cold load also merges
+      the rows still waiting in the queue
+    - With several workers a session's turns land on any of them: with
+      catch_up, warm reads also fetch the messages created since the last
+      sync (minus catch_up_lag for other workers' unflushed rows), usually an
+      empty indexed range scan instead of a full history read
+    - Sessions are kept in LRU order: idle sessions (HISTORY_IDLE_SECONDS)
+      and, over the global byte cap, least recently used sessions are evicted
+    """
+
+    def __init__(self, max_messages: int = 6, max_bytes: int = 16 * 1024 * 1024, idle_seconds: float = 1800,
+                 catch_up: bool = False, catch_up_lag: float = 5):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.catch_up = catch_up
+        self.catch_up_lag = catch_up_lag
+
+        self._sessions: "OrderedDict[str, SessionHistory]" = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.cold_loads = 0
+        self.catch_ups = 0
+        self.caught_up_messages = 0
+        self.evictions = 0
+        self.idle_evictions = 0
+        self.load_errors = 0
+
+    @staticmethod
+    def _size(message: Dict) -> int:
+        return len(message.get("content") or "") + 64
+
+    def _touch(self, session_id: str) -> Optional[SessionHistory]:
+        history = self._sessions.get(session_id)
+        if history is not None:
+            history.last_access = time.monotonic()
+            self._sessions.move_to_end(session_id)
+        return history
+
+    def _push(self, history: SessionHistory, message: Dict) -> None:
+        if len(history.messages) == history.messages.maxlen:
+            dropped = self._size(history.messages[0])
+            history.bytes -= dropped
+            self._bytes -= dropped
+        history.messages.append(message)
+        size = self._size(message)
+        history.bytes += size
+        self._bytes += size
+
+    def _merge(self, history: SessionHistory, rows: Iterable[Dict]) -> int:
+        """Add rows not already buffered, keeping chronological order; returns how many were new"""
+        known = {_identity(message) for message in history.messages}
+        fresh = []
+        for row in rows:
+            identity = _identity(row)
+            if identity not in known:
+                known.add(identity)
+                fresh.append({"role": row.get("role"), "content": row.get("content"), "created_at": row.get("created_at")})
+        if not fresh:
+            return 0
+
+        combined = sorted([*history.messages, *fresh], key=_timestamp)
+        self._bytes -= history.bytes
+        history.bytes = 0
+        history.messages.clear()
+        for message in combined:
+            self._push(history, message)
+        return len(fresh)
+
+    def _evict(self) -> None:
+        """Drop idle sessions, then least recently used ones while over the byte cap"""
+        now = time.monotonic()
+        while self._sessions:
+            session_id, history = next(iter(self._sessions.items()))
+            idle = self.idle_seconds and now - history.last_access > self.idle_seconds
+            if not idle and self._bytes <= self.max_bytes:
+                break
+            self._sessions.popitem(last=False)
+            self._bytes -= history.bytes
+            if idle:
+                self.idle_evictions += 1
+            else:
+                self.evictions += 1
+
+    @staticmethod
+    def _public(messages: Iterable[Dict], limit: int) -> List[Dict]:
+        return [{"role": message["role"], "content": message["content"]} for message in list(messages)[-limit:]]
+
+    def start(self, session_id: str) -> None:
+        """A brand-new session: its history is known to be empty, no cold load"""
+        if session_id not in self._sessions:
+            self._sessions[session_id] = SessionHistory(self.max_messages)
+            self._evict()
+
+    async def _catch_up(self, session_id: str, history: SessionHistory) -> None:
+        """Merge messages another worker wrote since the last sync"""
+        since = history.synced_at - timedelta(seconds=self.catch_up_lag)
+        try:
+            rows = await db.get_conversation_history(
+                session_id, limit=self.max_messages, raise_errors=True, since=since.isoformat()
+            )
+        except Exception as e:
+            logger.warning(f"History catch-up failed for {session_id[:8]}..., serving the buffer: {e}")
+            return
+
+        self.catch_ups += 1
+        if self._sessions.get(session_id) is not history:
+            return  # evicted while we were waiting
+        self.caught_up_messages += self._merge(history, rows)
+        if rows:
+            history.synced_at = max(history.synced_at, max(_timestamp(row) for row in rows))
+
+    async def get(self, session_id: str, limit: Optional[int] = None) -> List[Dict]:
+        """Latest messages (oldest first), from memory when warm"""
+        if not session_id:
+            return []
+        limit = limit or self.max_messages
+
+        history = self._touch(session_id)
+        if history is not None:
+            self.hits += 1
+            if self.catch_up:
+                await self._catch_up(session_id, history)
+            return self._public(history.messages, limit)
+
+        self.misses += 1
+        loaded_at = datetime.now()
+        try:
+            messages = await db.get_conversation_history(session_id, limit=self.max_messages, raise_errors=True)
+        except Exception as e:
+            # Not cached: an empty buffer would hide the real history for the session's lifetime
+            self.load_errors += 1
+            logger.warning(f"History cold load failed for {session_id[:8]}...: {e}")
+            return []
+        self.cold_loads += 1
+
+        # A concurrent turn may have started the buffer while we were loading
+        history = self._touch(session_id)
+        if history is None:
+            history = SessionHistory(self.max_messages)
+            history.synced_at = max([loaded_at, *(_timestamp(message) for message in messages)])
+            self._sessions[session_id] = history
+            self._merge(history, messages)
+            self._evict()
+        # Turns still in the write-behind queue aren't in the table yet
+        self._merge(history, [row for row in write_queue.pending("messages") if row.get("session_id") == session_id])
+        return self._public(history.messages, limit)
+
+    def append(self, session_id: str, role: str, content: str) -> bool:
+        """Write-through: update the ring buffer and queue the insert"""
+        row = db.queue_message(session_id, role, content)
+        if row is None:
+            return False
+
+        # Only extend a buffer we hold; a cold session reloads on its next read (queue included)
+        history = self._touch(session_id)
+        if history is not None:
+            self._push(history, {"role": role, "content": content, "created_at": row["created_at"]})
+            self._evict()
+        return True
+
+    def stats(self) -> Dict:
+        """Buffer sizes and hit rate"""
+        lookups = self.hits + self.misses
+        return {
+            "sessions": len(self._sessions),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "max_messages": self.max_messages,
+            "idle_seconds": self.idle_seconds,
+            "catch_up": self.catch_up,
+            "hits": self.hits,
+            "misses": self.misses,
+            "cold_loads": self.cold_loads,
+            "catch_ups": self.catch_ups,
+            "caught_up_messages": self.caught_up_messages,
+            "evictions": self.evictions,
+            "idle_evictions": self.idle_evictions,
+            "load_errors": self.load_errors,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Global instance
+conversation_store = ConversationStore(
+    max_messages=settings.HISTORY_MAX_MESSAGES,
+    max_bytes=settings.HISTORY_MAX_BYTES,
+    idle_seconds=settings.HISTORY_IDLE_SECONDS,
+    catch_up=settings.HISTORY_CATCH_UP,
+    catch_up_lag=settings.HISTORY_CATCH_UP_LAG_SECONDS
+)
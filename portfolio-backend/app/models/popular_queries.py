@@ -0,0 +1,251 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app.agents.retrieval_cache import normalize_query
+from app.config import settings
+from app.utils.heavy_hitters import SpaceSaving
+
+logger = logging.getLogger(__name__)
+
+ALL_MODES = "*"
+
+
+class PopularQueries:
+    """
+    Heavy-hitter questions per mode, fed by db.log_query / queue_query_log
+    - One Space-Saving sketch per mode plus one over all modes, keyed by
+      normalised query text (case, spacing, trailing "?" don't split counts)
+    - Memory is O(capacity) per mode; top(k) is O(k) and every count is
+      within total / capacity of the truth
+    - Workers share POPULAR_QUERIES_PATH: sync() merges this worker's
+      counts since the last sync into the file under a lock and reloads
+      the merged view, so every worker answers for all of them
+    - The file is created from the analytics rollups (all history); until
+      that seed (or a load of the file) succeeds nothing is written and
+      `ready` is False, so callers keep answering from the rollups; with no
+      path it is never ready
+    - An unreadable file is moved aside (<path>.corrupt) and reseeded from
+      the rollups rather than overwritten with this worker's counts
+    """
+
+    def __init__(self, capacity: int = 1000, path: str = "", sync_seconds: float = 60):
+        self.capacity = capacity
+        self.path = path
+        self.sync_seconds = sync_seconds
+
+        self._view: Dict[str, SpaceSaving] = {}   # merged counts, answers queries
+        self._delta: Dict[str, SpaceSaving] = {}  # this worker's counts since the last sync
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._db = None
+        self._needs_seed = False
+        self._loaded = False  # the view holds the shared (seeded) counts
+
+        self.syncs = 0
+        self.seed_errors = 0
+        self.sync_errors = 0
+
+    def offer(self, query: str, mode: Optional[str]) -> None:
+        key = normalize_query(query or "")
+        if not key:
+            return
+        label = " ".join(query.split())
+        with self._lock:
+            for name in (mode or "unknown", ALL_MODES):
+                for sketches in (self._view, self._delta):
+                    sketch = sketches.get(name)
+                    if sketch is None:
+                        sketch = sketches[name] = SpaceSaving(self.capacity)
+                    sketch.offer(key, label)
+
+    def top(self, k: int = 10, mode: Optional[str] = None) -> List[Tuple[str, int, int]]:
+        """k most frequent questions as (query, count, error)"""
+        with self._lock:
+            sketch = self._view.get(mode or ALL_MODES)
+            return sketch.top(k) if sketch else []
+
+    @property
+    def ready(self) -> bool:
+        """The counts include history (seeded or loaded from the shared file)"""
+        return bool(self.path) and self._loaded and not self._needs_seed
+
+    def total(self, mode: Optional[str] = None) -> int:
+        with self._lock:
+            sketch = self._view.get(mode or ALL_MODES)
+            return sketch.total if sketch else 0
+
+    # ---- persistence ----
+
+    def _read(self, f) -> Optional[Dict[str, SpaceSaving]]:
+        """Sketches from the shared file, None if it can't be parsed"""
+        f.seek(0)
+        try:
+            data = json.loads(f.read())
+            return {name: SpaceSaving.from_dict(sketch, self.capacity) for name, sketch in data["modes"].items()}
+        except Exception as e:
+            logger.error(f"❌ Popular queries file {self.path} unreadable: {e}")
+            return None
+
+    def sync(self, seed: Optional[Dict[str, SpaceSaving]] = None) -> None:
+        """
+        Merge this worker's new counts into the shared file and reload the
+        merged view (blocking); the file is only created from a seed
+        """
+        if not self.path:
+            return
+
+        with self._lock:
+            delta, self._delta = self._delta, {}
+
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(f"{self.path}.lock", "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    exists = os.path.exists(self.path)
+                    if not exists and seed is None:
+                        self._needs_seed = True  # e.g. moved aside by another worker
+                        raise RuntimeError("not seeded yet")
+                    if exists:
+                        with open(self.path, "r", encoding="utf-8") as f:
+                            merged = self._read(f)
+                        if merged is None:
+                            # Overwriting it would silently drop all history: reseed from the rollups
+                            os.replace(self.path, f"{self.path}.corrupt")
+                            self._needs_seed = True
+                            raise RuntimeError(f"moved the unreadable file to {self.path}.corrupt, reseeding")
+                    else:
+                        merged = dict(seed)
+                    for name, sketch in delta.items():
+                        merged.setdefault(name, SpaceSaving(self.capacity)).merge(sketch)
+
+                    if delta or not exists:
+                        with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+                            json.dump({"modes": {name: sketch.to_dict() for name, sketch in merged.items()}}, f)
+                        os.replace(f"{self.path}.tmp", self.path)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        except Exception as e:
+            if seed is not None:
+                self._needs_seed = True  # the seed never reached the file
+            # Put the counts back so the next sync retries them
+            with self._lock:
+                for name, sketch in self._delta.items():
+                    delta.setdefault(name, SpaceSaving(self.capacity)).merge(sketch)
+                self._delta = delta
+            self.sync_errors += 1
+            logger.error(f"❌ Popular queries sync failed: {e}")
+            return
+
+        with self._lock:
+            # Counts offered while we were writing are already in _delta; add them to the new view
+            for name, sketch in self._delta.items():
+                merged.setdefault(name, SpaceSaving(self.capacity)).merge(sketch)
+            self._view = merged
+            self._loaded = True
+        self.syncs += 1
+        logger.debug(f"✓ Popular queries synced ({self.total()} queries)")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_seconds)
+            await self._sync()
+
+    async def _sync(self) -> None:
+        if not self._needs_seed:
+            await asyncio.to_thread(self.sync)
+            if not self._needs_seed:
+                return
+            # The file disappeared or was unreadable: reseed right away
+        if os.path.exists(self.path):
+            # Another worker seeded the file: join it
+            self._needs_seed = False
+            await asyncio.to_thread(self.sync)
+            return
+
+        # Counts logged so far are already in the rollups the seed is read from
+        with self._lock:
+            self._delta = {}
+        try:
+            seed = await self._seed_from(self._db)
+        except Exception as e:
+            self.seed_errors += 1
+            logger.warning(f"Could not seed popular queries from the rollups, retrying at the next sync: {e}")
+            return
+        self._needs_seed = False
+        await asyncio.to_thread(self.sync, seed)
+
+    async def _seed_from(self, db) -> Dict[str, SpaceSaving]:
+        """All-time counts from the analytics rollups (raises if they can't be read)"""
+        distribution = {mode: rollup["count"] for mode, rollup in (await db.get_mode_rollups()).items()}
+        seed = {}
+        for mode in [None, *distribution]:
+            rows = await db.get_popular_queries(limit=self.capacity, mode=mode, raise_errors=True)
+            sketch = SpaceSaving(self.capacity)
+            entries = {}
+            for query, count in rows:
+                key = normalize_query(query or "")
+                if key:
+                    label, previous = entries.get(key, (query, 0))
+                    entries[key] = (label, previous + count)
+            total = distribution.get(mode, 0) if mode else sum(distribution.values())
+            # Rollup counts are exact (error 0); anything past the top `capacity` is bounded by min_count
+            sketch._rebuild([(key, label, count, 0) for key, (label, count) in entries.items()], total)
+            seed[mode or ALL_MODES] = sketch
+        return seed
+
+    async def start(self, db) -> None:
+        """Load the shared counts (seeded from the rollups on first start), then sync every sync_seconds"""
+        if not self.path:
+            return
+        self._db = db
+        self._needs_seed = not os.path.exists(self.path)
+        await self._sync()
+        logger.info(f"✓ Popular queries loaded: {self.total()} queries from {self.path}")
+        if self.sync_seconds > 0 and not (self._task and not self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Final sync on shutdown"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self.path and not self._needs_seed:
+            await asyncio.to_thread(self.sync)
+
+    def stats(self) -> Dict:
+        """Sketch sizes, error bounds and sync counters"""
+        with self._lock:
+            modes = {
+                name: {
+                    "total": sketch.total,
+                    "tracked": len(sketch),
+                    "min_count": sketch.min_count,  # max overcount of any reported query
+                }
+                for name, sketch in self._view.items()
+            }
+            pending = sum(sketch.total for name, sketch in self._delta.items() if name == ALL_MODES)
+        return {
+            "capacity": self.capacity,
+            "path": self.path,
+            "sync_seconds": self.sync_seconds,
+            "modes": modes,
+            "pending": pending,
+            "syncs": self.syncs,
+            "sync_errors": self.sync_errors,
+            "ready": self.ready,
+            "seed_errors": self.seed_errors,
+        }
+
+
+# Global instance
+popular_queries = PopularQueries(
+    capacity=settings.POPULAR_QUERIES_CAPACITY,
+    path=settings.POPULAR_QUERIES_PATH,
+    sync_seconds=settings.POPULAR_QUERIES_SYNC_SECONDS
+)
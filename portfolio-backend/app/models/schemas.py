@@ -61,6 +61,14 @@ class HealthResponse(BaseModel):
     environment: str
     timestamp: datetime
 
+class ReadyResponse(BaseModel):
+    status: str  # loading | ready | error
+    embedding_model: str
+    embedding_backend: str
+    model_load_seconds: Optional[float] = None
+    model_warmup_seconds: Optional[float] = None
+    timestamp: datetime
+
 # Database Models
 
 class ModeDetectionResult(BaseModel):
@@ -74,7 +82,17 @@ class RetrievedChunk(BaseModel):
     source: Optional[str] = "unknown"
     embedding: Optional[List[float]] = Field(default_factory=list)
     similarity: Optional[float] = 0.0
+    dup_group: Optional[str] = None  # near-duplicate group assigned at ingest
     
     class Config:
         # Allow creating from dict
         from_attributes = True
+
+class RetrievalResult(BaseModel):
+    chunks: List[RetrievedChunk] = Field(default_factory=list)
+    tier: str = "none"  # primary | fallback | lexical | none | error
+    threshold: Optional[float] = None  # similarity threshold of the vector tier used
+    vector_candidates: int = 0
+    lexical_candidates: int = 0
+    cached: bool = False  # served from the retrieval cache
+    degraded: bool = False  # vector search failed, lexical candidates only (never cached)
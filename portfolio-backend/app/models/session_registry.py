@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+import uuid as uuid_lib
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from app.config import settings
+from app.models.database import db
+from app.models.history import conversation_store
+
+logger = logging.getLogger(__name__)
+
+
+class SessionRegistry:
+    """
+    Per-worker LRU of chat session ids known to exist in chat_sessions
+    - A warm session never touches the table again
+    - Unknown (but valid) ids are upserted once through db.create_session
+    - Missing or malformed ids get a fresh session
+    - Only ids whose row was really written are remembered; `session_id in
+      session_registry` is the check before saving messages (messages.session_id
+      is a foreign key, an orphan row would be rejected)
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._sessions: "OrderedDict[str, float]" = OrderedDict()  # id -> created_at (epoch)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def _remember(self, session_id: str, created_at: Optional[float] = None) -> None:
+        with self._lock:
+            self._sessions[session_id] = created_at or time.time()
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_entries:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+
+    def _lookup(self, session_id: str) -> bool:
+        with self._lock:
+            if session_id in self._sessions:
+                self._sessions.move_to_end(session_id)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    async def ensure(self, session_id: Optional[str]) -> str:
+        """
+        Return the session id to use (one round trip at most, on a cold id)
+        If the chat_sessions row could not be written the id is returned but
+        not remembered, so `in` is False and its messages must not be saved
+        """
+        if session_id:
+            try:
+                uuid_lib.UUID(session_id)
+            except ValueError:
+                logger.warning(f"Invalid session ID format (not UUID): {session_id}, creating a new session")
+                session_id = None
+
+        if not session_id:
+            try:
+                session_id = await db.create_session()
+            except Exception as e:
+                # Still answer; the client resends this id and the next turn upserts it
+                self.errors += 1
+                session_id = str(uuid_lib.uuid4())
+                logger.error(f"Session insert failed, {session_id} not persisted yet: {e}")
+                return session_id
+            self.created += 1
+            self._remember(session_id)
+            conversation_store.start(session_id)  # nothing to cold-load for a new session
+            logger.info(f"🆕 Created new session: {session_id}")
+            return session_id
+
+        if self._lookup(session_id):
+            return session_id
+
+        try:
+            await db.create_session(session_id=session_id)
+            self._remember(session_id)
+        except Exception as e:
+            # Not remembered: the next turn retries the upsert
+            self.errors += 1
+            logger.error(f"Session upsert failed for {session_id}: {e}")
+        return session_id
+
+    def stats(self) -> Dict:
+        """Registry size and hit rate"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "sessions": len(self._sessions),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "created": self.created,
+                "evictions": self.evictions,
+                "errors": self.errors,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Global instance
+session_registry = SessionRegistry(max_entries=settings.SESSION_REGISTRY_SIZE)
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """
+    Bounded in-process write-behind queue for rows nobody waits on
+    (chat messages, analytics)
+    - enqueue() never awaits the database; rows are buffered per table
+    - One background task per table bulk-inserts it when it reaches
+      batch_size rows or flush_ms after the first buffered row
+    - Transient failures retry with exponential backoff, then the batch is dropped
+    - A rejected batch (constraint / bad request, see is_retryable) is not
+      retried as a whole: its rows are written one at a time so only the
+      offending rows are dropped
+    - Tables flush independently: one table in retry backoff doesn't delay
+      the rows queued for the others
+    - Over max_rows buffered, new rows are dropped (counted, never blocking)
+    - drain() flushes everything on shutdown
+    """
+
+    def __init__(self, writer: Callable[[str, List[Dict]], Awaitable], max_rows: int = 10000,
+                 batch_size: int = 100, flush_ms: float = 200, max_retries: int = 5,
+                 backoff_ms: float = 200, max_backoff_ms: float = 10000,
+                 is_retryable: Optional[Callable[[Exception], bool]] = None):
+        self.writer = writer
+        self.is_retryable = is_retryable or (lambda error: True)
+        self.max_rows = max_rows
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self.max_retries = max_retries
+        self.backoff_ms = backoff_ms
+        self.max_backoff_ms = max_backoff_ms
+
+        self._buffers: Dict[str, Deque[Dict]] = {}
+        self._in_flight: Dict[str, List[Dict]] = {}
+        self._depth = 0
+        self._has_rows: Dict[str, asyncio.Event] = {}
+        self._batch_ready: Dict[str, asyncio.Event] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._closing = False
+
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.dropped_full = 0
+        self.dropped_failed = 0
+        self.dropped_rejected = 0
+        self.splits = 0
+        self.max_depth_seen = 0
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    def start(self, table: Optional[str] = None) -> None:
+        """Open the queue and start table's flush task on the running loop (idempotent)"""
+        self._closing = False
+        if table is None:
+            return
+        task = self._tasks.get(table)
+        if task and not task.done():
+            return
+        self._has_rows[table] = asyncio.Event()
+        self._batch_ready[table] = asyncio.Event()
+        self._tasks[table] = asyncio.get_running_loop().create_task(self._run(table))
+
+    def enqueue(self, table: str, row: Dict) -> bool:
+        """Buffer a row for table; False if it was dropped because the queue is full"""
+        if self._closing or self._depth >= self.max_rows:
+            self.dropped_full += 1
+            logger.warning(f"Write queue {'closed' if self._closing else 'full'} ({self._depth} rows), dropped a {table} row")
+            return False
+
+        self._buffers.setdefault(table, deque()).append(row)
+        self._depth += 1
+        self.enqueued += 1
+        self.max_depth_seen = max(self.max_depth_seen, self._depth)
+
+        self.start(table)
+        self._has_rows[table].set()
+        if len(self._buffers[table]) >= self.batch_size:
+            self._batch_ready[table].set()
+        return True
+
+    async def _run(self, table: str) -> None:
+        has_rows, batch_ready, buffer = self._has_rows[table], self._batch_ready[table], self._buffers[table]
+        while True:
+            await has_rows.wait()
+            # Size trigger flushes early, otherwise flush_ms after the first row
+            try:
+                await asyncio.wait_for(batch_ready.wait(), timeout=self.flush_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            has_rows.clear()
+            batch_ready.clear()
+
+            await self._flush_table(table)
+            if self._closing and not buffer:
+                return
+            if buffer:
+                has_rows.set()
+
+    async def _flush_table(self, table: str) -> None:
+        buffer = self._buffers[table]
+        while buffer:
+            batch = [buffer.popleft() for _ in range(min(self.batch_size, len(buffer)))]
+            self._depth -= len(batch)
+            self._in_flight[table] = batch
+            try:
+                await self._write(table, batch)
+            finally:
+                self._in_flight.pop(table, None)
+
+    def pending(self, table: str) -> List[Dict]:
+        """Rows of table not confirmed written yet (in flight + buffered), oldest first"""
+        return [*self._in_flight.get(table, ()), *self._buffers.get(table, ())]
+
+    async def _write(self, table: str, batch: List[Dict]) -> None:
+        """Bulk insert with exponential backoff; the batch is dropped after max_retries"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                start = time.perf_counter()
+                await self.writer(table, batch)
+                self.written += len(batch)
+                self.batches += 1
+                logger.debug(f"✓ Wrote {len(batch)} {table} rows in {(time.perf_counter() - start) * 1000:.0f}ms")
+                return
+            except Exception as e:
+                if not self.is_retryable(e):
+                    await self._write_rejected(table, batch, e)
+                    return
+                if attempt == self.max_retries:
+                    self.dropped_failed += len(batch)
+                    logger.error(f"❌ Dropped {len(batch)} {table} rows after {attempt + 1} attempts: {e}")
+                    return
+                self.retries += 1
+                delay = min(self.backoff_ms * (2 ** attempt), self.max_backoff_ms) / 1000
+                logger.warning(f"Write of {len(batch)} {table} rows failed ({e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def _write_rejected(self, table: str, batch: List[Dict], error: Exception) -> None:
+        """Retrying won't help: isolate the bad rows by writing one row at a time"""
+        if len(batch) == 1:
+            self.dropped_rejected += 1
+            logger.error(f"❌ Dropped a rejected {table} row: {error}")
+            return
+
+        self.splits += 1
+        logger.warning(f"{table} batch of {len(batch)} rows rejected ({error}), writing rows one at a time")
+        for row in batch:
+            await self._write(table, [row])
+
+    async def drain(self, timeout: float = 10.0) -> None:
+        """Stop accepting rows and flush what is buffered (app shutdown)"""
+        self._closing = True
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        if not tasks:
+            return
+
+        if self._depth:
+            logger.info(f"Draining write queue ({self._depth} rows)...")
+        for table in self._tasks:
+            self._has_rows[table].set()
+            self._batch_ready[table].set()
+        try:
+            await asyncio.wait_for(asyncio.gather(*tasks), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.dropped_failed += self._depth
+            logger.error(f"❌ Write queue drain timed out, {self._depth} rows lost")
+
+    def stats(self) -> Dict:
+        """Queue depth and write/drop counters"""
+        return {
+            "depth": self._depth,
+            "depth_by_table": {table: len(buffer) for table, buffer in self._buffers.items()},
+            "max_depth_seen": self.max_depth_seen,
+            "max_rows": self.max_rows,
+            "batch_size": self.batch_size,
+            "flush_ms": self.flush_ms,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "retries": self.retries,
+            "dropped_full": self.dropped_full,
+            "dropped_failed": self.dropped_failed,
+            "dropped_rejected": self.dropped_rejected,
+            "splits": self.splits,
+            "running": any(not task.done() for task in self._tasks.values()),
+        }
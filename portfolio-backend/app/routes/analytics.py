@@ -1,28 +1,38 @@
+import asyncio
 import logging
 from datetime import datetime
 from fastapi import APIRouter, HTTPException
-from typing import Optional
+from typing import List, Optional
 
 from app.models.database import db
+from app.models.popular_queries import popular_queries
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+async def _popular(limit: int, mode: Optional[str], hours: Optional[int]) -> List[dict]:
+    """All-time counts from the in-process sketch (O(limit)); time windows from the hourly rollups"""
+    if hours is None and popular_queries.ready and popular_queries.total(mode):
+        return [
+            {"query": q, "count": count, "error": error}
+            for q, count, error in popular_queries.top(limit, mode)
+        ]
+    queries = await db.get_popular_queries(limit=limit, mode=mode, hours=hours)
+    return [{"query": q, "count": count} for q, count in queries]
+
 @router.get("/analytics/popular-queries")
-async def get_popular_queries(limit: int = 10, mode: Optional[str] = None):
-    """Get most popular questions asked"""
+async def get_popular_queries(limit: int = 10, mode: Optional[str] = None, hours: Optional[int] = None):
+    """Get most popular questions asked (last `hours`, all time by default)"""
     try:
-        queries = await db.get_popular_queries(limit=limit, mode=mode)
+        queries = await _popular(limit, mode, hours)
         
         return {
             "status": "success",
             "mode_filter": mode,
+            "period_hours": hours,
             "limit": limit,
-            "queries": [
-                {"query": q, "count": count} 
-                for q, count in queries
-            ]
+            "queries": queries
         }
     except Exception as e:
         logger.error(f"Error getting popular queries: {e}")
@@ -38,6 +48,7 @@ async def get_quality_metrics(hours: int = 24):
             "status": "success",
             "period_hours": hours,
             "average_quality_score": metrics.get("average_quality", 0),
+            "stddev_quality_score": metrics.get("stddev_quality", 0),
             "by_mode": metrics.get("by_mode", {}),
             "total_queries": metrics.get("total_queries", 0)
         }
@@ -46,10 +57,10 @@ async def get_quality_metrics(hours: int = 24):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/analytics/mode-distribution")
-async def get_mode_distribution():
-    """Get distribution of queries by mode"""
+async def get_mode_distribution(hours: Optional[int] = None):
+    """Get distribution of queries by mode (last `hours`, all time by default)"""
     try:
-        distribution = await db.get_mode_distribution()
+        distribution = await db.get_mode_distribution(hours=hours)
         
         total = sum(distribution.values())
         percentages = {
@@ -59,6 +70,7 @@ async def get_mode_distribution():
         
         return {
             "status": "success",
+            "period_hours": hours,
             "distribution": distribution,
             "percentages": percentages,
             "total_queries": total
@@ -68,28 +80,29 @@ async def get_mode_distribution():
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/analytics/dashboard")
-async def get_dashboard():
-    """Complete analytics dashboard"""
+async def get_dashboard(hours: Optional[int] = None):
+    """Complete analytics dashboard (last `hours`, all time by default)"""
     try:
-        popular = await db.get_popular_queries(limit=10)
-        metrics = await db.get_quality_metrics()
-        distribution = await db.get_mode_distribution()
+        # Two rollup RPCs in parallel; the mode distribution comes from the quality rollup
+        popular, metrics = await asyncio.gather(
+            _popular(10, None, hours),
+            db.get_quality_metrics(hours=hours)
+        )
+        distribution = {mode: stats["count"] for mode, stats in metrics.get("by_mode", {}).items()}
         
         total = sum(distribution.values())
         
         return {
             "status": "success",
             "timestamp": datetime.now().isoformat(),
+            "period_hours": hours,
             "summary": {
                 "total_queries": metrics.get("total_queries", 0),
                 "average_quality": metrics.get("average_quality", 0),
                 "popular_queries": len(popular),
                 "modes_used": len(distribution)
             },
-            "popular_questions": [
-                {"query": q, "count": count}
-                for q, count in popular
-            ],
+            "popular_questions": popular,
             "quality_by_mode": metrics.get("by_mode", {}),
             "mode_distribution": {
                 "counts": distribution,
@@ -6,13 +6,18 @@ import json
 import asyncio
 from datetime import datetime
 
-from app.models.schemas import ChatRequest, ChatResponse
+from app.models.schemas import ChatRequest, ChatResponse, RetrievalResult
 from app.agents.mode_detector import detect_mode
 from app.agents.advanced_rag import advanced_rag
 from app.agents.response_agent import generate_response_with_history
 from app.agents.judge_agent import judge_response, should_revise, should_reject
 from app.models.database import db
+from app.models.session_registry import session_registry
+from app.models.history import conversation_store
 from app.agents.context_filter import smart_context_decision
+from app.embeddings.context import RequestEmbeddings
+from app.agents.retrieval_cache import retrieval_cache
+from app.agents.answer_cache import answer_cache
 import uuid as uuid_lib
 
 logger = logging.getLogger(__name__)
@@ -23,32 +28,8 @@ async def chat(request: ChatRequest):
     """Main chat endpoint with PROPER follow-up handling"""
     
     try:
-        # Step 1: Session management
-        session_id = request.session_id
-        
-        if not session_id:
-            session_id = await db.create_session()
-            logger.info(f"🆕 Created new session: {session_id}")
-        else:
-            # Verify session exists
-            try:
-                import uuid
-                uuid.UUID(session_id)
-                
-                sessions = db.client.table("chat_sessions").select("id").eq("id", session_id).limit(1).execute()
-                
-                if not sessions.data or len(sessions.data) == 0:
-                    logger.warning(f"Session {session_id} not found, creating...")
-                    # Create session without user_id
-                    db.client.table("chat_sessions").insert({
-                        "id": session_id,
-                        "created_at": datetime.now().isoformat()
-                    }).execute()
-                    logger.info(f"✓ Created session in DB: {session_id}")
-                    
-            except Exception as e:
-                logger.error(f"Session validation error: {e}")
-                session_id = await db.create_session()
+        # Step 1: Session management (registry: no DB round trip for a warm session)
+        session_id = await session_registry.ensure(request.session_id)
         
         # Step 2: Detect mode
         if request.mode and request.mode in ["recruiter", "engineer", "ama"]:
@@ -63,7 +44,7 @@ async def chat(request: ChatRequest):
         conversation_history = []
         if session_id:
             try:
-                conversation_history = await db.get_conversation_history(session_id, limit=6)
+                conversation_history = await conversation_store.get(session_id, limit=6)
                 logger.info(f"📖 Loaded {len(conversation_history)} previous messages for session {session_id}")
             except Exception as e:
                 logger.warning(f"Could not load conversation history: {e}")
@@ -138,24 +119,42 @@ async def chat(request: ChatRequest):
                         logger.info(f"📚 Previous project detected: {followup_project}")
                         break
 
+        # One embedding memo for the whole request: the query is encoded once
+        # and reused by the context decision, retrieval and re-ranking
+        query_embeddings = RequestEmbeddings()
+
         # Use semantic approach to decide if we should filter
         context_decision = await smart_context_decision(
             current_query=request.message,
             conversation_history=conversation_history,
             previous_project=followup_project,
             use_llm=True,
-            use_embeddings=True
+            use_embeddings=True,
+            embeddings=query_embeddings
         )
 
         logger.info(f"🧠 Context Decision: {context_decision['reasoning']}")
 
-        # Step 5: RAG retrieval
+        # Step 5: RAG retrieval (follow-ups search only the target project)
+        target_project = context_decision['target_project'] if context_decision['should_filter'] else None
         logger.info("📚 Starting advanced RAG retrieval...")
         try:
-            chunks = await advanced_rag.retrieve_advanced(request.message, top_k=5)
+            retrieval = await advanced_rag.retrieve_advanced(
+                request.message, top_k=5, embeddings=query_embeddings, project=target_project
+            )
+            if target_project and not retrieval.chunks:
+                logger.info(f"⚠️ No chunks for {target_project}, searching all projects")
+                retrieval = await advanced_rag.retrieve_advanced(
+                    request.message, top_k=5, embeddings=query_embeddings
+                )
+            elif target_project:
+                logger.info(f"✂️ Retrieved {len(retrieval.chunks)} chunks from {target_project}")
+            else:
+                logger.info(f"🌐 Searching all projects (context: {context_decision['reasoning'][:40]}...)")
         except Exception as e:
             logger.error(f"RAG retrieval failed: {e}")
-            chunks = []
+            retrieval = RetrievalResult(tier="error")
+        chunks = retrieval.chunks
 
         if not chunks:
             logger.warning("⚠️ No relevant chunks found")
@@ -166,100 +165,104 @@ async def chat(request: ChatRequest):
                 sources=[]
             )
 
-        # Step 6: CONDITIONALLY filter chunks based on semantic decision
-        if context_decision['should_filter'] and context_decision['target_project']:
-            target = context_decision['target_project'].lower()
-            filtered_chunks = [
-                c for c in chunks 
-                if c.source and c.source.lower() == target
-            ]
-            
-            if filtered_chunks:
-                chunks = filtered_chunks
-                logger.info(f"✂️ Filtered to {len(chunks)} chunks for {target}")
-            else:
-                logger.info(f"⚠️ No chunks for {target}, using all {len(chunks)} chunks")
-        else:
-            logger.info(f"🌐 Using all {len(chunks)} chunks (context: {context_decision['reasoning'][:40]}...)")
-
         logger.info(f"✅ Retrieved {len(chunks)} chunks")
 
         
-        # Step 7: Generate response
-        logger.info("🤖 Generating response...")
-        try:
-            response_text = await generate_response_with_history(
-                request.message,
-                mode,
-                chunks,
-                conversation_history=conversation_history,
-                stream=False  # Use stream=True for streaming endpoint
-            )
-        except Exception as e:
-            logger.error(f"Response generation failed: {e}")
-            return ChatResponse(
-                response="I encountered an error generating a response. Please try again.",
-                mode=mode,
-                judge_score=None,
-                sources=[c.source for c in chunks]
-            )
-        
-        logger.info(f"✅ Response generated ({len(response_text)} chars)")
+        # Step 6: Semantic answer cache (first turn only: history changes the answer)
+        use_answer_cache = not conversation_history
+        chunk_ids = [chunk.id for chunk in chunks]
+        corpus_version = retrieval_cache.corpus_version
+        query_embedding = None
+        cached_answer = None
+        if use_answer_cache:
+            try:
+                query_embedding = await query_embeddings.aembed_query(request.message)
+                cached_answer = answer_cache.get(query_embedding, mode, chunk_ids, corpus_version)
+            except Exception as e:
+                logger.warning(f"Answer cache lookup failed: {e}")
         
-        # Step 8: Judge validation (skip for recruiter)
-        judge_score = None
-        if mode != "recruiter":
+        if cached_answer is not None:
+            response_text = cached_answer.response
+            judge_score = cached_answer.judge_score.model_copy() if cached_answer.judge_score else None
+        else:
+            # Step 7: Generate response
+            logger.info("🤖 Generating response...")
             try:
-                judge_score = await judge_response(response_text, chunks, mode)
-                logger.info(f"📊 Initial Judge Score: {judge_score.average_score:.1f}/10")
+                response_text = await generate_response_with_history(
+                    request.message,
+                    mode,
+                    chunks,
+                    conversation_history=conversation_history,
+                    stream=False  # Use stream=True for streaming endpoint
+                )
+            except Exception as e:
+                logger.error(f"Response generation failed: {e}")
+                return ChatResponse(
+                    response="I encountered an error generating a response. Please try again.",
+                    mode=mode,
+                    judge_score=None,
+                    sources=[c.source for c in chunks]
+                )
+        
+            logger.info(f"✅ Response generated ({len(response_text)} chars)")
+        
+            # Step 8: Judge validation (skip for recruiter)
+            judge_score = None
+            if mode != "recruiter":
+                try:
+                    judge_score = await judge_response(response_text, chunks, mode)
+                    logger.info(f"📊 Initial Judge Score: {judge_score.average_score:.1f}/10")
                 
-                # Revision loop
-                revision_count = 0
-                max_revisions = 2
+                    # Revision loop
+                    revision_count = 0
+                    max_revisions = 2
                 
-                while should_revise(judge_score) and revision_count < max_revisions:
-                    revision_count += 1
-                    logger.info(f"🔄 Revision {revision_count}: {judge_score.feedback}")
+                    while should_revise(judge_score) and revision_count < max_revisions:
+                        revision_count += 1
+                        logger.info(f"🔄 Revision {revision_count}: {judge_score.feedback}")
                     
-                    response_text = await generate_response_with_history(
-                        request.message,
-                        mode,
-                        chunks,
-                        revision_feedback=judge_score.feedback,
-                        conversation_history=conversation_history,
-                        stream=False
-                    )
+                        response_text = await generate_response_with_history(
+                            request.message,
+                            mode,
+                            chunks,
+                            revision_feedback=judge_score.feedback,
+                            conversation_history=conversation_history,
+                            stream=False
+                        )
                     
-                    judge_score = await judge_response(response_text, chunks, mode)
-                    logger.info(f"📊 Judge Score After Revision {revision_count}: {judge_score.average_score:.1f}/10")
+                        judge_score = await judge_response(response_text, chunks, mode)
+                        logger.info(f"📊 Judge Score After Revision {revision_count}: {judge_score.average_score:.1f}/10")
                 
-                if should_reject(judge_score):
-                    logger.warning("❌ Response rejected after revisions")
-                    response_text = f"I apologize, but I cannot provide a confident answer. Issues: {', '.join(judge_score.feedback)}"
+                    if should_reject(judge_score):
+                        logger.warning("❌ Response rejected after revisions")
+                        response_text = f"I apologize, but I cannot provide a confident answer. Issues: {', '.join(judge_score.feedback)}"
             
-            except Exception as e:
-                logger.warning(f"Judge evaluation failed: {e}")
-                judge_score = None
+                except Exception as e:
+                    logger.warning(f"Judge evaluation failed: {e}")
+                    judge_score = None
+            
+            # Only judge-approved answers are stored (recruiter answers only if ANSWER_CACHE_UNJUDGED_MODES opts in)
+            if query_embedding is not None:
+                answer_cache.put(
+                    request.message, query_embedding, mode, chunk_ids, corpus_version,
+                    response_text, judge_score
+                )
         
-        # Step 9: Save conversation
-        if session_id:
-            try:
-                await db.save_message(session_id, "user", request.message)
-                await db.save_message(session_id, "assistant", response_text)
-            except Exception as e:
-                logger.warning(f"Could not save conversation: {e}")
+        # Step 9: Save conversation (history buffer + write-behind, not on the response path)
+        # Only for a persisted session: messages.session_id references chat_sessions
+        if session_id in session_registry:
+            conversation_store.append(session_id, "user", request.message)
+            conversation_store.append(session_id, "assistant", response_text)
         
-        # Step 10: Log analytics
+        # Step 10: Log analytics (write-behind)
         sources = list(set([chunk.source for chunk in chunks]))
-        try:
-            await db.log_query(
-                request.message,
-                mode,
-                judge_score.average_score if judge_score else 0,
-                sources
-            )
-        except Exception as e:
-            logger.warning(f"Could not log analytics: {e}")
+        db.queue_query_log(
+            request.message,
+            mode,
+            judge_score.average_score if judge_score else 0,
+            sources,
+            retrieval_tier=retrieval.tier
+        )
         
         logger.info(f"✅ Chat complete. Sources used: {sources}")
         
@@ -285,25 +288,14 @@ async def chat_stream(request: ChatRequest):
         
         try:
             # Setup (same as regular chat)
-            session_id = request.session_id or await db.create_session()
-            
-            # Ensure session exists
-            try:
-                sessions = db.client.table("chat_sessions").select("id").eq("id", session_id).limit(1).execute()
-                if not sessions.data:
-                    db.client.table("chat_sessions").insert({
-                        "id": session_id,
-                        "created_at": datetime.now().isoformat()
-                    }).execute()
-            except:
-                pass
+            session_id = await session_registry.ensure(request.session_id)
             
             mode = request.mode if request.mode in ["recruiter", "engineer", "ama"] else (await detect_mode(request.message)).get("mode", "ama")
             
             # Get conversation history
             conversation_history = []
             try:
-                conversation_history = await db.get_conversation_history(session_id, limit=6)
+                conversation_history = await conversation_store.get(session_id, limit=6)
             except:
                 pass
             
@@ -320,19 +312,33 @@ async def chat_stream(request: ChatRequest):
                             followup_project = sources[0].strip()   
                             break
 
-            # RAG retrieval
-            chunks = await advanced_rag.retrieve_advanced(request.message, top_k=5)
+            # Same context decision as /chat: scope to the previous project only for
+            # real follow-ups (a scoped search almost never comes back empty on a topic change)
+            query_embeddings = RequestEmbeddings()
+            target_project = None
+            if followup_project:
+                context_decision = await smart_context_decision(
+                    current_query=request.message,
+                    conversation_history=conversation_history,
+                    previous_project=followup_project,
+                    use_llm=True,
+                    use_embeddings=True,
+                    embeddings=query_embeddings
+                )
+                if context_decision['should_filter']:
+                    target_project = context_decision['target_project']
+            
+            retrieval = await advanced_rag.retrieve_advanced(
+                request.message, top_k=5, embeddings=query_embeddings, project=target_project
+            )
+            if target_project and not retrieval.chunks:
+                retrieval = await advanced_rag.retrieve_advanced(request.message, top_k=5, embeddings=query_embeddings)
+            chunks = retrieval.chunks
             
             if not chunks:
                 yield json.dumps({"type": "error", "message": "No relevant information found"}) + "\n"
                 return
             
-            # Filter for follow-up
-            if followup_project:
-                filtered = [c for c in chunks if c.source and c.source.lower() == followup_project.lower()]
-                if filtered:
-                    chunks = filtered
-            
             sources = list(set([c.source for c in chunks]))
             
             # Send start event
@@ -365,18 +371,11 @@ async def chat_stream(request: ChatRequest):
             except:
                 pass
             
-            # Save messages
-            try:
-                await db.save_message(session_id, "user", request.message)
-                await db.save_message(session_id, "assistant", full_response)
-            except:
-                pass
-            
-            # Log analytics
-            try:
-                await db.log_query(request.message, mode, judge_score.average_score if judge_score else 0, sources)
-            except:
-                pass
+            # Save messages + log analytics (write-behind, the end event doesn't wait)
+            if session_id in session_registry:
+                conversation_store.append(session_id, "user", request.message)
+                conversation_store.append(session_id, "assistant", full_response)
+            db.queue_query_log(request.message, mode, judge_score.average_score if judge_score else 0, sources, retrieval_tier=retrieval.tier)
             
             # Send end event
             yield json.dumps({
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, HTTPException
 from app.agents.advanced_rag import advanced_rag
 import logging
@@ -29,14 +30,16 @@ async def database_stats():
     
     try:
         # Get basic stats
-        docs_response = db.client.table("portfolio_documents").select("id").execute()
-        chunks_response = db.client.table("portfolio_chunks").select("id").execute()
+        docs_response, chunks_response, sources = await asyncio.gather(
+            db.execute(db.rest.table("portfolio_documents").select("id")),
+            db.execute(db.rest.table("portfolio_chunks").select("id")),
+            db.execute(db.rest.table("portfolio_documents").select("title"))
+        )
         
         doc_count = len(docs_response.data)
         chunk_count = len(chunks_response.data)
         
         # Get sources
-        sources = db.client.table("portfolio_documents").select("title").execute()
         source_list = [s.get("title") for s in sources.data]
         
         return {
@@ -49,3 +52,104 @@ async def database_stats():
     except Exception as e:
         logger.error(f"Stats error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/debug/embedding-cache")
+async def embedding_cache_stats():
+    """Embedding cache hit/miss/eviction counters"""
+    from app.embeddings.nomic import embedding_model
+    
+    return {
+        "status": "success",
+        "cache": embedding_model.cache_stats()
+    }
+
+@router.get("/debug/retrieval-cache")
+async def retrieval_cache_stats():
+    """Retrieval result cache hit/miss/eviction counters"""
+    from app.agents.retrieval_cache import retrieval_cache
+    
+    return {
+        "status": "success",
+        "cache": retrieval_cache.stats()
+    }
+
+@router.get("/debug/answer-cache")
+async def answer_cache_stats():
+    """Semantic answer cache hit/miss/eviction counters"""
+    from app.agents.answer_cache import answer_cache
+    
+    return {
+        "status": "success",
+        "cache": answer_cache.stats()
+    }
+
+@router.get("/debug/write-queue")
+async def write_queue_stats():
+    """Write-behind queue depth, retries and dropped rows"""
+    from app.models.database import write_queue
+    
+    return {
+        "status": "success",
+        "queue": write_queue.stats()
+    }
+
+@router.get("/debug/sessions")
+async def session_registry_stats():
+    """Session registry size and hit rate"""
+    from app.models.session_registry import session_registry
+    
+    return {
+        "status": "success",
+        "registry": session_registry.stats()
+    }
+
+@router.get("/debug/popular-queries")
+async def popular_queries_stats():
+    """Heavy-hitter sketch sizes, error bounds and sync state"""
+    from app.models.popular_queries import popular_queries
+    
+    return {
+        "status": "success",
+        "sketch": popular_queries.stats()
+    }
+
+@router.get("/debug/history")
+async def history_stats():
+    """Conversation history buffers: memory use and cold loads"""
+    from app.models.history import conversation_store
+    
+    return {
+        "status": "success",
+        "history": conversation_store.stats()
+    }
+
+@router.get("/debug/embedding-batcher")
+async def embedding_batcher_stats():
+    """Micro-batcher queue depth and batch size histograms"""
+    from app.embeddings.nomic import embedding_model
+    
+    return {
+        "status": "success",
+        "batcher": embedding_model.batcher_stats()
+    }
+
+
+@router.get("/debug/memory")
+async def memory_stats():
+    """Worker memory: RSS plus PSS/USS (Linux) to see copy-on-write sharing"""
+    import os
+    
+    stats = {"pid": os.getpid()}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if parts[0] in ("Rss:", "Pss:", "Shared_Clean:", "Shared_Dirty:", "Private_Clean:", "Private_Dirty:"):
+                    stats[parts[0].rstrip(":").lower() + "_mb"] = int(parts[1]) / 1024
+        stats["uss_mb"] = stats.get("private_clean_mb", 0) + stats.get("private_dirty_mb", 0)
+    except OSError:
+        import resource
+        stats["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    
+    return {"status": "success", "memory": stats}
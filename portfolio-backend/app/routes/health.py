@@ -1,6 +1,7 @@
-from fastapi import APIRouter
-from app.models.schemas import HealthResponse
+from fastapi import APIRouter, Response
+from app.models.schemas import HealthResponse, ReadyResponse
 from app.config import settings
+from app.embeddings.nomic import embedding_model
 from datetime import datetime
 import logging
 
@@ -16,3 +17,25 @@ async def health():
         environment=settings.ENVIRONMENT,
         timestamp=datetime.now()
     )
+
+@router.get("/ready", response_model=ReadyResponse)
+async def ready(response: Response):
+    """Readiness check: 503 until the embedding model is loaded and warm"""
+    if embedding_model.is_ready:
+        status = "ready"
+    elif embedding_model.state == "error":
+        status = "error"
+    else:
+        status = "loading"
+    
+    if status != "ready":
+        response.status_code = 503
+    
+    return ReadyResponse(
+        status=status,
+        embedding_model=embedding_model.MODEL_NAME,
+        embedding_backend=embedding_model.backend_name,
+        model_load_seconds=embedding_model.load_seconds,
+        model_warmup_seconds=embedding_model.warmup_seconds,
+        timestamp=datetime.now()
+    )
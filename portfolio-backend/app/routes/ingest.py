@@ -3,6 +3,11 @@ from app.models.schemas import IngestRequest, IngestResponse
 from app.models.database import db
 from app.embeddings.nomic import embedding_model
 from app.utils.chunking import chunk_text
+from app.utils.dedup import duplicate_grouper
+from app.agents.retrieval_cache import retrieval_cache
+from app.index.local import local_index
+from app.index.bm25 import bm25_index
+from app.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
@@ -51,43 +56,80 @@ async def ingest(request: IngestRequest):
         # Step 4: Process each chunk
         logger.info(f"Step 3: Processing {len(chunks)} chunks...")
         inserted = 0
+        indexed_rows = []
         
-        for idx, chunk in enumerate(chunks):
+        # Embed all chunks in one batch on the embedding pool (keeps the event loop free);
+        # partial: a chunk that fails on its own is skipped below instead of failing the document
+        embeddings = await embedding_model.aembed_batch(chunks, partial=True)
+        
+        # Near-duplicate groups are a corpus property: computed once here, not per query
+        try:
+            await duplicate_grouper.prime(db)
+        except Exception as e:
+            logger.warning(f"Could not prime duplicate grouper from the corpus: {e}")
+        dup_groups = duplicate_grouper.assign_batch(chunks)
+        
+        for idx, (chunk, embedding, (dup_group, dup_position)) in enumerate(zip(chunks, embeddings, dup_groups)):
+            stored = False
             try:
-                # Generate embedding
-                embedding = embedding_model.embed_query(chunk)
-                
                 # Verify embedding
                 if not isinstance(embedding, list):
                     logger.error(f"Embedding is {type(embedding)}, not list")
                     continue
                 
-                if len(embedding) != 768:
-                    logger.error(f"Embedding has {len(embedding)} dims, expected 768")
+                if len(embedding) != embedding_model.dimension:
+                    logger.error(f"Embedding has {len(embedding)} dims, expected {embedding_model.dimension}")
                     continue
                 
+                metadata = {
+                    "title": request.title,
+                    "source": request.source,
+                    "project_type": request.project_type,
+                    "chunk_index": idx,
+                    "embedding_dim": embedding_model.dimension,
+                    "dup_group": dup_group
+                }
+                
                 # Insert chunk
                 result = await db.insert_chunk(
                     document_id=document_id,
                     content=chunk,
                     embedding=embedding,
-                    metadata={
-                        "title": request.title,
-                        "source": request.source,
-                        "project_type": request.project_type,
-                        "chunk_index": idx
-                    }
+                    metadata=metadata
                 )
                 
                 if result is not None:
                     inserted += 1
+                    stored = True
+                    duplicate_grouper.bind(dup_position, result.get("id"))
+                    indexed_rows.append({
+                        "id": result.get("id"),
+                        "document_id": document_id,
+                        "content": chunk,
+                        "metadata": metadata,
+                        "embedding": embedding,
+                        "created_at": result.get("created_at")
+                    })
                 
             except Exception as e:
                 logger.error(f"Error processing chunk {idx}: {e}")
                 continue
+            finally:
+                # Later chunks must not join a group through a chunk that never made it in
+                if not stored:
+                    duplicate_grouper.release(dup_position)
         
         logger.info(f"Step 3 SUCCESS: Inserted {inserted}/{len(chunks)} chunks")
         
+        # Step 5: Refresh the in-process indexes
+        if settings.BM25_INDEX:
+            bm25_index.add(indexed_rows)
+            bm25_index.schedule_save()
+        if settings.LOCAL_VECTOR_INDEX:
+            local_index.add(indexed_rows)
+        if inserted:
+            retrieval_cache.bump_version()
+        
         return IngestResponse(
             success=True,
             document_id=str(document_id),
@@ -101,3 +143,28 @@ async def ingest(request: IngestRequest):
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/ingest/{document_id}")
+async def delete_document(document_id: str):
+    """Remove a document, its chunks and their local index entries"""
+    try:
+        chunk_ids = await db.delete_document(document_id)
+        duplicate_grouper.unregister(chunk_ids)
+        
+        if settings.BM25_INDEX:
+            bm25_index.delete(chunk_ids)
+            bm25_index.schedule_save()
+        if settings.LOCAL_VECTOR_INDEX:
+            local_index.delete(chunk_ids)
+        if chunk_ids:
+            retrieval_cache.bump_version()
+        
+        return {
+            "success": True,
+            "document_id": document_id,
+            "chunks_deleted": len(chunk_ids)
+        }
+        
+    except Exception as e:
+        logger.error(f"Delete error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
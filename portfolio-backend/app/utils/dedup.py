@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def shingles(text: str, size: int = 3) -> set:
+    """Word n-grams; short texts fall back to their words"""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return set(words)
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """
+    MinHash signatures + LSH banding for Jaccard near-duplicate detection
+    - num_perm universal hash permutations, vectorised over all shingles
+    - bands x rows = num_perm; similar sets collide in at least one band
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, int(_MAX_HASH), size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, int(_MAX_HASH), size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        tokens = shingles(text)
+        if not tokens:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+
+        hashed = np.array(
+            [int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=4).digest(), "little") for t in tokens],
+            dtype=np.uint64
+        )
+        # (shingles x permutations), min over shingles
+        permuted = (np.outer(hashed, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def band_keys(self, signature: np.ndarray) -> List[str]:
+        return [
+            f"{band}:{hashlib.blake2b(signature[band * self.rows:(band + 1) * self.rows].tobytes(), digest_size=8).hexdigest()}"
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def jaccard(left: np.ndarray, right: np.ndarray) -> float:
+        """Estimated Jaccard similarity of the underlying shingle sets"""
+        return float(np.mean(left == right))
+
+
+class DuplicateGrouper:
+    """
+    Assigns every chunk a near-duplicate group id at ingest time
+    - A chunk joins the group of the first indexed chunk with estimated
+      Jaccard >= threshold (LSH buckets keep candidate lookup O(bands))
+    - Otherwise it starts a new group named after its own content
+    - Ingest assigns provisionally, then bind()s each position to its chunk
+      id once inserted or release()s it if the insert failed; deleted chunks
+      are unregister()ed so nothing joins a group through a gone chunk
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm=num_perm, bands=bands)
+        self.buckets: Dict[str, List[int]] = {}
+        self.signatures: List[Optional[np.ndarray]] = []
+        self.groups: List[Optional[str]] = []  # None = released
+        self.primed = False
+        self._ids: Dict[str, int] = {}  # chunk id -> position
+        self._released = 0
+        self._lock = threading.Lock()
+        self._prime_lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self.groups) - self._released
+
+    def _match(self, signature: np.ndarray, keys: List[str]) -> Optional[Tuple[str, float]]:
+        best = None
+        for candidate in {pos for key in keys for pos in self.buckets.get(key, ())}:
+            score = self.hasher.jaccard(signature, self.signatures[candidate])
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (self.groups[candidate], score)
+        return best
+
+    def sketch_batch(self, texts: List[str]) -> List[Tuple[np.ndarray, List[str]]]:
+        """(signature, band keys) per text; pure CPU, safe to run in a worker thread"""
+        sketches = []
+        for text in texts:
+            signature = self.hasher.signature(text)
+            sketches.append((signature, self.hasher.band_keys(signature)))
+        return sketches
+
+    def _add(self, text: str, group: Optional[str] = None, chunk_id: Optional[str] = None,
+             sketch: Optional[Tuple[np.ndarray, List[str]]] = None) -> Tuple[str, int]:
+        signature, keys = sketch or self.sketch_batch([text])[0]
+
+        with self._lock:
+            if group is None:
+                match = self._match(signature, keys)
+                group = match[0] if match else f"dup-{hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]}"
+
+            position = len(self.groups)
+            self.signatures.append(signature)
+            self.groups.append(group)
+            for key in keys:
+                self.buckets.setdefault(key, []).append(position)
+            if chunk_id is not None:
+                self._ids[str(chunk_id)] = position
+        return group, position
+
+    def assign(self, text: str, group: Optional[str] = None, chunk_id: Optional[str] = None) -> str:
+        """Group id for text (an explicit group keeps a previously stored assignment)"""
+        return self._add(text, group, chunk_id)[0]
+
+    def assign_batch(self, texts: List[str]) -> List[Tuple[str, int]]:
+        """Provisional (group, position) per text; bind() or release() each position"""
+        return [self._add(text) for text in texts]
+
+    def bind(self, position: int, chunk_id: str) -> None:
+        """The chunk at position was inserted as chunk_id"""
+        with self._lock:
+            if self.groups[position] is not None:
+                self._ids[str(chunk_id)] = position
+
+    def release(self, position: int) -> None:
+        """Forget the signature at position (insert failed or chunk deleted)"""
+        with self._lock:
+            signature = self.signatures[position]
+            if signature is None:
+                return
+            for key in self.hasher.band_keys(signature):
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    continue
+                try:
+                    bucket.remove(position)
+                except ValueError:
+                    pass
+                if not bucket:
+                    del self.buckets[key]
+            self.signatures[position] = None
+            self.groups[position] = None
+            self._released += 1
+
+    def unregister(self, chunk_ids: List[str]) -> int:
+        """Release deleted chunks; returns how many were indexed"""
+        removed = 0
+        for chunk_id in chunk_ids:
+            with self._lock:
+                position = self._ids.pop(str(chunk_id), None)
+            if position is not None:
+                self.release(position)
+                removed += 1
+        return removed
+
+    async def prime(self, db) -> int:
+        """Index the existing corpus once so new chunks can join older groups"""
+        async with self._prime_lock:  # concurrent ingests wait for one prime instead of each indexing the corpus
+            if self.primed:
+                return len(self)
+
+            rows = await db.fetch_all_chunks(columns="id, content, metadata")
+            # Hashing the whole corpus is CPU-bound: only the index updates run on the loop
+            sketches = await asyncio.to_thread(self.sketch_batch, [row.get("content") or "" for row in rows])
+            for row, sketch in zip(rows, sketches):
+                if str(row.get("id")) in self._ids:
+                    continue  # inserted by this process after an earlier prime failed
+                metadata = row.get("metadata") or {}
+                self._add(row.get("content") or "", metadata.get("dup_group"), row.get("id"), sketch)
+            self.primed = True
+
+        groups = len({group for group in self.groups if group is not None})
+        logger.info(f"✓ Duplicate grouper primed with {len(rows)} chunks ({groups} groups)")
+        return len(rows)
+
+
+# Global instance
+duplicate_grouper = DuplicateGrouper(
+    threshold=settings.DEDUP_JACCARD_THRESHOLD,
+    num_perm=settings.MINHASH_PERMUTATIONS,
+    bands=settings.MINHASH_BANDS
+)
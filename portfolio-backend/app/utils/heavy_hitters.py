@@ -0,0 +1,210 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class _Bucket:
+    __slots__ = ("count", "keys", "prev", "next")
+
+    def __init__(self, count: int):
+        self.count = count
+        self.keys: Dict[str, None] = {}  # insertion-ordered set
+        self.prev: Optional["_Bucket"] = None
+        self.next: Optional["_Bucket"] = None
+
+
+class SpaceSaving:
+    """
+    Space-Saving top-k sketch (Metwally et al.) over a Stream-Summary
+    - At most `capacity` counters; a new key evicts the minimum and inherits
+      its count as error, so count - error <= true count <= count
+    - Any key with true count > total / capacity is guaranteed to be tracked
+    - Buckets of equal count form a list ordered by count: offer() is O(1)
+      and top(k) walks down from the maximum, O(k)
+    - Mergeable: merge() combines two sketches keeping the same guarantee
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = max(int(capacity), 1)
+        self.total = 0
+
+        self._bucket_of: Dict[str, _Bucket] = {}
+        self._error: Dict[str, int] = {}
+        self._label: Dict[str, str] = {}
+        self._min: Optional[_Bucket] = None
+        self._max: Optional[_Bucket] = None
+
+    def __len__(self) -> int:
+        return len(self._bucket_of)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._bucket_of
+
+    @property
+    def full(self) -> bool:
+        return len(self._bucket_of) >= self.capacity
+
+    @property
+    def min_count(self) -> int:
+        """Upper bound on the true count of any untracked key"""
+        return self._min.count if self.full and self._min else 0
+
+    # ---- bucket list ----
+
+    def _link_after(self, node: Optional[_Bucket], count: int) -> _Bucket:
+        """New bucket right after node (at the head when node is None)"""
+        bucket = _Bucket(count)
+        bucket.prev = node
+        bucket.next = node.next if node else self._min
+        if bucket.next:
+            bucket.next.prev = bucket
+        else:
+            self._max = bucket
+        if node:
+            node.next = bucket
+        else:
+            self._min = bucket
+        return bucket
+
+    def _unlink(self, bucket: _Bucket) -> None:
+        if bucket.prev:
+            bucket.prev.next = bucket.next
+        else:
+            self._min = bucket.next
+        if bucket.next:
+            bucket.next.prev = bucket.prev
+        else:
+            self._max = bucket.prev
+
+    def _place(self, key: str, after: Optional[_Bucket], count: int) -> None:
+        target = after.next if after else self._min
+        if target is None or target.count != count:
+            target = self._link_after(after, count)
+        target.keys[key] = None
+        self._bucket_of[key] = target
+
+    def _take(self, key: str) -> _Bucket:
+        """Remove key from its bucket; returns the bucket before the gap"""
+        bucket = self._bucket_of.pop(key)
+        del bucket.keys[key]
+        if bucket.keys:
+            return bucket
+        anchor = bucket.prev
+        self._unlink(bucket)
+        return anchor
+
+    # ---- updates ----
+
+    def offer(self, key: str, label: Optional[str] = None) -> None:
+        """Count one occurrence of key (label = display text kept for the key)"""
+        self.total += 1
+
+        bucket = self._bucket_of.get(key)
+        if bucket is not None:
+            count = bucket.count + 1
+            anchor = bucket if len(bucket.keys) > 1 else bucket.prev
+            self._take(key)
+            self._place(key, anchor, count)
+            return
+
+        if not self.full:
+            self._error[key] = 0
+            self._place(key, None, 1)
+        else:
+            # Evict the oldest key of the minimum bucket; the newcomer inherits its count
+            victim_bucket = self._min
+            victim = next(iter(victim_bucket.keys))
+            count = victim_bucket.count + 1
+            anchor = victim_bucket if len(victim_bucket.keys) > 1 else None
+            self._take(victim)
+            del self._error[victim]
+            self._label.pop(victim, None)
+            self._error[key] = count - 1
+            self._place(key, anchor, count)
+
+        if label is not None:
+            self._label[key] = label
+
+    def estimate(self, key: str) -> Tuple[int, int]:
+        """(count, error) for key; an untracked key is (min_count, min_count)"""
+        bucket = self._bucket_of.get(key)
+        if bucket is None:
+            return self.min_count, self.min_count
+        return bucket.count, self._error[key]
+
+    # ---- queries ----
+
+    def items(self) -> Iterator[Tuple[str, str, int, int]]:
+        """(key, label, count, error), highest count first"""
+        bucket = self._max
+        while bucket is not None:
+            for key in bucket.keys:
+                yield key, self._label.get(key, key), bucket.count, self._error[key]
+            bucket = bucket.prev
+
+    def top(self, k: int) -> List[Tuple[str, int, int]]:
+        """k heaviest keys as (label, count, error), O(k)"""
+        result = []
+        for _, label, count, error in self.items():
+            if len(result) >= k:
+                break
+            result.append((label, count, error))
+        return result
+
+    # ---- merge / persistence ----
+
+    def _rebuild(self, entries: List[Tuple[str, str, int, int]], total: int) -> None:
+        """
+        Reset to entries (any order across counts); keeps the `capacity`
+        heaviest. Equal counts keep their relative order, which is the
+        eviction order within a bucket, so a to_dict() round-trip is exact
+        """
+        entries = sorted(entries, key=lambda e: e[2], reverse=True)[:self.capacity]  # stable
+        self._bucket_of, self._error, self._label = {}, {}, {}
+        self._min = self._max = None
+        self.total = total
+
+        for key, label, count, error in sorted(entries, key=lambda e: e[2]):  # ascending counts, append at the max end
+            if self._max is not None and self._max.count == count:
+                self._max.keys[key] = None
+                self._bucket_of[key] = self._max
+            else:
+                self._place(key, self._max, count)
+            self._error[key] = error
+            if label != key:
+                self._label[key] = label
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """
+        Add other's counts into this sketch (Agarwal et al. mergeable summaries):
+        a key missing from a full sketch is charged that sketch's min_count as
+        both count and error, so the upper/lower bounds still hold
+        """
+        own_min, other_min = self.min_count, other.min_count
+        ours = {key: (label, count, error) for key, label, count, error in self.items()}
+        theirs = {key: (label, count, error) for key, label, count, error in other.items()}
+
+        merged = []
+        for key in ours.keys() | theirs.keys():
+            label_a, count_a, error_a = ours.get(key, (None, own_min, own_min))
+            label_b, count_b, error_b = theirs.get(key, (None, other_min, other_min))
+            merged.append((key, label_a or label_b, count_a + count_b, error_a + error_b))
+
+        self._rebuild(merged, self.total + other.total)
+        return self
+
+    def copy(self) -> "SpaceSaving":
+        clone = SpaceSaving(self.capacity)
+        clone._rebuild(list(self.items()), self.total)
+        return clone
+
+    def to_dict(self) -> Dict:
+        return {
+            "capacity": self.capacity,
+            "total": self.total,
+            "items": [[key, label, count, error] for key, label, count, error in self.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, capacity: Optional[int] = None) -> "SpaceSaving":
+        sketch = cls(capacity or data.get("capacity", 1000))
+        sketch._rebuild([tuple(item) for item in data.get("items", [])], int(data.get("total", 0)))
+        return sketch
@@ -0,0 +1,60 @@
+"""
+Near-duplicate group backfill
+
+Usage:
+    python assign_duplicate_groups.py
+        Assign metadata.dup_group (MinHash/LSH, DEDUP_JACCARD_THRESHOLD) to
+        every chunk ingested before grouping existed. Chunks that already
+        have a group keep it.
+
+    python assign_duplicate_groups.py --dry-run
+        Only print the groups that would be written.
+"""
+import asyncio
+import sys
+from collections import Counter
+
+from app.models.database import db
+from app.utils.dedup import DuplicateGrouper
+from app.config import settings
+
+
+async def backfill(dry_run: bool = False):
+    grouper = DuplicateGrouper(
+        threshold=settings.DEDUP_JACCARD_THRESHOLD,
+        num_perm=settings.MINHASH_PERMUTATIONS,
+        bands=settings.MINHASH_BANDS
+    )
+    rows = await db.fetch_all_chunks(columns="id, content, metadata")
+
+    # Grouped chunks first so new assignments join their existing groups
+    rows.sort(key=lambda row: (row.get("metadata") or {}).get("dup_group") is None)
+
+    pending = []
+    for row in rows:
+        metadata = row.get("metadata") or {}
+        existing = metadata.get("dup_group")
+        group = grouper.assign(row.get("content") or "", existing)
+        if existing is None:
+            pending.append((row, {**metadata, "dup_group": group}))
+
+    sizes = Counter(grouper.groups)
+    duplicates = sum(size - 1 for size in sizes.values())
+    print(f"\n🧬 {len(rows)} chunks, {len(sizes)} groups, {duplicates} near-duplicates, {len(pending)} to update\n")
+
+    for row, metadata in pending:
+        if sizes[metadata["dup_group"]] > 1:
+            print(f"  {row['id']} → {metadata['dup_group']} ({sizes[metadata['dup_group']]} members)")
+        if not dry_run:
+            db.client.table("portfolio_chunks").update({"metadata": metadata}).eq("id", row["id"]).execute()
+
+    if not dry_run:
+        print(f"\n✅ Updated {len(pending)} chunks\n")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args and args != ["--dry-run"]:
+        print(__doc__)
+        sys.exit(1)
+    asyncio.run(backfill(dry_run=args == ["--dry-run"]))
@@ -0,0 +1,88 @@
+"""
+HNSW vs exact search benchmark
+
+Builds synthetic clustered corpora (portfolio-like: many chunks around a
+few topics) and reports recall@k of the HNSW index against exact NumPy
+search, plus build time, memory and per-query latency.
+
+Usage:
+    python benchmark_vector_index.py [--sizes 10000,100000,1000000] [--dim 768]
+                                     [--k 10] [--queries 200] [--M 16]
+                                     [--ef-construction 200] [--ef 16,64,128]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.index.hnsw import HnswVectorIndex
+from app.index.local import normalize_rows
+
+
+def synthetic_corpus(n: int, dim: int, rng, topics: int = 256) -> np.ndarray:
+    centers = rng.standard_normal((topics, dim), dtype=np.float32)
+    assignment = rng.integers(0, topics, n)
+    vectors = centers[assignment] + 0.6 * rng.standard_normal((n, dim), dtype=np.float32)
+    return normalize_rows(vectors)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    result = np.empty((len(queries), k), dtype=np.int64)
+    for start in range(0, len(queries), 32):
+        scores = queries[start:start + 32] @ corpus.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+        result[start:start + 32] = np.take_along_axis(top, order, axis=1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--M", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--ef", default="16,64,128")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    ef_values = [int(ef) for ef in args.ef.split(",")]
+
+    print(f"\n📈 HNSW benchmark: dim={args.dim} k={args.k} M={args.M} ef_construction={args.ef_construction}\n")
+    print(f"{'chunks':>9} {'ef':>5} {'recall@k':>9} {'hnsw ms':>8} {'exact ms':>9} {'build s':>8} {'index MB':>9}")
+
+    for n in [int(size) for size in args.sizes.split(",")]:
+        corpus = synthetic_corpus(n, args.dim, rng)
+        queries = normalize_rows(
+            corpus[rng.integers(0, n, args.queries)]
+            + 0.3 * rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+        )
+
+        start = time.perf_counter()
+        truth = exact_top_k(corpus, queries, args.k)
+        exact_ms = (time.perf_counter() - start) * 1000 / args.queries
+
+        index = HnswVectorIndex(args.dim, M=args.M, ef_construction=args.ef_construction, path="")
+        start = time.perf_counter()
+        index.build_from_matrix([str(i) for i in range(n)], corpus, [{"id": str(i)} for i in range(n)])
+        build_s = time.perf_counter() - start
+        # Graph links + float32 vectors
+        index_mb = n * (args.dim * 4 + args.M * 2 * 4) / 1024 / 1024
+
+        for ef in ef_values:
+            index.index.set_ef(max(ef, args.k))
+            start = time.perf_counter()
+            labels, _ = index.index.knn_query(queries, k=args.k, num_threads=1)
+            hnsw_ms = (time.perf_counter() - start) * 1000 / args.queries
+
+            recall = np.mean([len(set(found) & set(expected)) / args.k for found, expected in zip(labels, truth)])
+            print(f"{n:>9} {ef:>5} {recall:>9.4f} {hnsw_ms:>8.3f} {exact_ms:>9.3f} {build_s:>8.1f} {index_mb:>9.0f}")
+
+        del index, corpus
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Embedding backend parity check
+
+Compares an ONNX backend against the torch backend on portfolio chunks and
+reports cosine drift and encode latency.
+
+Usage:
+    python check_embedding_parity.py [onnx|onnx-int8] [--min-cosine 0.99]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+from app.embeddings.backends import MODEL_NAME, load_backend
+from app.utils.chunking import chunk_text
+
+PORTFOLIO_DIR = "data/portfolio"
+
+
+def load_samples(limit: int = 64) -> list:
+    texts = []
+    for filename in sorted(os.listdir(PORTFOLIO_DIR)):
+        if filename.endswith(".md"):
+            with open(os.path.join(PORTFOLIO_DIR, filename), "r", encoding="utf-8") as f:
+                texts.extend(chunk_text(f.read()))
+    texts.extend([
+        "tell me about your projects",
+        "What is TaxoCapsNet?",
+        "How did you design the RAG pipeline?",
+    ])
+    return texts[:limit]
+
+
+def timed_encode(backend, texts: list) -> tuple:
+    backend.encode(texts[:2])  # warm-up
+    start = time.perf_counter()
+    single = [backend.encode([t])[0] for t in texts]
+    per_query_ms = (time.perf_counter() - start) * 1000 / len(texts)
+    return np.vstack(single), per_query_ms
+
+
+def main():
+    args = sys.argv[1:]
+    candidate = args[0] if args and not args[0].startswith("--") else "onnx-int8"
+    min_cosine = float(args[args.index("--min-cosine") + 1]) if "--min-cosine" in args else 0.99
+
+    texts = load_samples()
+    print(f"\n🔬 Parity check: torch vs {candidate} on {len(texts)} texts\n")
+
+    reference, torch_ms = timed_encode(load_backend("torch", MODEL_NAME), texts)
+    vectors, candidate_ms = timed_encode(load_backend(candidate, MODEL_NAME), texts)
+
+    reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    cosines = np.sum(reference * vectors, axis=1)
+
+    # Ranking agreement: does each text still retrieve the same nearest neighbour?
+    ref_nn = np.argsort(-(reference @ reference.T), axis=1)[:, 1]
+    cand_nn = np.argsort(-(vectors @ reference.T), axis=1)[:, 1]
+
+    print(f"{'='*50}")
+    print(f"Cosine vs torch:  min={cosines.min():.5f}  mean={cosines.mean():.5f}")
+    print(f"Max abs diff:     {np.abs(reference - vectors).max():.5f}")
+    print(f"NN agreement:     {np.mean(ref_nn == cand_nn) * 100:.1f}%")
+    print(f"Latency (1 text): torch={torch_ms:.1f}ms  {candidate}={candidate_ms:.1f}ms  "
+          f"speedup={torch_ms / candidate_ms:.2f}x")
+    print(f"{'='*50}\n")
+
+    if cosines.min() < min_cosine:
+        print(f"❌ Min cosine {cosines.min():.5f} below {min_cosine}\n")
+        sys.exit(1)
+    print("✅ Backend vectors are compatible with stored embeddings\n")
+
+
+if __name__ == "__main__":
+    main()
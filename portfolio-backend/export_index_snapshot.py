@@ -0,0 +1,75 @@
+"""
+Export / verify the memory-mapped embedding snapshot
+
+Usage:
+    python export_index_snapshot.py export [PATH] [--float16]
+        Pull every chunk from portfolio_chunks and write PATH
+        (default: INDEX_SNAPSHOT_PATH or data/index/snapshot)
+
+    python export_index_snapshot.py verify [PATH]
+        Check checksums, shape and normalisation, and whether the snapshot
+        still matches the corpus version in Supabase
+
+Workers load the snapshot with np.memmap when INDEX_SNAPSHOT_PATH is set.
+"""
+import asyncio
+import sys
+
+from app.config import settings
+from app.index.local import LocalVectorIndex
+from app.index.snapshot import read_manifest, verify_snapshot, write_snapshot
+from app.models.database import db
+
+DEFAULT_PATH = "data/index/snapshot"
+
+
+async def export(path: str, dtype: str):
+    print(f"\n📦 Exporting portfolio_chunks to {path} ({dtype})...\n")
+    version = await db.get_corpus_version()
+    rows = await db.fetch_all_chunks()
+
+    index = LocalVectorIndex(settings.EMBEDDING_DIMENSION)
+    kept, matrix = index._rows_to_matrix(rows)
+    ids = [str(row["id"]) for row in kept]
+
+    manifest = write_snapshot(path, ids, matrix, kept, version, dtype=dtype)
+    size_mb = matrix.shape[0] * matrix.shape[1] * (2 if dtype == "float16" else 4) / 1024 / 1024
+    print(f"✅ {manifest['rows']} chunks x {manifest['dimension']} dims ({size_mb:.1f} MB), "
+          f"skipped {len(rows) - len(kept)} without embeddings")
+    print(f"   corpus version: {version}\n")
+
+
+async def verify(path: str) -> bool:
+    print(f"\n🔍 Verifying {path}...\n")
+    problems = verify_snapshot(path)
+    manifest = read_manifest(path)
+
+    if manifest and not problems:
+        version = await db.get_corpus_version()
+        if manifest["corpus_version"] != version:
+            problems.append(f"stale: snapshot {manifest['corpus_version']} vs Supabase {version}")
+        if manifest["dimension"] < settings.EMBEDDING_DIMENSION:
+            problems.append(f"dimension {manifest['dimension']} < EMBEDDING_DIMENSION {settings.EMBEDDING_DIMENSION}")
+
+    if problems:
+        for problem in problems:
+            print(f"❌ {problem}")
+        print()
+        return False
+
+    print(f"✅ {manifest['rows']} chunks x {manifest['dimension']} {manifest['dtype']}, up to date\n")
+    return True
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    command = args[0] if args else "verify"
+    path = args[1] if len(args) > 1 else (settings.INDEX_SNAPSHOT_PATH or DEFAULT_PATH)
+
+    if command == "export":
+        asyncio.run(export(path, "float16" if "--float16" in sys.argv else "float32"))
+    elif command == "verify":
+        sys.exit(0 if asyncio.run(verify(path)) else 1)
+    else:
+        print(__doc__)
+        sys.exit(1)
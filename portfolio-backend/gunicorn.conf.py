@@ -0,0 +1,50 @@
+"""
+Multi-worker launch with a preloaded, copy-on-write shared embedding model
+
+    WEB_CONCURRENCY=4 gunicorn -c gunicorn.conf.py main:app
+
+The master imports main:app, loads the torch model once and forks the
+workers; the weight tensors are never written after load, so every worker
+shares the same physical pages. Each worker warms up and sets its own torch
+thread count after fork (see EMBEDDING_INTRA_OP_THREADS).
+"""
+import gc
+import logging
+import os
+
+from app.config import settings
+
+logger = logging.getLogger("gunicorn.error")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = settings.WEB_CONCURRENCY
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 120
+
+# ONNX Runtime sessions own native thread pools that do not survive fork,
+# so only the torch backend is preloaded; ONNX workers load their own copy
+preload_app = settings.EMBEDDING_BACKEND.lower() == "torch"
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+
+    from app.embeddings.nomic import embedding_model
+
+    # Load weights only: no encode in the master, so no OpenMP pool exists at fork
+    embedding_model.load()
+
+    # Move everything allocated so far out of GC tracking so collections in
+    # the workers don't touch (and copy) the shared object pages
+    gc.collect()
+    gc.freeze()
+    logger.info(f"✓ Embedding model preloaded in master (pid {os.getpid()}), forking {workers} workers")
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+
+    from app.embeddings.backends import configure_torch_threads
+    configure_torch_threads()
@@ -1,9 +1,19 @@
+import time
+
+PROCESS_START = time.monotonic()
+
+import asyncio
 import logging
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.routes import chat, ingest, health, analytics, debug
 from app.config import settings
+from app.embeddings.nomic import embedding_model
+from app.index.local import local_index
+from app.index.bm25 import bm25_index
+from app.models.database import db, write_queue
+from app.models.popular_queries import popular_queries
 
 logging.basicConfig(
     level=logging.INFO,
@@ -32,11 +42,77 @@ app.include_router(ingest.router, prefix="/api", tags=["ingest"])
 app.include_router(analytics.router, prefix="/api", tags=["analytics"])
 app.include_router(debug.router, prefix="/api", tags=["debug"])  # ADD
 
+_first_response_logged = False
+
+
+@app.middleware("http")
+async def log_cold_start(request: Request, call_next):
+    """Log cold-start-to-first-response once per process (probes excluded)"""
+    global _first_response_logged
+    response = await call_next(request)
+    
+    if not _first_response_logged and request.url.path not in ("/api/health", "/api/ready"):
+        _first_response_logged = True
+        logger.info(
+            f"⏱️ Cold start to first response: {time.monotonic() - PROCESS_START:.2f}s "
+            f"({request.method} {request.url.path})"
+        )
+    return response
+
+
+async def warm_embedding_model():
+    """Load + warm the model in the background so the server binds immediately"""
+    try:
+        await embedding_model.awarmup()
+        logger.info(f"✅ Embedding model ready {time.monotonic() - PROCESS_START:.2f}s after process start")
+    except Exception as e:
+        logger.error(f"❌ Embedding model warm-up failed: {e}")
+
+
+async def load_local_index():
+    """Mirror portfolio_chunks in memory; until loaded, searches use the RPC"""
+    try:
+        await local_index.load(db)
+    except Exception as e:
+        logger.error(f"❌ Local vector index load failed, using Supabase RPC: {e}")
+
+
+async def load_bm25_index():
+    """Lexical side of hybrid retrieval; until loaded, retrieval is vector-only"""
+    try:
+        await bm25_index.load(db)
+    except Exception as e:
+        logger.error(f"❌ BM25 index load failed, using vector-only retrieval: {e}")
+
 
 @app.on_event("startup")
 async def startup_event():
     logger.info("🚀 Portfolio Assistant API v2 started")
     logger.info(f"Environment: {settings.ENVIRONMENT}")
+    app.state.warmup_task = asyncio.create_task(warm_embedding_model())
+    write_queue.start()
+    await popular_queries.start(db)
+    
+    if settings.LOCAL_VECTOR_INDEX:
+        app.state.index_task = asyncio.create_task(load_local_index())
+    if settings.BM25_INDEX:
+        app.state.bm25_task = asyncio.create_task(load_bm25_index())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    embedding_model.shutdown()
+    
+    # Persist the ANN graph so the next start skips the rebuild
+    if settings.LOCAL_VECTOR_INDEX and hasattr(local_index, "asave"):
+        await local_index.asave()
+    if settings.BM25_INDEX:
+        await bm25_index.asave()
+    await popular_queries.stop()
+    # Flush buffered messages/analytics before the pool closes
+    await write_queue.drain(timeout=settings.SUPABASE_TIMEOUT_SECONDS)
+    await db.close()
+    logger.info("👋 Portfolio Assistant API stopped")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,112 @@
+"""
+Matryoshka embedding dimension tooling
+
+Usage:
+    python migrate_embedding_dimension.py report
+        Retrieval quality of each supported dimension vs full 768-d search,
+        measured locally on the portfolio markdown files.
+
+    python migrate_embedding_dimension.py backfill
+        After migrations/001_embedding_dimension.sql: truncate every stored
+        embedding_full vector to EMBEDDING_DIMENSION (no re-embedding needed).
+"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.embeddings.backends import MODEL_NAME, load_backend
+from app.embeddings.matryoshka import (
+    FULL_DIMENSION,
+    SUPPORTED_DIMENSIONS,
+    truncate_embeddings,
+    validate_dimension,
+)
+from app.utils.chunking import chunk_text
+
+PORTFOLIO_DIR = "data/portfolio"
+TOP_K = 5
+
+SAMPLE_QUERIES = [
+    "tell me about your projects",
+    "What is TaxoCapsNet?",
+    "How does the document QA system work?",
+    "What ML infrastructure have you built?",
+    "Which project used capsule networks?",
+    "How did you handle nutrition recommendations?",
+    "What financial product did you work on?",
+    "What was the hardest technical tradeoff?",
+]
+
+
+def report():
+    chunks = []
+    for filename in sorted(os.listdir(PORTFOLIO_DIR)):
+        if filename.endswith(".md"):
+            with open(os.path.join(PORTFOLIO_DIR, filename), "r", encoding="utf-8") as f:
+                chunks.extend(chunk_text(f.read()))
+
+    backend = load_backend(settings.EMBEDDING_BACKEND, MODEL_NAME)
+    chunk_full = backend.encode(chunks)
+    query_full = backend.encode(SAMPLE_QUERIES)
+
+    reference = np.argsort(-(query_full @ chunk_full.T), axis=1)[:, :TOP_K]
+
+    print(f"\n📐 Matryoshka report: {len(chunks)} chunks, {len(SAMPLE_QUERIES)} queries, recall@{TOP_K} vs {FULL_DIMENSION}-d\n")
+    print(f"{'dim':>5} {'recall@k':>9} {'top-1':>7} {'bytes/vec':>10} {'scan ms':>8}")
+
+    for dimension in SUPPORTED_DIMENSIONS:
+        chunk_vecs = truncate_embeddings(chunk_full, dimension)
+        query_vecs = truncate_embeddings(query_full, dimension)
+
+        start = time.perf_counter()
+        for _ in range(100):
+            scores = query_vecs @ chunk_vecs.T
+        scan_ms = (time.perf_counter() - start) * 10
+
+        ranked = np.argsort(-scores, axis=1)[:, :TOP_K]
+        recall = np.mean([len(set(r) & set(ref)) / TOP_K for r, ref in zip(ranked, reference)])
+        top1 = np.mean(ranked[:, 0] == reference[:, 0])
+
+        print(f"{dimension:>5} {recall:>9.3f} {top1:>7.3f} {dimension * 4:>10} {scan_ms:>8.3f}")
+    print()
+
+
+def backfill():
+    from app.models.database import db
+
+    dimension = validate_dimension(settings.EMBEDDING_DIMENSION)
+    if dimension == FULL_DIMENSION:
+        print("EMBEDDING_DIMENSION is 768, nothing to backfill")
+        return
+
+    rows = db.client.table("portfolio_chunks").select("id, embedding_full").execute().data
+    print(f"\n📐 Backfilling {len(rows)} chunks to {dimension} dims...\n")
+
+    updated = 0
+    for row in rows:
+        vector = row.get("embedding_full")
+        if not vector:
+            continue
+        if isinstance(vector, str):
+            vector = json.loads(vector)
+
+        truncated = truncate_embeddings(vector, dimension)[0].tolist()
+        db.client.table("portfolio_chunks").update({"embedding": truncated}).eq("id", row["id"]).execute()
+        updated += 1
+
+    print(f"✅ Updated {updated}/{len(rows)} chunks\n")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    if command == "report":
+        report()
+    elif command == "backfill":
+        backfill()
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,48 @@
+-- ============================================
+-- Matryoshka embedding dimension
+-- ============================================
+-- Switches portfolio_chunks.embedding from vector(768) to a truncated
+-- Matryoshka dimension. Shown for EMBEDDING_DIMENSION=256; replace every
+-- 256 below with the configured value (512 | 256 | 128).
+--
+-- Steps:
+--   1. Run this migration
+--   2. python migrate_embedding_dimension.py backfill
+--   3. Deploy with EMBEDDING_DIMENSION=256
+--   4. (optional) alter table portfolio_chunks drop column embedding_full;
+
+-- Keep the full 768-d vectors so the backfill can truncate without re-embedding
+alter table portfolio_chunks rename column embedding to embedding_full;
+alter table portfolio_chunks add column embedding vector(256);
+
+drop function if exists match_portfolio_chunks(vector, float, int);
+
+create or replace function match_portfolio_chunks (
+  query_embedding vector(256),
+  match_threshold float,
+  match_count int
+)
+returns table (
+  id uuid,
+  document_id uuid,
+  content text,
+  metadata jsonb,
+  similarity float
+)
+language sql stable
+as $$
+  select
+    portfolio_chunks.id,
+    portfolio_chunks.document_id,
+    portfolio_chunks.content,
+    portfolio_chunks.metadata,
+    1 - (portfolio_chunks.embedding <=> query_embedding) as similarity
+  from portfolio_chunks
+  where portfolio_chunks.embedding is not null
+    and 1 - (portfolio_chunks.embedding <=> query_embedding) > match_threshold
+  order by portfolio_chunks.embedding <=> query_embedding
+  limit match_count;
+$$;
+
+create index if not exists portfolio_chunks_embedding_idx
+  on portfolio_chunks using hnsw (embedding vector_cosine_ops);
@@ -0,0 +1,38 @@
+-- ============================================
+-- Return stored embeddings from match_portfolio_chunks
+-- ============================================
+-- The re-ranker scores candidates against their stored (pre-normalised)
+-- vectors; returning them here saves a follow-up select per search.
+-- Written for the default vector(768); if 001_embedding_dimension.sql was
+-- applied, use the same dimension in both places below.
+
+drop function if exists match_portfolio_chunks(vector, float, int);
+
+create or replace function match_portfolio_chunks (
+  query_embedding vector(768),
+  match_threshold float,
+  match_count int
+)
+returns table (
+  id uuid,
+  document_id uuid,
+  content text,
+  metadata jsonb,
+  embedding vector(768),
+  similarity float
+)
+language sql stable
+as $$
+  select
+    portfolio_chunks.id,
+    portfolio_chunks.document_id,
+    portfolio_chunks.content,
+    portfolio_chunks.metadata,
+    portfolio_chunks.embedding,
+    1 - (portfolio_chunks.embedding <=> query_embedding) as similarity
+  from portfolio_chunks
+  where portfolio_chunks.embedding is not null
+    and 1 - (portfolio_chunks.embedding <=> query_embedding) > match_threshold
+  order by portfolio_chunks.embedding <=> query_embedding
+  limit match_count;
+$$;
@@ -0,0 +1,16 @@
+-- ============================================
+-- Record which retrieval tier answered each query
+-- ============================================
+-- retrieve_advanced fetches one unthresholded candidate list and applies
+-- the similarity tiers locally; the tier that produced the chunks is
+-- logged with the query:
+--   primary  - vector candidates above 0.4
+--   fallback - nothing above 0.4, candidates above 0.0
+--   lexical  - nothing above 0.4, BM25 hits only
+--   none / error
+
+alter table analytics_queries
+  add column if not exists retrieval_tier text;
+
+create index if not exists analytics_queries_retrieval_tier_idx
+  on analytics_queries (retrieval_tier);
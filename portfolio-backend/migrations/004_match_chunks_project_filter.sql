@@ -0,0 +1,47 @@
+-- ============================================
+-- Project filter inside match_portfolio_chunks
+-- ============================================
+-- Follow-up questions search only the project being discussed, so they
+-- always get a full match_count from it instead of filtering a global
+-- top-k afterwards. filter_project is compared case-insensitively with
+-- metadata->>'title'; null searches every project (old behaviour).
+-- Written for the default vector(768); keep in sync with 002.
+
+drop function if exists match_portfolio_chunks(vector, float, int);
+drop function if exists match_portfolio_chunks(vector, float, int, text);
+
+create or replace function match_portfolio_chunks (
+  query_embedding vector(768),
+  match_threshold float,
+  match_count int,
+  filter_project text default null
+)
+returns table (
+  id uuid,
+  document_id uuid,
+  content text,
+  metadata jsonb,
+  embedding vector(768),
+  similarity float
+)
+language sql stable
+as $$
+  select
+    portfolio_chunks.id,
+    portfolio_chunks.document_id,
+    portfolio_chunks.content,
+    portfolio_chunks.metadata,
+    portfolio_chunks.embedding,
+    1 - (portfolio_chunks.embedding <=> query_embedding) as similarity
+  from portfolio_chunks
+  where portfolio_chunks.embedding is not null
+    and (filter_project is null
+         or lower(portfolio_chunks.metadata->>'title') = lower(filter_project))
+    and 1 - (portfolio_chunks.embedding <=> query_embedding) > match_threshold
+  order by portfolio_chunks.embedding <=> query_embedding
+  limit match_count;
+$$;
+
+-- Expression index for the filter above
+create index if not exists portfolio_chunks_title_idx
+  on portfolio_chunks (lower(metadata->>'title'));
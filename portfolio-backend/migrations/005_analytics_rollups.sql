@@ -0,0 +1,168 @@
+-- ============================================
+-- Hourly analytics rollups
+-- ============================================
+-- The analytics endpoints used to select all of analytics_queries and
+-- aggregate in Python (O(history) per call, truncated at the PostgREST
+-- row limit, `hours` ignored). Two rollup tables are now kept up to date
+-- by a statement-level trigger, so the write-behind queue's bulk inserts
+-- cost one upsert per (hour, mode[, query]) per batch:
+--   analytics_hourly        - per hour and mode: count, quality sum and
+--                             sum of squares (mean + stddev of any window)
+--   analytics_query_hourly  - per hour, mode and normalised query: count
+-- Windows are whole hours: window_hours => 24 covers exactly 24 buckets,
+-- the current (partial) hour and the 23 before it; null covers everything.
+-- normalize_query mirrors app/agents/retrieval_cache.normalize_query.
+
+create table if not exists analytics_hourly (
+  bucket timestamptz not null,
+  mode text not null,
+  query_count bigint not null default 0,
+  quality_sum double precision not null default 0,
+  quality_sq_sum double precision not null default 0,
+  primary key (bucket, mode)
+);
+
+create table if not exists analytics_query_hourly (
+  bucket timestamptz not null,
+  mode text not null,
+  query_norm text not null,
+  query text not null,  -- one raw spelling, for display
+  query_count bigint not null default 0,
+  primary key (bucket, mode, query_norm)
+);
+
+create index if not exists analytics_query_hourly_query_idx
+  on analytics_query_hourly (query_norm, bucket);
+
+create or replace function analytics_normalize_query (raw text)
+returns text
+language sql immutable
+as $$
+  -- collapse first: btrim alone only strips spaces, str.strip() every whitespace
+  select regexp_replace(
+    btrim(regexp_replace(lower(coalesce(raw, '')), '\s+', ' ', 'g')),
+    '[\s?!.,;:]+$', ''
+  );
+$$;
+
+-- ============================================
+-- Incremental maintenance
+-- ============================================
+
+create or replace function analytics_rollup_insert ()
+returns trigger
+language plpgsql
+as $$
+begin
+  insert into analytics_hourly as h (bucket, mode, query_count, quality_sum, quality_sq_sum)
+  select
+    date_trunc('hour', coalesce(n."timestamp", now())::timestamptz),
+    coalesce(n.mode, 'unknown'),
+    count(*),
+    sum(coalesce(n.response_quality_score, 0)),
+    sum(coalesce(n.response_quality_score, 0) ^ 2)
+  from new_rows n
+  group by 1, 2
+  on conflict (bucket, mode) do update set
+    query_count = h.query_count + excluded.query_count,
+    quality_sum = h.quality_sum + excluded.quality_sum,
+    quality_sq_sum = h.quality_sq_sum + excluded.quality_sq_sum;
+
+  insert into analytics_query_hourly as q (bucket, mode, query_norm, query, query_count)
+  select
+    date_trunc('hour', coalesce(n."timestamp", now())::timestamptz),
+    coalesce(n.mode, 'unknown'),
+    analytics_normalize_query(n.query),
+    min(n.query),
+    count(*)
+  from new_rows n
+  where analytics_normalize_query(n.query) <> ''
+  group by 1, 2, 3
+  on conflict (bucket, mode, query_norm) do update set
+    query_count = q.query_count + excluded.query_count;
+
+  return null;
+end;
+$$;
+
+drop trigger if exists analytics_queries_rollup on analytics_queries;
+
+create trigger analytics_queries_rollup
+  after insert on analytics_queries
+  referencing new table as new_rows
+  for each statement
+  execute function analytics_rollup_insert();
+
+-- ============================================
+-- Backfill from existing rows (run once, before traffic resumes)
+-- ============================================
+
+truncate analytics_hourly, analytics_query_hourly;
+
+insert into analytics_hourly (bucket, mode, query_count, quality_sum, quality_sq_sum)
+select
+  date_trunc('hour', coalesce("timestamp", now())::timestamptz),
+  coalesce(mode, 'unknown'),
+  count(*),
+  sum(coalesce(response_quality_score, 0)),
+  sum(coalesce(response_quality_score, 0) ^ 2)
+from analytics_queries
+group by 1, 2;
+
+insert into analytics_query_hourly (bucket, mode, query_norm, query, query_count)
+select
+  date_trunc('hour', coalesce("timestamp", now())::timestamptz),
+  coalesce(mode, 'unknown'),
+  analytics_normalize_query(query),
+  min(query),
+  count(*)
+from analytics_queries
+where analytics_normalize_query(query) <> ''
+group by 1, 2, 3;
+
+-- ============================================
+-- Read RPCs (answered from the rollups only)
+-- ============================================
+
+create or replace function analytics_mode_window (window_hours int default null)
+returns table (
+  mode text,
+  query_count bigint,
+  quality_sum double precision,
+  quality_sq_sum double precision
+)
+language sql stable
+as $$
+  select
+    h.mode,
+    sum(h.query_count)::bigint,
+    sum(h.quality_sum),
+    sum(h.quality_sq_sum)
+  from analytics_hourly h
+  where window_hours is null
+     or h.bucket >= date_trunc('hour', now()) - make_interval(hours => window_hours - 1)
+  group by h.mode;
+$$;
+
+create or replace function analytics_popular_queries (
+  window_hours int default null,
+  filter_mode text default null,
+  max_results int default 10
+)
+returns table (
+  query text,
+  query_count bigint
+)
+language sql stable
+as $$
+  select
+    min(q.query),
+    sum(q.query_count)::bigint as total
+  from analytics_query_hourly q
+  where (window_hours is null
+         or q.bucket >= date_trunc('hour', now()) - make_interval(hours => window_hours - 1))
+    and (filter_mode is null or q.mode = filter_mode)
+  group by q.query_norm
+  order by total desc
+  limit max_results;
+$$;
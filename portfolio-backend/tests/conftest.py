@@ -0,0 +1,23 @@
+import os
+import sys
+import types
+
+# app.config reads the environment at import time; the Supabase client only
+# needs well-formed values to be constructed (nothing connects in the tests)
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test.service.role")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import app.models.database  # noqa: F401
+except ImportError:
+    # supabase / postgrest not installed: stand in for the data layer module so the
+    # modules built on it import; tests monkeypatch db / write_queue with fakes
+    import app.models
+
+    database = types.ModuleType("app.models.database")
+    database.db = None
+    database.write_queue = None
+    sys.modules["app.models.database"] = database
+    app.models.database = database
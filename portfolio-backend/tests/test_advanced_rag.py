@@ -0,0 +1,138 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.agents import advanced_rag
+from app.agents.advanced_rag import AdvancedRAG
+from app.config import settings
+from app.models.schemas import RetrievedChunk
+
+
+@pytest.fixture(autouse=True)
+def no_bm25(monkeypatch):
+    monkeypatch.setattr(settings, "BM25_INDEX", False)
+
+
+def chunk(chunk_id, embedding, source, similarity=0.0):
+    return RetrievedChunk(id=chunk_id, content="", source=source, embedding=embedding, similarity=similarity)
+
+
+CANDIDATES = [
+    chunk("a1", [1.0, 0.0, 0.0], "alpha"),
+    chunk("a2", [0.99, 0.14, 0.0], "alpha"),  # near copy of a1
+    chunk("b", [0.7, 0.7, 0.0], "beta"),
+]
+QUERY = [1.0, 0.0, 0.0]
+
+
+def selected(**kwargs):
+    chunks = AdvancedRAG()._select_mmr(CANDIDATES, "query", query_embedding=QUERY, **kwargs)
+    return [c.id for c in chunks]
+
+
+def test_pure_relevance_keeps_similarity_order():
+    assert selected(top_k=3, lambda_mult=1.0, project_cap=0) == ["a1", "a2", "b"]
+
+
+def test_redundancy_penalty_promotes_a_different_chunk():
+    assert selected(top_k=2, lambda_mult=0.5, project_cap=0) == ["a1", "b"]
+
+
+def test_project_cap_is_soft_once_other_projects_are_exhausted():
+    assert selected(top_k=3, lambda_mult=1.0, project_cap=1) == ["a1", "b", "a2"]
+
+
+def test_chunks_without_a_vector_fall_back_to_search_similarity():
+    chunks = [chunk("vec", [0.0, 1.0, 0.0], "alpha"), chunk("novec", [], "beta", similarity=0.9)]
+
+    picked = AdvancedRAG()._select_mmr(chunks, "query", top_k=1, query_embedding=QUERY, lambda_mult=1.0, project_cap=0)
+
+    assert [c.id for c in picked] == ["novec"]
+
+
+def test_longer_stored_vectors_are_truncated_to_the_query_dimension():
+    matrix, has_vector = AdvancedRAG()._candidate_matrix(
+        [chunk("wide", np.random.default_rng(0).normal(size=768).tolist(), "alpha"), chunk("short", [1.0], "alpha")], 128
+    )
+
+    assert matrix.shape == (2, 128)
+    assert has_vector.tolist() == [True, False]
+    assert abs(float((matrix[0] ** 2).sum()) - 1.0) < 1e-5
+
+
+class FakeEmbeddings:
+    async def aembed_query(self, query):
+        return QUERY
+
+
+class FakeDB:
+    def __init__(self, similarities=(), fail=False):
+        self.similarities = similarities
+        self.fail = fail
+        self.calls = []
+
+    async def vector_search(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.fail:
+            raise ConnectionError("supabase down")
+        return [
+            {"id": f"c{i}", "content": "", "metadata": {"title": f"p{i}"}, "embedding": QUERY, "similarity": similarity}
+            for i, similarity in enumerate(self.similarities)
+        ]
+
+
+def retrieve(monkeypatch, db, top_k=2):
+    monkeypatch.setattr(advanced_rag, "db", db)
+    return asyncio.run(AdvancedRAG()._retrieve("query", top_k, FakeEmbeddings(), None))
+
+
+def test_threshold_tiers_are_a_prefix_of_the_sorted_candidates():
+    candidates = [{"similarity": 0.8}, {"similarity": 0.4}, {"similarity": 0.1}, {"similarity": None}]
+
+    assert AdvancedRAG._apply_threshold(candidates, 0.4, 10) == candidates[:1]
+    assert AdvancedRAG._apply_threshold(candidates, 0.0, 2) == candidates[:2]
+
+
+def test_primary_tier_comes_from_one_unthresholded_search(monkeypatch):
+    db = FakeDB([0.9, 0.5, 0.2])
+
+    result = retrieve(monkeypatch, db)
+
+    assert len(db.calls) == 1 and db.calls[0]["match_threshold"] == -1.0
+    assert (result.tier, result.threshold, result.vector_candidates) == ("primary", 0.4, 2)
+
+
+def test_fallback_tier_reuses_the_same_candidates(monkeypatch):
+    db = FakeDB([0.3, 0.1])
+
+    result = retrieve(monkeypatch, db)
+
+    assert len(db.calls) == 1
+    assert (result.tier, result.threshold, result.vector_candidates) == ("fallback", 0.0, 2)
+
+
+def test_vector_outage_is_reported_as_degraded(monkeypatch):
+    result = retrieve(monkeypatch, FakeDB(fail=True))
+
+    assert result.degraded
+    assert result.tier == "none" and not result.chunks
+
+
+class NoModel:
+    def __getattr__(self, name):
+        raise AssertionError(f"reranking must not run the embedding model ({name})")
+
+
+def test_reranking_uses_stored_vectors_without_the_model(monkeypatch):
+    monkeypatch.setattr(advanced_rag, "embedding_model", NoModel())
+    rows = [
+        {"id": "a1", "content": "", "metadata": {"title": "alpha", "dup_group": "g"}, "embedding": [1.0, 0.0, 0.0], "similarity": 0.9},
+        {"id": "b", "content": "", "metadata": {"title": "beta"}, "embedding": [0.7, 0.7, 0.0], "similarity": 0.7},
+    ]
+
+    chunks = AdvancedRAG()._convert_to_chunks(rows)
+    picked = AdvancedRAG()._select_mmr(chunks, "query", top_k=2, query_embedding=QUERY)
+
+    assert chunks[0].embedding == [1.0, 0.0, 0.0] and chunks[0].dup_group == "g"
+    assert [c.id for c in picked] == ["a1", "b"]
@@ -0,0 +1,47 @@
+import re
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+from app.agents.retrieval_cache import normalize_query
+
+MIGRATION = (Path(__file__).resolve().parents[1] / "migrations" / "005_analytics_rollups.sql").read_text()
+WINDOW_PREDICATE = "bucket >= date_trunc('hour', now()) - make_interval(hours => window_hours - 1)"
+
+
+def hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def in_window(bucket: datetime, now: datetime, window_hours: int) -> bool:
+    """WINDOW_PREDICATE, evaluated in Python"""
+    return bucket >= hour(now) - timedelta(hours=window_hours - 1)
+
+
+def test_both_read_rpcs_use_the_same_window():
+    assert MIGRATION.count(WINDOW_PREDICATE) == 2
+
+
+@pytest.mark.parametrize("window_hours", [1, 24, 168])
+def test_window_covers_exactly_window_hours_buckets(window_hours):
+    now = datetime(2026, 3, 1, 12, 41, tzinfo=timezone.utc)
+    buckets = [hour(now) - timedelta(hours=offset) for offset in range(window_hours + 5)]
+
+    covered = [bucket for bucket in buckets if in_window(bucket, now, window_hours)]
+
+    assert len(covered) == window_hours
+    assert covered[0] == hour(now)  # the current, partial hour is included
+
+
+def sql_normalize(raw: str) -> str:
+    """analytics_normalize_query's two regexp_replace calls, evaluated in Python"""
+    body = MIGRATION.split("create or replace function analytics_normalize_query", 1)[1]
+    collapse, trailing = re.findall(r"'(\\s\+|\[\\s\?!\.,;:\]\+\$)'", body)[:2]
+    assert "btrim(regexp_replace(lower(" in body  # collapse, then btrim (which strips spaces only)
+    return re.sub(trailing, "", re.sub(collapse, " ", raw.lower()).strip(" "))
+
+
+@pytest.mark.parametrize("raw", ["  What is   TaxoCapsNet?! ", "\tTell me\tabout\nyou.\n", "plain", "?!"])
+def test_sql_normalisation_matches_the_retrieval_cache(raw):
+    assert sql_normalize(raw) == normalize_query(raw)
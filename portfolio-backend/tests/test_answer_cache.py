@@ -0,0 +1,78 @@
+from app.agents import answer_cache as cache_module
+from app.agents.answer_cache import AnswerCache
+from app.models.schemas import ExtendedJudgeScore
+
+PASSED = ExtendedJudgeScore(average_score=8.0, revision_required=False)
+FAILED = ExtendedJudgeScore(average_score=3.0, revision_required=False)
+QUESTION = [1.0, 0.0]
+PARAPHRASE = [0.99, 0.05]
+
+
+def store(cache, judge_score=PASSED, mode="technical", vector=QUESTION, chunk_ids=("a", "b"), version=0):
+    return cache.put("What is TaxoCapsNet?", vector, mode, list(chunk_ids), version, "answer", judge_score)
+
+
+def test_paraphrase_with_the_same_context_hits():
+    cache = AnswerCache()
+    assert store(cache)
+
+    hit = cache.get(PARAPHRASE, "technical", ["b", "a"], 0)
+
+    assert hit.response == "answer"
+    assert hit.judge_score == PASSED
+
+
+def test_other_mode_context_version_or_question_misses():
+    cache = AnswerCache()
+    store(cache)
+
+    assert cache.get(QUESTION, "recruiter", ["a", "b"], 0) is None
+    assert cache.get(QUESTION, "technical", ["a"], 0) is None
+    assert cache.get(QUESTION, "technical", ["a", "b"], 1) is None
+    assert cache.get([0.0, 1.0], "technical", ["a", "b"], 0) is None
+    assert cache.stats()["misses"] == 4
+
+
+def test_only_passing_answers_are_stored_by_default():
+    cache = AnswerCache()
+
+    assert not store(cache, judge_score=None)
+    assert not store(cache, judge_score=FAILED)
+    assert not store(cache, judge_score=ExtendedJudgeScore(average_score=8.0, revision_required=True))
+
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["rejected"] == 3
+
+
+def test_unjudged_answers_need_an_opted_in_mode():
+    cache = AnswerCache(unjudged_modes=["recruiter"])
+
+    assert store(cache, judge_score=None, mode="recruiter")
+    assert not store(cache, judge_score=None, mode="technical")
+    assert not store(cache, judge_score=FAILED, mode="recruiter")
+
+    assert cache.get(QUESTION, "recruiter", ["a", "b"], 0).judge_score is None
+    assert cache.stats()["unjudged"] == 1
+
+
+def test_lru_cap_and_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = AnswerCache(max_entries=1, ttl_seconds=10)
+    store(cache, chunk_ids=["old"])
+    store(cache, chunk_ids=["new"])
+
+    assert cache.get(QUESTION, "technical", ["old"], 0) is None
+    assert cache.stats()["evictions"] == 1
+
+    now[0] += 11
+    assert cache.get(QUESTION, "technical", ["new"], 0) is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_vectors_of_another_dimension_never_match():
+    cache = AnswerCache()
+    store(cache)
+
+    assert cache.get([1.0, 0.0, 0.0], "technical", ["a", "b"], 0) is None
@@ -0,0 +1,91 @@
+import importlib.util
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.embeddings import backends
+from app.embeddings.backends import OnnxBackend, intra_op_threads, load_backend
+
+
+class FakeTokenizer:
+    def __call__(self, texts, **kwargs):
+        # second text is one token shorter: its last position is padding
+        return {
+            "input_ids": np.array([[1, 2, 3], [4, 5, 0]]),
+            "attention_mask": np.array([[1, 1, 1], [1, 1, 0]]),
+        }
+
+
+class FakeInput:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeSession:
+    def __init__(self, token_embeddings):
+        self.token_embeddings = token_embeddings
+        self.feeds = None
+
+    def run(self, outputs, feeds):
+        self.feeds = feeds
+        return [self.token_embeddings]
+
+
+def onnx_backend(token_embeddings, input_names=("input_ids", "attention_mask", "token_type_ids")):
+    """OnnxBackend around fakes, skipping the model download in __init__"""
+    backend = OnnxBackend.__new__(OnnxBackend)
+    backend.tokenizer = FakeTokenizer()
+    backend.max_length = 8192
+    backend.session = FakeSession(token_embeddings)
+    backend.input_names = set(input_names)
+    return backend
+
+
+def test_onnx_encode_mean_pools_real_tokens_and_normalises():
+    token_embeddings = np.array([
+        [[1.0, 0.0], [1.0, 0.0], [1.0, 0.0]],
+        [[0.0, 3.0], [0.0, 1.0], [100.0, 100.0]],  # padding must not count
+    ], dtype=np.float32)
+    backend = onnx_backend(token_embeddings)
+
+    vectors = backend.encode(["a b c", "d e"])
+
+    assert vectors.dtype == np.float32
+    assert np.allclose(vectors, [[1.0, 0.0], [0.0, 1.0]])
+    assert np.array_equal(backend.session.feeds["token_type_ids"], np.zeros((2, 3), dtype=np.int64))
+
+
+def test_onnx_encode_only_feeds_inputs_the_graph_declares():
+    backend = onnx_backend(np.ones((2, 3, 2), dtype=np.float32), input_names=("input_ids", "attention_mask"))
+
+    backend.encode(["a b c", "d e"])
+
+    assert set(backend.session.feeds) == {"input_ids", "attention_mask"}
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        load_backend("tensorflow", "model")
+
+
+@pytest.mark.skipif(importlib.util.find_spec("onnxruntime") is not None, reason="onnxruntime is installed")
+def test_onnx_backend_without_onnxruntime_says_what_to_install():
+    with pytest.raises(ImportError, match="pip install onnxruntime"):
+        load_backend("onnx-int8", "model")
+
+
+@pytest.mark.parametrize("workers, expected", [(1, 8), (3, 2), (16, 1)])
+def test_auto_threads_split_the_cores_across_workers(monkeypatch, workers, expected):
+    monkeypatch.setattr(backends.os, "cpu_count", lambda: 8)
+    monkeypatch.setattr(settings, "EMBEDDING_INTRA_OP_THREADS", 0)
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", workers)
+
+    assert intra_op_threads() == expected
+
+
+def test_explicit_thread_count_wins(monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_INTRA_OP_THREADS", 3)
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 4)
+
+    assert intra_op_threads() == 3
@@ -0,0 +1,80 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.embeddings.batcher import Histogram, MicroBatcher
+
+
+class RecordingEncoder:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        if self.fail:
+            raise RuntimeError("model crashed")
+        return [[float(len(text))] for text in texts]
+
+
+def run_batch(encoder, texts, **kwargs):
+    async def scenario():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = MicroBatcher(encoder, executor, **kwargs)
+            results = await asyncio.gather(*(batcher.submit(text) for text in texts), return_exceptions=True)
+            batcher._worker.cancel()
+            return batcher, results
+
+    return asyncio.run(scenario())
+
+
+def test_concurrent_submits_share_one_encode():
+    encoder = RecordingEncoder()
+
+    batcher, results = run_batch(encoder, ["a", "bb", "ccc"], max_wait_ms=50)
+
+    assert encoder.calls == [["a", "bb", "ccc"]]
+    assert results == [[1.0], [2.0], [3.0]]
+    assert batcher.stats()["batches"] == 1
+    assert batcher.stats()["items"] == 3
+
+
+def test_identical_texts_are_encoded_once():
+    encoder = RecordingEncoder()
+
+    _, results = run_batch(encoder, ["same", "other", "same"], max_wait_ms=50)
+
+    assert encoder.calls == [["same", "other"]]
+    assert results[0] == results[2] == [4.0]
+
+
+def test_batches_are_capped_at_max_batch_size():
+    encoder = RecordingEncoder()
+
+    batcher, results = run_batch(encoder, [str(i) for i in range(5)], max_batch_size=2, max_wait_ms=50)
+
+    assert [len(call) for call in encoder.calls] == [2, 2, 1]
+    assert results == [[1.0]] * 5
+    assert batcher.stats()["batches"] == 3
+
+
+def test_encode_error_reaches_every_waiter():
+    encoder = RecordingEncoder(fail=True)
+
+    _, results = run_batch(encoder, ["a", "b"], max_wait_ms=50)
+
+    assert len(encoder.calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_histogram_buckets_are_upper_inclusive():
+    histogram = Histogram([1, 4])
+    for value in (0, 1, 2, 4, 9):
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+
+    assert snapshot["buckets"] == {"<=1": 2, "<=4": 2, ">4": 1}
+    assert snapshot["count"] == 5
+    assert snapshot["mean"] == pytest.approx(16 / 5)
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from app.agents import advanced_rag
+from app.agents.advanced_rag import AdvancedRAG
+from app.config import settings
+from app.index.bm25 import BM25Index, tokenize
+
+VERSION = {"count": 3, "latest_id": "c", "latest_at": None}
+
+ROWS = [
+    {"id": "a", "content": "TaxoCapsNet capsule network for taxonomy", "metadata": {"title": "TaxoCapsNet"}},
+    {"id": "b", "content": "A portfolio website built with FastAPI", "metadata": {"title": "Portfolio"}},
+    {"id": "c", "content": "FastAPI backend with a network of agents", "metadata": {"title": "Agents"}},
+]
+
+
+class FakeDB:
+    def __init__(self, version=VERSION):
+        self.version = version
+        self.fetches = 0
+        self.ensured = []
+
+    async def get_corpus_version(self):
+        return self.version
+
+    async def fetch_all_chunks(self, columns=None):
+        self.fetches += 1
+        return [dict(row) for row in ROWS]
+
+    async def ensure_embeddings(self, items):
+        self.ensured.extend(item["id"] for item in items)
+        for item in items:
+            item["embedding"] = [0.0]
+
+
+def built():
+    index = BM25Index(path="")
+    index.build([dict(row) for row in ROWS], VERSION)
+    return index
+
+
+def test_tokenize_drops_stop_words_and_punctuation():
+    assert tokenize("What is the TaxoCapsNet-v2?") == ["taxocapsnet", "v2"]
+
+
+def test_rare_terms_outscore_common_ones():
+    index = built()
+
+    assert [row["id"] for row, _ in index.search("taxocapsnet")] == ["a"]
+    assert index.search("taxocapsnet")[0][1] > max(score for _, score in index.search("network"))
+    assert index.search("fastapi", project="agents")[0][0]["id"] == "c"
+    assert index.score("network", ["c"]).keys() == {"c"}
+
+
+def test_add_and_delete_keep_postings_consistent():
+    index = built()
+    index.add([{"id": "b", "content": "Rewritten without the framework name"}])
+
+    assert [row["id"] for row, _ in index.search("fastapi")] == ["c"]
+    assert index.version is None  # a replacement can't be predicted
+
+    assert index.delete(["c", "missing"]) == 1
+    assert index.search("fastapi") == []
+    assert "fastapi" not in index.postings
+    assert index.total_len == sum(index.doc_len.values())
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "bm25.json")
+    index = built()
+    index.save(path)
+
+    loaded = BM25Index(path=path)
+    assert loaded.load_from_disk(expected_version=VERSION)
+    assert loaded.score("network") == index.score("network")
+    assert not BM25Index(path=path).load_from_disk(expected_version={**VERSION, "count": 9})
+
+
+def test_load_rebuilds_in_a_thread_and_persists(tmp_path):
+    path = str(tmp_path / "bm25.json")
+    db = FakeDB()
+    assert asyncio.run(BM25Index(path=path).load(db)) == 3
+    assert db.fetches == 1
+
+    again = FakeDB()
+    assert asyncio.run(BM25Index(path=path).load(again)) == 3
+    assert again.fetches == 0
+
+
+def test_only_a_strong_top_hit_replaces_the_vector_fallback():
+    index = built()
+    top_score = lambda query: index.search(query)[0][1]
+
+    assert AdvancedRAG._strong_lexical([]) is False
+    assert AdvancedRAG._strong_lexical([{"bm25_score": settings.BM25_LEXICAL_MIN_SCORE}]) is True
+    assert AdvancedRAG._strong_lexical([{"bm25_score": settings.BM25_LEXICAL_MIN_SCORE - 0.01}]) is False
+    assert top_score("network") < top_score("taxocapsnet")
+
+
+def test_rrf_ranks_chunks_found_by_both_retrievers_first(monkeypatch):
+    db = FakeDB()
+    monkeypatch.setattr(advanced_rag, "db", db)
+    monkeypatch.setattr(settings, "RRF_K", 60)
+    vector = [{"id": "v1", "similarity": 0.9, "embedding": [1.0]}, {"id": "both", "similarity": 0.8, "embedding": [1.0]}]
+    lexical = [{"id": "both", "similarity": 0.0}, {"id": "l1", "similarity": 0.0}]
+
+    fused = asyncio.run(AdvancedRAG()._fuse_hybrid(vector, lexical))
+
+    assert [item["id"] for item in fused] == ["both", "v1", "l1"]
+    assert fused[0]["similarity"] == 0.8  # the vector row is kept
+    assert db.ensured == ["l1"]
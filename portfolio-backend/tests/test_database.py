@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("supabase")
+httpx = pytest.importorskip("httpx")
+
+from app.config import settings
+from app.models.database import PooledPostgrestClient, SupabaseClient
+
+
+class SlowRequest:
+    async def execute(self):
+        await asyncio.sleep(1)
+
+
+def data_layer():
+    """SupabaseClient without the synchronous client (nothing connects)"""
+    client = SupabaseClient.__new__(SupabaseClient)
+    client._rest = None
+    client._retrieval_tier_column = True
+    return client
+
+
+def test_rest_client_is_created_once_on_first_use(monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_TIMEOUT_SECONDS", 7.0)
+    client = data_layer()
+
+    rest = client.rest
+
+    assert isinstance(rest, PooledPostgrestClient)
+    assert client.rest is rest
+    assert isinstance(rest.session, httpx.AsyncClient)
+    assert rest.session.timeout.read == 7.0
+    asyncio.run(client.close())
+    assert client._rest is None
+
+
+def test_every_call_has_a_deadline():
+    client = data_layer()
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(client.execute(SlowRequest(), timeout=0.01))
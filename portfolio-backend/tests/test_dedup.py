@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from app.utils.dedup import DuplicateGrouper, MinHasher, shingles
+
+BASE = ("Built a capsule network for hierarchical taxonomy classification of microbial genomes, "
+        "reaching state of the art accuracy on three public benchmarks with a compact model")
+NEAR = BASE + " overall"
+OTHER = "Designed a retrieval augmented chatbot for a personal portfolio using FastAPI and Supabase vectors"
+
+
+class FakeDB:
+    def __init__(self, rows):
+        self.rows = rows
+        self.fetches = 0
+
+    async def fetch_all_chunks(self, columns=None):
+        self.fetches += 1
+        return [dict(row) for row in self.rows]
+
+
+def test_shingles_are_word_trigrams_with_a_short_text_fallback():
+    assert shingles("One two, three four") == {"one two three", "two three four"}
+    assert shingles("Hi there") == {"hi", "there"}
+
+
+def test_bands_must_divide_permutations():
+    with pytest.raises(ValueError):
+        MinHasher(num_perm=64, bands=10)
+
+
+def test_signature_estimates_jaccard():
+    hasher = MinHasher(num_perm=128, bands=32)
+
+    assert hasher.jaccard(hasher.signature(BASE), hasher.signature(BASE)) == 1.0
+    assert hasher.jaccard(hasher.signature(BASE), hasher.signature(NEAR)) > 0.8
+    assert hasher.jaccard(hasher.signature(BASE), hasher.signature(OTHER)) < 0.2
+
+
+def test_near_duplicates_share_a_group_and_distinct_texts_do_not():
+    grouper = DuplicateGrouper(threshold=0.7)
+
+    first = grouper.assign(BASE)
+
+    assert grouper.assign(NEAR) == first
+    assert grouper.assign(OTHER) != first
+    assert grouper.assign(OTHER, group="stored-group") == "stored-group"
+
+
+def test_released_positions_no_longer_attract_matches():
+    grouper = DuplicateGrouper(threshold=0.7)
+    (group, position), = grouper.assign_batch([BASE])
+
+    grouper.release(position)
+
+    assert len(grouper) == 0
+    assert grouper.assign(NEAR) != group
+
+
+def test_unregister_releases_bound_chunks_only():
+    grouper = DuplicateGrouper(threshold=0.7)
+    (group, position), = grouper.assign_batch([BASE])
+    grouper.bind(position, "chunk-1")
+
+    assert grouper.unregister(["chunk-1", "never-bound"]) == 1
+    assert grouper.unregister(["chunk-1"]) == 0
+    assert grouper.assign(NEAR) != group
+
+
+def test_prime_indexes_the_corpus_once_and_keeps_stored_groups():
+    grouper = DuplicateGrouper(threshold=0.7)
+    db = FakeDB([
+        {"id": "1", "content": BASE, "metadata": {"dup_group": "legacy"}},
+        {"id": "2", "content": OTHER, "metadata": {}},
+    ])
+
+    async def scenario():
+        return await asyncio.gather(grouper.prime(db), grouper.prime(db))
+
+    assert asyncio.run(scenario()) == [2, 2]
+    assert db.fetches == 1
+    assert grouper.primed
+    assert grouper.assign(NEAR) == "legacy"
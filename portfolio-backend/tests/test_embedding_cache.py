@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from app.embeddings import cache as cache_module
+from app.embeddings.cache import EmbeddingCache
+
+
+def vector(value: float, size: int = 4) -> np.ndarray:
+    return np.full(size, value, dtype=np.float32)
+
+
+def test_hit_and_miss_counters():
+    cache = EmbeddingCache(max_entries=4)
+    assert cache.get("a") is None
+    cache.put("a", [1.0, 2.0])
+
+    cached = cache.get("a")
+    assert cached.dtype == np.float32
+    assert cached.tolist() == [1.0, 2.0]
+    assert not cached.flags.writeable  # shared between requests
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = EmbeddingCache(max_entries=2)
+    cache.put("a", vector(1))
+    cache.put("b", vector(2))
+    cache.get("a")  # b is now the least recently used
+    cache.put("c", vector(3))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.evictions == 1
+
+
+def test_byte_cap_bounds_memory():
+    cache = EmbeddingCache(max_entries=100, max_bytes=3 * 16)
+    for i in range(5):
+        cache.put(str(i), vector(i))
+
+    stats = cache.stats()
+    assert stats["entries"] == 3
+    assert stats["bytes"] == 3 * 16
+    assert cache.get("0") is None and cache.get("4") is not None
+
+
+def test_replacing_a_key_keeps_byte_count_exact():
+    cache = EmbeddingCache()
+    cache.put("a", vector(1, size=8))
+    cache.put("a", vector(2, size=4))
+
+    assert cache.stats()["bytes"] == 16
+    assert cache.get("a").tolist() == [2.0] * 4
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = EmbeddingCache(ttl_seconds=60)
+    cache.put("a", vector(1))
+
+    now[0] += 59
+    assert cache.get("a") is not None
+    now[0] += 2
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_namespaces_do_not_collide():
+    full = EmbeddingCache(namespace="nomic:torch:768")
+    small = EmbeddingCache(namespace="nomic:torch:256")
+    assert full.key("hello") != small.key("hello")
+
+
+@pytest.mark.parametrize("max_entries,max_bytes", [(0, 1024), (16, 0)])
+def test_zero_caps_disable_the_cache(max_entries, max_bytes):
+    cache = EmbeddingCache(max_entries=max_entries, max_bytes=max_bytes)
+    cache.put("a", vector(1))
+
+    assert not cache.enabled
+    assert cache.get("a") is None
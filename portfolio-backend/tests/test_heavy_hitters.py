@@ -0,0 +1,93 @@
+import random
+from collections import Counter
+
+from app.utils.heavy_hitters import SpaceSaving
+
+
+def stream(seed: int = 7, length: int = 5000):
+    """Zipf-like stream: a few heavy keys and a long tail"""
+    rng = random.Random(seed)
+    keys = [f"q{i}" for i in range(200)]
+    weights = [1 / (rank + 1) for rank in range(len(keys))]
+    return rng.choices(keys, weights=weights, k=length)
+
+
+def assert_bounds(sketch: SpaceSaving, truth: Counter) -> None:
+    for key, _, count, error in sketch.items():
+        assert count - error <= truth[key] <= count
+    bound = sketch.total / sketch.capacity
+    for key, true_count in truth.items():
+        if true_count > bound:
+            assert key in sketch, f"{key} ({true_count} > {bound:.1f}) not tracked"
+        if key not in sketch:
+            assert true_count <= sketch.min_count
+
+
+def test_offer_keeps_capacity_and_error_bounds():
+    items = stream()
+    sketch = SpaceSaving(capacity=50)
+    for key in items:
+        sketch.offer(key)
+
+    assert len(sketch) == 50
+    assert sketch.total == len(items)
+    assert_bounds(sketch, Counter(items))
+
+
+def test_exact_below_capacity():
+    sketch = SpaceSaving(capacity=10)
+    for key in ["a", "b", "a", "c", "a", "b"]:
+        sketch.offer(key, label=key.upper())
+
+    assert sketch.top(3) == [("A", 3, 0), ("B", 2, 0), ("C", 1, 0)]
+    assert sketch.estimate("a") == (3, 0)
+    assert sketch.estimate("zz") == (0, 0)
+
+
+def test_new_key_evicts_oldest_minimum():
+    sketch = SpaceSaving(capacity=3)
+    for key in ["a", "b", "c", "a"]:
+        sketch.offer(key)
+    sketch.offer("d")  # b is the oldest key at the minimum count
+
+    assert "b" not in sketch
+    assert sketch.estimate("d") == (2, 1)
+
+
+def test_merge_keeps_bounds():
+    items = stream(seed=1) + stream(seed=2)
+    left, right = SpaceSaving(capacity=50), SpaceSaving(capacity=50)
+    for key in items[:5000]:
+        left.offer(key)
+    for key in items[5000:]:
+        right.offer(key)
+    left.merge(right)
+
+    assert len(left) <= 50
+    assert left.total == len(items)
+    assert_bounds(left, Counter(items))
+
+
+def test_to_dict_round_trip_is_exact():
+    sketch = SpaceSaving(capacity=20)
+    for key in stream(length=500):
+        sketch.offer(key, label=key.upper())
+    clone = SpaceSaving.from_dict(sketch.to_dict())
+
+    assert list(clone.items()) == list(sketch.items())
+    assert clone.total == sketch.total
+    assert clone.to_dict() == sketch.to_dict()
+
+
+def test_round_trip_keeps_eviction_order_of_ties():
+    sketch = SpaceSaving(capacity=3)
+    for key in ["a", "b", "c"]:
+        sketch.offer(key)
+    clone = SpaceSaving.from_dict(sketch.to_dict())
+
+    # "a" is the oldest key with the minimum count in both
+    sketch.offer("d")
+    clone.offer("d")
+    assert "a" not in sketch
+    assert "a" not in clone
+    assert list(clone.items()) == list(sketch.items())
@@ -0,0 +1,169 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import history as history_module
+from app.models.history import ConversationStore
+
+
+class FakeQueue:
+    def __init__(self):
+        self.rows = []
+
+    def pending(self, table):
+        return list(self.rows) if table == "messages" else []
+
+
+class FakeDB:
+    """messages table + write-behind queue in memory; flush() lands queued rows"""
+
+    def __init__(self, queue: FakeQueue):
+        self.queue = queue
+        self.table = []
+        self.loads = 0
+        self.fail = False
+
+    def queue_message(self, session_id, role, content):
+        row = {"session_id": session_id, "role": role, "content": content, "created_at": datetime.now().isoformat()}
+        self.queue.rows.append(row)
+        return row
+
+    def flush(self):
+        self.table.extend(self.queue.rows)
+        self.queue.rows.clear()
+
+    def insert(self, session_id, role, content, created_at):
+        self.table.append({"session_id": session_id, "role": role, "content": content,
+                           "created_at": created_at.isoformat()})
+
+    async def get_conversation_history(self, session_id, limit=10, raise_errors=False, since=None):
+        self.loads += 1
+        if self.fail:
+            raise ConnectionError("messages unavailable")
+        rows = [row for row in self.table if row["session_id"] == session_id]
+        if since is not None:
+            rows = [row for row in rows if history_module._timestamp(row) > datetime.fromisoformat(since)]
+        rows = sorted(rows, key=history_module._timestamp)[-limit:]
+        return [{"role": row["role"], "content": row["content"], "created_at": row["created_at"]} for row in rows]
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    queue = FakeQueue()
+    db = FakeDB(queue)
+    monkeypatch.setattr(history_module, "db", db)
+    monkeypatch.setattr(history_module, "write_queue", queue)
+    return db
+
+
+def session():
+    return str(uuid.uuid4())
+
+
+def test_cold_load_then_memory_hits(fake_db):
+    store = ConversationStore(max_messages=4)
+    session_id = session()
+    fake_db.insert(session_id, "user", "hello", datetime.now() - timedelta(minutes=1))
+
+    async def run():
+        first = await store.get(session_id)
+        second = await store.get(session_id)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second == [{"role": "user", "content": "hello"}]
+    assert fake_db.loads == 1
+    assert store.hits == 1 and store.misses == 1
+
+
+def test_append_updates_buffer_and_bytes(fake_db):
+    store = ConversationStore(max_messages=3)
+    session_id = session()
+    store.start(session_id)
+    for content in ("a" * 10, "b" * 20, "c" * 30, "d" * 40):
+        assert store.append(session_id, "user", content)
+
+    messages = asyncio.run(store.get(session_id))
+    assert [m["content"][0] for m in messages] == ["b", "c", "d"]
+    assert store.stats()["bytes"] == (20 + 64) + (30 + 64) + (40 + 64)
+    assert fake_db.loads == 0
+
+
+def test_byte_cap_evicts_least_recently_used(fake_db):
+    store = ConversationStore(max_messages=4, max_bytes=3 * (100 + 64), idle_seconds=0)
+    first, second = session(), session()
+    store.start(first)
+    store.start(second)
+    store.append(first, "user", "x" * 100)
+    store.append(second, "user", "y" * 100)
+    store.append(first, "assistant", "x" * 100)  # exactly at the cap
+    store.append(second, "assistant", "y" * 100)  # over it: first is now the least recently used
+
+    stats = store.stats()
+    assert stats["sessions"] == 1
+    assert stats["evictions"] == 1
+    assert stats["bytes"] == 2 * (100 + 64) <= store.max_bytes
+    assert second in store._sessions
+
+
+def test_idle_sessions_are_evicted(fake_db):
+    store = ConversationStore(idle_seconds=60)
+    stale, fresh = session(), session()
+    store.start(stale)
+    store._sessions[stale].last_access -= 120
+    store.start(fresh)
+
+    assert store.stats()["sessions"] == 1
+    assert store.idle_evictions == 1
+    assert fresh in store._sessions
+
+
+def test_failed_cold_load_is_not_cached(fake_db):
+    store = ConversationStore()
+    session_id = session()
+    fake_db.insert(session_id, "user", "hello", datetime.now())
+    fake_db.fail = True
+    assert asyncio.run(store.get(session_id)) == []
+    assert store.load_errors == 1
+
+    fake_db.fail = False
+    assert asyncio.run(store.get(session_id)) == [{"role": "user", "content": "hello"}]
+
+
+def test_cold_load_includes_queued_messages(fake_db):
+    store = ConversationStore()
+    session_id = session()
+    fake_db.insert(session_id, "user", "first", datetime.now() - timedelta(seconds=30))
+    fake_db.queue_message(session_id, "assistant", "still queued")
+    fake_db.queue_message(session(), "user", "other session")
+
+    messages = asyncio.run(store.get(session_id))
+    assert [m["content"] for m in messages] == ["first", "still queued"]
+
+
+def test_catch_up_merges_other_workers_messages(fake_db):
+    store = ConversationStore(catch_up=True, catch_up_lag=5)
+    other_worker = ConversationStore(catch_up=True, catch_up_lag=5)
+    session_id = session()
+
+    async def run():
+        store.start(session_id)
+        store.append(session_id, "user", "turn 1")
+        store.append(session_id, "assistant", "answer 1")
+        fake_db.flush()
+
+        # Turn 2 lands on another worker
+        await other_worker.get(session_id)
+        other_worker.append(session_id, "user", "turn 2")
+        other_worker.append(session_id, "assistant", "answer 2")
+        fake_db.flush()
+
+        return await store.get(session_id)
+
+    messages = asyncio.run(run())
+    assert [m["content"] for m in messages] == ["turn 1", "answer 1", "turn 2", "answer 2"]
+    assert store.caught_up_messages == 2
+    # The worker's own messages came back from the table too, without duplicates
+    assert store.stats()["bytes"] == sum(len(m["content"]) + 64 for m in messages)
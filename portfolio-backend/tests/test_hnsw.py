@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("hnswlib")
+
+from app.config import settings
+from app.index.hnsw import HnswVectorIndex
+
+VERSION = {"count": 4, "latest_id": "d", "latest_at": None}
+
+
+def rows(count=4, dimension=8):
+    vectors = np.eye(dimension, dtype=np.float32)[:count]
+    return [
+        {"id": chunk_id, "content": chunk_id, "metadata": {"title": "alpha" if i % 2 else "beta"},
+         "embedding": vector.tolist()}
+        for i, (chunk_id, vector) in enumerate(zip("abcdefgh", vectors))
+    ]
+
+
+class FakeDB:
+    def __init__(self, version=VERSION):
+        self.version = version
+        self.fetches = 0
+
+    async def get_corpus_version(self):
+        return self.version
+
+    async def fetch_all_chunks(self):
+        self.fetches += 1
+        return rows()
+
+
+def make_index(path):
+    return HnswVectorIndex(8, M=8, ef_construction=50, ef_search=16, path=str(path))
+
+
+@pytest.fixture(autouse=True)
+def no_snapshot(monkeypatch):
+    monkeypatch.setattr(settings, "INDEX_SNAPSHOT_PATH", "")
+
+
+def test_load_persists_and_second_load_reuses_the_file(tmp_path):
+    path = tmp_path / "chunks.hnsw"
+    first_db = FakeDB()
+    assert asyncio.run(make_index(path).load(first_db)) == 4
+    assert path.exists() and (tmp_path / "chunks.hnsw.json").exists()
+
+    second_db = FakeDB()
+    index = make_index(path)
+    assert asyncio.run(index.load(second_db)) == 4
+    assert second_db.fetches == 0
+    assert index.search(rows()[2]["embedding"], match_threshold=0.5)[0]["id"] == "c"
+
+
+def test_stale_version_rebuilds_from_supabase(tmp_path):
+    path = tmp_path / "chunks.hnsw"
+    asyncio.run(make_index(path).load(FakeDB()))
+
+    db = FakeDB({**VERSION, "count": 5})
+    asyncio.run(make_index(path).load(db))
+
+    assert db.fetches == 1
+
+
+def test_graph_not_matching_its_sidecar_is_rejected(tmp_path):
+    path = tmp_path / "chunks.hnsw"
+    asyncio.run(make_index(path).load(FakeDB()))
+    sidecar = tmp_path / "chunks.hnsw.json"
+    meta = json.loads(sidecar.read_text())
+    meta["graph_sha256"] = "0" * 64
+    sidecar.write_text(json.dumps(meta))
+
+    assert make_index(path).load_from_disk(expected_version=VERSION) is False
+
+
+def test_save_leaves_no_temp_files(tmp_path):
+    path = tmp_path / "chunks.hnsw"
+    index = make_index(path)
+    asyncio.run(index.load(FakeDB()))
+    index.add([{"id": "e", "content": "e", "metadata": {}, "embedding": np.eye(8)[4].tolist()}])
+    asyncio.run(index.asave())
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["chunks.hnsw", "chunks.hnsw.json", "chunks.hnsw.lock"]
+    assert make_index(path).load_from_disk() is True
+
+
+def test_project_map_follows_add_and_delete(tmp_path):
+    index = make_index("")
+    asyncio.run(index.load(FakeDB()))
+    assert [row["id"] for row in index.search(rows()[1]["embedding"], -1.0, 5, project="Alpha")] == ["b", "d"]
+
+    index.delete(["b"])
+    index.add([{"id": "e", "content": "e", "metadata": {"title": "alpha"}, "embedding": np.eye(8)[4].tolist()}])
+
+    assert sorted(index.projects["alpha"].tolist()) == sorted([index.labels["d"], index.labels["e"]])
+    assert [row["id"] for row in index.search(np.eye(8)[4].tolist(), 0.5, 5, project="alpha")] == ["e"]
+
+    index.delete(["d", "e"])
+    assert "alpha" not in index.projects
+    assert index.search(np.eye(8)[4].tolist(), -1.0, 5, project="alpha") == []
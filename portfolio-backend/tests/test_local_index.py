@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.index.local import LocalVectorIndex, parse_embedding
+
+VERSION = {"count": 3, "latest_id": "c", "latest_at": "2026-01-01T00:00:00+00:00"}
+
+
+class FakeDB:
+    def __init__(self, rows, version=VERSION):
+        self.rows = rows
+        self.version = version
+        self.fetches = 0
+
+    async def get_corpus_version(self):
+        return self.version
+
+    async def fetch_all_chunks(self):
+        self.fetches += 1
+        return [dict(row) for row in self.rows]
+
+
+def chunk(chunk_id, embedding, title="alpha"):
+    return {"id": chunk_id, "content": f"chunk {chunk_id}", "metadata": {"title": title}, "embedding": embedding}
+
+
+ROWS = [
+    chunk("a", "[1,0,0,0]"),
+    chunk("b", [0.9, 0.1, 0, 0], title="Beta"),
+    chunk("c", [0, 0, 1, 0]),
+    chunk("no-vector", None),
+]
+
+
+@pytest.fixture
+def index(monkeypatch):
+    monkeypatch.setattr(settings, "INDEX_SNAPSHOT_PATH", "")
+    index = LocalVectorIndex(4)
+    asyncio.run(index.load(FakeDB(ROWS)))
+    return index
+
+
+def test_parse_embedding_accepts_pgvector_strings():
+    assert parse_embedding("[0.5,1]") == [0.5, 1]
+    assert parse_embedding((1, 2)) == [1, 2]
+    assert parse_embedding(None) is None
+
+
+def test_load_skips_rows_without_a_vector(index):
+    assert index.ready
+    assert len(index) == 3
+    assert index.version == VERSION
+
+
+def test_search_ranks_by_cosine_and_applies_threshold(index):
+    results = index.search([1, 0, 0, 0], match_threshold=0.5, match_count=5)
+
+    assert [row["id"] for row in results] == ["a", "b"]
+    assert results[0]["similarity"] == pytest.approx(1.0)
+    assert len(results[0]["embedding"]) == 4
+    assert "embedding" not in index.data.rows[0]
+
+
+def test_search_project_filter_is_case_insensitive(index):
+    results = index.search([1, 0, 0, 0], match_threshold=0.0, match_count=5, project="BETA")
+
+    assert [row["id"] for row in results] == ["b"]
+    assert index.search([1, 0, 0, 0], match_threshold=0.0, project="missing") == []
+
+
+def test_add_replaces_existing_ids_and_appends_new_ones(index):
+    index.add([chunk("c", [0, 1, 0, 0]), chunk("d", [0, 0, 0, 1])])
+
+    assert len(index) == 4
+    assert index.search([0, 1, 0, 0], match_threshold=0.5)[0]["id"] == "c"
+    assert index.search([0, 0, 0, 1], match_threshold=0.5)[0]["id"] == "d"
+    assert index.version is None  # replaced rows: the next version check reloads
+
+
+def test_add_of_new_chunks_predicts_the_corpus_version(index):
+    index.add([chunk("d", [0, 0, 0, 1])])
+
+    assert index.version == {"count": 4, "latest_id": "d", "latest_at": None}
+
+
+def test_delete_drops_rows_and_their_vectors(index):
+    assert index.delete(["a", "unknown"]) == 1
+    assert len(index) == 2
+    assert index.get_embeddings(["a", "b"]).keys() == {"b"}
+    assert [row["id"] for row in index.search([1, 0, 0, 0], match_threshold=0.5)] == ["b"]
+
+
+def test_refresh_reloads_only_when_the_version_moved(index, monkeypatch):
+    from app.agents import retrieval_cache as cache_module
+    monkeypatch.setattr(cache_module.retrieval_cache, "bump_version", lambda: None)
+
+    db = FakeDB(ROWS)
+    assert asyncio.run(index.refresh_if_stale(db)) is False
+    assert db.fetches == 0
+
+    db.version = {**VERSION, "count": 4}
+    assert asyncio.run(index.refresh_if_stale(db)) is True
+    assert db.fetches == 1
+    assert index.version == db.version
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from app.embeddings.matryoshka import FULL_DIMENSION, truncate_embeddings, validate_dimension
+
+
+def test_validate_dimension_accepts_trained_sizes_only():
+    assert validate_dimension(256) == 256
+    with pytest.raises(ValueError):
+        validate_dimension(300)
+
+
+def test_full_dimension_is_returned_unchanged():
+    vectors = np.random.default_rng(0).normal(size=(2, FULL_DIMENSION)).astype(np.float32)
+
+    assert np.array_equal(truncate_embeddings(vectors, FULL_DIMENSION), vectors)
+
+
+def test_truncated_vectors_are_unit_length():
+    vectors = np.random.default_rng(1).normal(size=(3, FULL_DIMENSION))
+
+    truncated = truncate_embeddings(vectors, 128)
+
+    assert truncated.shape == (3, 128)
+    assert np.allclose(np.linalg.norm(truncated, axis=1), 1.0, atol=1e-5)
+
+
+def test_truncation_ignores_input_scale():
+    vector = np.random.default_rng(2).normal(size=FULL_DIMENSION)
+    normalised = vector / np.linalg.norm(vector)
+
+    # Stored rows are already normalised; the raw model output is not
+    assert np.allclose(truncate_embeddings(vector, 256), truncate_embeddings(normalised, 256), atol=1e-4)
+    assert truncate_embeddings(vector, 256).shape == (1, 256)
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from app.embeddings import nomic as nomic_module
+from app.embeddings.nomic import NomicEmbeddings
+
+
+class FakeBackend:
+    """encode() stand-in: fails on texts containing "bad", records the calling thread"""
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self.calls = []
+        self.threads = set()
+
+    def encode(self, texts):
+        self.calls.append(list(texts))
+        self.threads.add(threading.current_thread().name)
+        if any("bad" in text for text in texts):
+            raise RuntimeError("tokenizer blew up")
+        return np.array([[float(len(text))] + [1.0] * (self.dimension - 1) for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def model():
+    embeddings = NomicEmbeddings()
+    embeddings.model = FakeBackend(embeddings.dimension)
+    yield embeddings
+    embeddings.shutdown()
+
+
+def test_batch_runs_on_the_embedding_pool_and_fills_the_cache(model):
+    vectors = asyncio.run(model.aembed_batch(["one", "three"]))
+
+    assert [len(vector) for vector in vectors] == [model.dimension] * 2
+    assert all(name.startswith("embedding") for name in model.model.threads)
+    assert model.embed_batch(["one", "three"]) == vectors
+    assert len(model.model.calls) == 1  # second call answered from the cache
+
+
+def test_only_uncached_texts_are_encoded(model):
+    model.embed_batch(["a"])
+    model.embed_batch(["a", "bb", "a"])
+
+    assert model.model.calls == [["a"], ["bb"]]
+
+
+def test_failed_batch_raises_by_default(model):
+    with pytest.raises(RuntimeError):
+        asyncio.run(model.aembed_batch(["fine", "bad chunk"]))
+
+
+def test_partial_batch_isolates_the_failing_text(model):
+    vectors = asyncio.run(model.aembed_batch(["fine", "bad chunk", "also fine"], partial=True))
+
+    assert vectors[1] is None
+    assert vectors[0] is not None and vectors[2] is not None
+    assert model.cache.get("bad chunk") is None
+
+
+def test_batch_output_with_wrong_dimension_is_rejected(model):
+    model.model.dimension = model.dimension // 2  # a backend returning a narrower vector
+
+    with pytest.raises(ValueError):
+        model.embed_batch(["x"])
+    assert model.cache.get("x") is None
+
+
+def test_query_is_encoded_off_the_loop(model):
+    vector = asyncio.run(model.aembed_query("hello"))
+
+    assert len(vector) == model.dimension
+    assert all(name.startswith("embedding") for name in model.model.threads)
+
+
+def test_model_loads_lazily_once_and_warmup_makes_it_ready(monkeypatch):
+    loads = []
+
+    def load_backend(backend, model_name):
+        loads.append(backend)
+        return FakeBackend(embeddings.dimension)
+
+    monkeypatch.setattr(nomic_module, "load_backend", load_backend)
+    embeddings = NomicEmbeddings()
+    try:
+        assert embeddings.state == "idle" and loads == []
+
+        asyncio.run(embeddings.awarmup())
+        embeddings.embed_query("first request")
+
+        assert loads == [embeddings.backend_name]
+        assert embeddings.is_ready
+        assert embeddings.load_seconds is not None and embeddings.warmup_seconds is not None
+    finally:
+        embeddings.shutdown()
+
+
+def test_failed_load_reports_error_and_retries_on_next_use(monkeypatch):
+    def load_backend(backend, model_name):
+        raise OSError("weights not found")
+
+    monkeypatch.setattr(nomic_module, "load_backend", load_backend)
+    embeddings = NomicEmbeddings()
+    try:
+        with pytest.raises(OSError):
+            embeddings.warmup()
+        assert embeddings.state == "error" and not embeddings.is_ready
+
+        monkeypatch.setattr(nomic_module, "load_backend", lambda backend, model_name: FakeBackend(embeddings.dimension))
+        embeddings.warmup()
+        assert embeddings.is_ready
+    finally:
+        embeddings.shutdown()
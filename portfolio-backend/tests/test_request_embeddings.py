@@ -0,0 +1,53 @@
+import asyncio
+
+from app.embeddings.context import RequestEmbeddings
+
+
+class CountingModel:
+    def __init__(self):
+        self.calls = []
+
+    def embed_query(self, text):
+        self.calls.append(text)
+        return [float(len(text)), 1.0]
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+
+def test_each_text_is_encoded_once_per_request():
+    model = CountingModel()
+    embeddings = RequestEmbeddings(model)
+
+    first = embeddings.embed_query("what is taxocapsnet")
+    again = embeddings.embed_query("what is taxocapsnet")
+    other = embeddings.embed_query("other question")
+
+    assert first == again == [19.0, 1.0]
+    assert other == [14.0, 1.0]
+    assert model.calls == ["what is taxocapsnet", "other question"]
+    assert (embeddings.hits, embeddings.misses) == (1, 2)
+
+
+def test_async_and_sync_paths_share_the_memo():
+    model = CountingModel()
+    embeddings = RequestEmbeddings(model)
+
+    async def run():
+        vector = await embeddings.aembed_query("hello")
+        return vector, await embeddings.aembed_query("hello")
+
+    first, second = asyncio.run(run())
+    assert first == second
+    assert embeddings.embed_query("hello") == first
+    assert embeddings.get("hello") == first
+    assert embeddings.get("never encoded") is None
+    assert model.calls == ["hello"]
+
+
+def test_requests_do_not_share_vectors():
+    model = CountingModel()
+    RequestEmbeddings(model).embed_query("hello")
+    RequestEmbeddings(model).embed_query("hello")
+
+    assert model.calls == ["hello", "hello"]
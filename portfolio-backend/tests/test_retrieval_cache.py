@@ -0,0 +1,94 @@
+from app.agents import retrieval_cache as cache_module
+from app.agents.retrieval_cache import RetrievalCache, normalize_query
+from app.models.schemas import RetrievalResult, RetrievedChunk
+
+
+def result(*chunk_ids, **kwargs):
+    chunks = [RetrievedChunk(id=chunk_id, content=chunk_id, embedding=[0.1, 0.2]) for chunk_id in chunk_ids]
+    return RetrievalResult(chunks=chunks, tier="primary", **kwargs)
+
+
+def test_normalize_query_ignores_case_spacing_and_trailing_punctuation():
+    assert normalize_query("  What is   TaxoCapsNet?! ") == "what is taxocapsnet"
+
+
+def test_equivalent_queries_share_an_entry_without_embeddings():
+    cache = RetrievalCache()
+    cache.put(cache.key("What is TaxoCapsNet?", 5, "Alpha"), result("a"))
+
+    cached = cache.get(cache.key("what is taxocapsnet", 5, "alpha"))
+
+    assert [chunk.id for chunk in cached.chunks] == ["a"]
+    assert cached.chunks[0].embedding == []
+    assert cache.get(cache.key("what is taxocapsnet", 3, "alpha")) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_hits_are_copies():
+    cache = RetrievalCache()
+    key = cache.key("q", 5, None)
+    cache.put(key, result("a"))
+
+    cache.get(key).chunks.append(RetrievedChunk(id="b", content="b"))
+
+    assert len(cache.get(key).chunks) == 1
+
+
+def test_empty_degraded_and_failed_results_are_not_stored():
+    cache = RetrievalCache()
+    key = cache.key("q", 5, None)
+
+    cache.put(key, RetrievalResult())
+    cache.put(key, result("a", degraded=True))
+    cache.put(key, result("a").model_copy(update={"tier": "error"}))
+
+    assert cache.stats()["entries"] == 0
+
+
+def test_bump_version_invalidates_and_rejects_in_flight_puts():
+    cache = RetrievalCache()
+    key = cache.key("q", 5, None)  # taken before a retrieval that overlaps an ingest
+    cache.put(key, result("a"))
+
+    cache.bump_version()
+    cache.put(key, result("a"))
+
+    assert cache.get(key) is None
+    assert cache.get(cache.key("q", 5, None)) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = RetrievalCache(max_entries=2)
+    first, second, third = (cache.key(q, 5, None) for q in ("one", "two", "three"))
+    cache.put(first, result("1"))
+    cache.put(second, result("2"))
+    cache.get(first)
+
+    cache.put(third, result("3"))
+
+    assert cache.get(second) is None
+    assert cache.get(first) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = RetrievalCache(ttl_seconds=10)
+    key = cache.key("q", 5, None)
+    cache.put(key, result("a"))
+
+    now[0] += 11
+
+    assert cache.get(key) is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_size_zero_disables_the_cache():
+    cache = RetrievalCache(max_entries=0)
+    key = cache.key("q", 5, None)
+    cache.put(key, result("a"))
+
+    assert cache.get(key) is None
+    assert not cache.stats()["enabled"]
@@ -0,0 +1,107 @@
+import asyncio
+import uuid
+
+import pytest
+
+from app.models import session_registry as registry_module
+from app.models.session_registry import SessionRegistry
+
+
+class FakeDB:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.sessions = set()
+        self.calls = 0
+
+    async def create_session(self, user_id=None, session_id=None):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("chat_sessions unavailable")
+        session_id = session_id or str(uuid.uuid4())
+        self.sessions.add(session_id)
+        return session_id
+
+
+class FakeStore:
+    def __init__(self):
+        self.started = []
+
+    def start(self, session_id):
+        self.started.append(session_id)
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = FakeDB()
+    monkeypatch.setattr(registry_module, "db", db)
+    monkeypatch.setattr(registry_module, "conversation_store", FakeStore())
+    return db
+
+
+def test_new_session_is_created_and_remembered(fake_db):
+    registry = SessionRegistry()
+    session_id = asyncio.run(registry.ensure(None))
+
+    assert session_id in fake_db.sessions
+    assert session_id in registry
+    assert registry_module.conversation_store.started == [session_id]
+    assert registry.created == 1
+
+
+def test_known_session_skips_the_database(fake_db):
+    registry = SessionRegistry()
+    session_id = str(uuid.uuid4())
+
+    async def run():
+        for _ in range(3):
+            assert await registry.ensure(session_id) == session_id
+
+    asyncio.run(run())
+    assert fake_db.calls == 1
+    assert registry.misses == 1
+    assert registry.hits == 2
+
+
+def test_failed_insert_is_not_remembered(fake_db):
+    fake_db.fail = True
+    registry = SessionRegistry()
+    new_id = asyncio.run(registry.ensure(None))
+    existing_id = str(uuid.uuid4())
+    asyncio.run(registry.ensure(existing_id))
+
+    uuid.UUID(new_id)  # still answers with a usable id
+    assert new_id not in registry
+    assert existing_id not in registry
+    assert registry.errors == 2
+    assert registry_module.conversation_store.started == []
+
+    # Next turn retries the upsert and remembers the id once it is written
+    fake_db.fail = False
+    assert asyncio.run(registry.ensure(existing_id)) == existing_id
+    assert existing_id in registry
+    assert existing_id in fake_db.sessions
+
+
+def test_malformed_id_gets_a_fresh_session(fake_db):
+    registry = SessionRegistry()
+    session_id = asyncio.run(registry.ensure("not-a-uuid"))
+
+    assert session_id != "not-a-uuid"
+    assert session_id in registry
+
+
+def test_least_recently_used_ids_are_evicted(fake_db):
+    registry = SessionRegistry(max_entries=2)
+    first, second, third = (str(uuid.uuid4()) for _ in range(3))
+
+    async def run():
+        await registry.ensure(first)
+        await registry.ensure(second)
+        await registry.ensure(first)  # first is now the most recent
+        await registry.ensure(third)
+
+    asyncio.run(run())
+    assert first in registry
+    assert third in registry
+    assert second not in registry
+    assert registry.evictions == 1
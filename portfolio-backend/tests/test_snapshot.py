@@ -0,0 +1,103 @@
+import asyncio
+import os
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.index.local import LocalVectorIndex, normalize_rows
+from app.index.snapshot import CURRENT_LINK, VECTORS_FILE, read_snapshot, resolve_snapshot, verify_snapshot, write_snapshot
+
+VERSION = {"count": 3, "latest_id": "c", "latest_at": None}
+
+
+def corpus(dimension=4):
+    matrix = normalize_rows(np.random.default_rng(0).normal(size=(3, dimension)))
+    rows = [{"document_id": "doc", "content": f"chunk {i}", "metadata": {"title": "alpha"}} for i in range(3)]
+    return ["a", "b", "c"], matrix, rows
+
+
+def versions(path):
+    return sorted(name for name in os.listdir(path) if name.startswith("v-"))
+
+
+def test_round_trip_through_the_current_link(tmp_path):
+    ids, matrix, rows = corpus()
+    manifest = write_snapshot(str(tmp_path), ids, matrix, rows, VERSION)
+
+    read_ids, read_matrix, read_rows, read_manifest = read_snapshot(str(tmp_path))
+
+    assert os.path.islink(tmp_path / CURRENT_LINK)
+    assert read_ids == ids
+    assert isinstance(read_matrix, np.memmap)
+    assert np.array_equal(read_matrix, matrix)
+    assert read_rows[1]["content"] == "chunk 1" and read_rows[1]["id"] == "b"
+    assert read_manifest == manifest
+    assert verify_snapshot(str(tmp_path)) == []
+
+
+def test_float16_snapshot_verifies(tmp_path):
+    ids, matrix, rows = corpus()
+    write_snapshot(str(tmp_path), ids, matrix, rows, VERSION, dtype="float16")
+
+    assert read_snapshot(str(tmp_path))[1].dtype == np.float16
+    assert verify_snapshot(str(tmp_path)) == []
+
+
+def test_rewrite_swaps_version_and_keeps_only_the_previous_one(tmp_path):
+    ids, matrix, rows = corpus()
+    write_snapshot(str(tmp_path), ids, matrix, rows, VERSION)
+    first = resolve_snapshot(str(tmp_path))
+    write_snapshot(str(tmp_path), ids, matrix, rows, VERSION)
+    second = resolve_snapshot(str(tmp_path))
+    write_snapshot(str(tmp_path), ids[:2], matrix[:2], rows[:2], VERSION)
+
+    assert versions(tmp_path) == sorted([os.path.basename(second), os.path.basename(resolve_snapshot(str(tmp_path)))])
+    assert not os.path.exists(first)
+    assert read_snapshot(str(tmp_path))[0] == ["a", "b"]
+
+
+def test_verify_reports_a_corrupted_vector_file(tmp_path):
+    ids, matrix, rows = corpus()
+    write_snapshot(str(tmp_path), ids, matrix, rows, VERSION)
+    vectors = os.path.join(resolve_snapshot(str(tmp_path)), VECTORS_FILE)
+    with open(vectors, "r+b") as f:
+        f.seek(-4, os.SEEK_END)
+        f.write(b"\x00\x00\x00\x00")
+
+    assert verify_snapshot(str(tmp_path)) == [f"{VECTORS_FILE} checksum mismatch"]
+
+
+def test_mismatched_lengths_are_rejected(tmp_path):
+    ids, matrix, rows = corpus()
+    with pytest.raises(ValueError):
+        write_snapshot(str(tmp_path), ids, matrix, rows[:2], VERSION)
+
+
+class FakeDB:
+    def __init__(self, version):
+        self.version = version
+        self.fetches = 0
+
+    async def get_corpus_version(self):
+        return self.version
+
+    async def fetch_all_chunks(self):
+        self.fetches += 1
+        return []
+
+
+def test_local_index_loads_a_matching_snapshot_only(tmp_path, monkeypatch):
+    ids, matrix, rows = corpus()
+    write_snapshot(str(tmp_path), ids, matrix, rows, VERSION)
+    monkeypatch.setattr(settings, "INDEX_SNAPSHOT_PATH", str(tmp_path))
+
+    db = FakeDB(VERSION)
+    index = LocalVectorIndex(4)
+    assert asyncio.run(index.load(db)) == 3
+    assert db.fetches == 0
+    assert index.search(matrix[2].tolist(), match_threshold=0.99)[0]["id"] == "c"
+
+    stale = FakeDB({**VERSION, "count": 4})
+    assert asyncio.run(LocalVectorIndex(4).load(stale)) == 0
+    assert stale.fetches == 1
@@ -0,0 +1,135 @@
+import asyncio
+
+from app.models.write_queue import WriteBehindQueue
+
+
+class Rejected(Exception):
+    pass
+
+
+class FakeWriter:
+    """Records written batches; fails the first `failures` calls, rejects rows marked bad"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.calls = 0
+        self.batches = []
+
+    async def __call__(self, table, rows):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("transient")
+        if any(row.get("bad") for row in rows):
+            raise Rejected("constraint violation")
+        self.batches.append((table, list(rows)))
+
+    def rows(self, table=None):
+        return [row for name, rows in self.batches if table in (None, name) for row in rows]
+
+
+def make_queue(writer, **kwargs):
+    options = {"batch_size": 10, "flush_ms": 1, "backoff_ms": 1, "max_backoff_ms": 1}
+    options.update(kwargs)
+    return WriteBehindQueue(writer, is_retryable=lambda error: not isinstance(error, Rejected), **options)
+
+
+def test_transient_failure_is_retried():
+    async def run():
+        writer = FakeWriter(failures=2)
+        queue = make_queue(writer, max_retries=3)
+        for i in range(5):
+            queue.enqueue("messages", {"i": i})
+        await queue.drain()
+        return writer, queue
+
+    writer, queue = asyncio.run(run())
+    assert [row["i"] for row in writer.rows()] == list(range(5))
+    assert queue.retries == 2
+    assert queue.written == 5
+    assert queue.dropped_failed == 0
+
+
+def test_batch_dropped_after_max_retries():
+    async def run():
+        writer = FakeWriter(failures=100)
+        queue = make_queue(writer, max_retries=2)
+        for i in range(3):
+            queue.enqueue("messages", {"i": i})
+        await queue.drain()
+        return writer, queue
+
+    writer, queue = asyncio.run(run())
+    assert writer.calls == 3
+    assert queue.written == 0
+    assert queue.dropped_failed == 3
+
+
+def test_rejected_batch_only_drops_the_bad_row():
+    async def run():
+        writer = FakeWriter()
+        queue = make_queue(writer)
+        for i in range(10):
+            queue.enqueue("analytics_queries", {"i": i, "bad": i == 4})
+        await queue.drain()
+        return writer, queue
+
+    writer, queue = asyncio.run(run())
+    assert [row["i"] for row in writer.rows()] == [0, 1, 2, 3, 5, 6, 7, 8, 9]
+    assert queue.dropped_rejected == 1
+    assert queue.splits == 1
+    assert queue.retries == 0
+
+
+def test_full_queue_drops_new_rows():
+    async def run():
+        writer = FakeWriter()
+        queue = make_queue(writer, max_rows=3)
+        accepted = [queue.enqueue("messages", {"i": i}) for i in range(5)]
+        await queue.drain()
+        return accepted, writer, queue
+
+    accepted, writer, queue = asyncio.run(run())
+    assert accepted == [True, True, True, False, False]
+    assert queue.dropped_full == 2
+    assert len(writer.rows()) == 3
+
+
+def test_drain_flushes_every_table_and_closes():
+    async def run():
+        writer = FakeWriter()
+        queue = make_queue(writer, batch_size=100, flush_ms=60000)
+        for i in range(25):
+            queue.enqueue("messages", {"i": i})
+            queue.enqueue("analytics_queries", {"i": i})
+        pending = len(queue.pending("messages"))
+        await queue.drain()
+        return pending, writer, queue, queue.enqueue("messages", {"i": 99})
+
+    pending, writer, queue, late = asyncio.run(run())
+    assert pending == 25
+    assert len(writer.rows("messages")) == 25
+    assert len(writer.rows("analytics_queries")) == 25
+    assert queue.depth == 0
+    assert not queue.stats()["running"]
+    assert late is False
+
+
+def test_table_in_backoff_does_not_hold_up_others():
+    class SlowMessages(FakeWriter):
+        async def __call__(self, table, rows):
+            if table == "messages":
+                raise ConnectionError("messages unavailable")
+            await super().__call__(table, rows)
+
+    async def run():
+        writer = SlowMessages()
+        queue = make_queue(writer, max_retries=1, backoff_ms=500, max_backoff_ms=500)
+        queue.enqueue("messages", {"i": 0})
+        await asyncio.sleep(0.05)  # messages is now sleeping in backoff
+        queue.enqueue("analytics_queries", {"i": 1})
+        await asyncio.sleep(0.05)
+        flushed = writer.rows("analytics_queries")
+        await queue.drain()
+        return flushed
+
+    assert asyncio.run(run()) == [{"i": 1}]